@@ -0,0 +1,215 @@
+import hashlib
+import os
+import tempfile
+import threading
+import wave
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import islice
+
+from metricas import metricas
+
+UNIDADES = ['cero', 'uno', 'dos', 'tres', 'cuatro', 'cinco', 'seis', 'siete', 'ocho', 'nueve',
+            'diez', 'once', 'doce', 'trece', 'catorce', 'quince', 'dieciseis', 'diecisiete', 'dieciocho',
+            'diecinueve', 'veinte', 'veintiuno', 'veintidos', 'veintitres', 'veinticuatro', 'veinticinco',
+            'veintiseis', 'veintisiete', 'veintiocho', 'veintinueve']
+DECENAS = ['', '', '', 'treinta', 'cuarenta', 'cincuenta', 'sesenta', 'setenta', 'ochenta', 'noventa']
+CENTENAS = ['', 'ciento', 'doscientos', 'trescientos', 'cuatrocientos', 'quinientos', 'seiscientos',
+            'setecientos', 'ochocientos', 'novecientos']
+
+# Todas las grabaciones que pueden hacer falta para anunciar turnos y mesas de 0 a 999999
+CLIPS = sorted(set(['turno', 'mesa', 'y', 'cien', 'mil', 'un', 'veintiun'] + UNIDADES
+                   + [d for d in DECENAS if d] + [c for c in CENTENAS if c]))
+
+
+def palabras_numero(n):
+    """Nombres de los clips que dicen n en español (0 <= n < 1000000)"""
+    if n < 0 or n >= 1000000:
+        raise ValueError(f'Número fuera de rango: {n}')
+    if n < 30:
+        return [UNIDADES[n]]
+    if n < 100:
+        decena, unidad = divmod(n, 10)
+        return [DECENAS[decena]] + (['y', UNIDADES[unidad]] if unidad else [])
+    if n < 1000:
+        centena, resto = divmod(n, 100)
+        if n == 100:
+            return ['cien']
+        return [CENTENAS[centena]] + (palabras_numero(resto) if resto else [])
+
+    miles, resto = divmod(n, 1000)
+    if miles == 1:
+        palabras = ['mil']
+    else:
+        # "veintiún mil", "treinta y un mil": uno se apocopa delante de mil
+        palabras = palabras_numero(miles)
+        if palabras[-1] == 'uno':
+            palabras[-1] = 'un'
+        elif palabras[-1] == 'veintiuno':
+            palabras[-1] = 'veintiun'
+        palabras.append('mil')
+    return palabras + (palabras_numero(resto) if resto else [])
+
+
+def frase_anuncio(turno, mesa):
+    """Clips de la frase "Turno <turno>, mesa <mesa>"; None marca la pausa de la coma"""
+    return ['turno'] + palabras_numero(turno) + [None, 'mesa'] + palabras_numero(mesa)
+
+
+class Anunciador:
+    """Audio de los anuncios del tablero público armado con clips WAV grabados.
+
+    Cada anuncio se ensambla una sola vez concatenando los clips de static/audio/voz/
+    con el módulo wave y se guarda en instance/anuncios/. Las demás pantallas reciben
+    el archivo ya armado; la caché de disco descarta los menos usados (LRU) al superar
+    ANUNCIOS_CACHE_MAXIMO archivos, salvo los que se están sirviendo en este proceso.
+    La huella del conjunto de clips forma parte de la URL, así que regrabar un
+    clip cambia las URLs y el navegador puede cachear sin límite.
+    """
+
+    PAUSA_PALABRA = 0.06
+    PAUSA_FRASE = 0.3
+
+    def __init__(self, app=None):
+        self.directorio_voz = None
+        self.directorio_cache = None
+        self.maximo = 500
+        self.disponibles = set()
+        self.huella = None
+        self._lock = threading.Lock()
+        self._locks = {}
+        self._cache = OrderedDict()
+        self._en_uso = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directorio_voz = app.config.get('ANUNCIOS_VOZ_DIR') or os.path.join(app.static_folder, 'audio', 'voz')
+        self.directorio_cache = os.path.join(app.instance_path, 'anuncios')
+        self.maximo = app.config.get('ANUNCIOS_CACHE_MAXIMO', 500)
+        app.extensions['anunciador'] = self
+        self.cargar_clips()
+
+        os.makedirs(self.directorio_cache, exist_ok=True)
+        archivos = [e for e in os.scandir(self.directorio_cache) if e.name.endswith('.wav')]
+        for entrada in sorted(archivos, key=lambda e: e.stat().st_mtime):
+            self._cache[entrada.name] = None
+
+    def cargar_clips(self):
+        """Releer los clips disponibles y recalcular la huella que versiona las URLs"""
+        huella = hashlib.sha1()
+        disponibles = set()
+        if os.path.isdir(self.directorio_voz):
+            for nombre in sorted(os.listdir(self.directorio_voz)):
+                if nombre.endswith('.wav'):
+                    estado = os.stat(os.path.join(self.directorio_voz, nombre))
+                    disponibles.add(nombre[:-4])
+                    huella.update(f'{nombre}:{estado.st_size}:{estado.st_mtime_ns};'.encode())
+        self.disponibles = disponibles
+        self.huella = huella.hexdigest()[:12]
+
+    def faltantes(self, clips=CLIPS):
+        return [c for c in clips if c is not None and c not in self.disponibles]
+
+    def disponible(self, turno, mesa):
+        try:
+            return not self.faltantes(frase_anuncio(turno, mesa))
+        except ValueError:
+            return False
+
+    @contextmanager
+    def sirviendo(self, turno, mesa):
+        """Ruta del WAV del anuncio, a salvo del descarte LRU mientras dure el bloque"""
+        nombre = self._nombre(turno, mesa)
+        with self._lock:
+            self._en_uso[nombre] = self._en_uso.get(nombre, 0) + 1
+        try:
+            yield self.obtener(turno, mesa)
+        finally:
+            with self._lock:
+                self._en_uso[nombre] -= 1
+                if not self._en_uso[nombre]:
+                    del self._en_uso[nombre]
+
+    def _nombre(self, turno, mesa):
+        return f'{self.huella}-turno-{turno}-mesa-{mesa}.wav'
+
+    def obtener(self, turno, mesa):
+        """Ruta del WAV del anuncio, ensamblándolo si no está en la caché"""
+        nombre = self._nombre(turno, mesa)
+        ruta = os.path.join(self.directorio_cache, nombre)
+
+        if not os.path.exists(ruta):
+            with self._lock:
+                lock = self._locks.setdefault(nombre, threading.Lock())
+
+            # Un lock por anuncio: ensamblar uno no frena los aciertos de los demás
+            with lock:
+                if not os.path.exists(ruta):
+                    self._ensamblar(frase_anuncio(turno, mesa), ruta)
+                    metricas.incrementar('anuncios.ensamblados')
+                    self._registrar(nombre)
+                    with self._lock:
+                        self._locks.pop(nombre, None)
+                    return ruta
+
+        metricas.incrementar('anuncios.aciertos')
+        self._registrar(nombre)
+        return ruta
+
+    def _registrar(self, nombre):
+        """Marcar el anuncio como recién usado y descartar los menos usados"""
+        with self._lock:
+            self._cache[nombre] = None
+            self._cache.move_to_end(nombre)
+            exceso = len(self._cache) - self.maximo
+            if exceso <= 0:
+                return
+            # Ni el recién registrado ni los que otra petición está enviando
+            descartables = (n for n in self._cache if n != nombre and n not in self._en_uso)
+            for viejo in list(islice(descartables, exceso)):
+                del self._cache[viejo]
+                try:
+                    os.remove(os.path.join(self.directorio_cache, viejo))
+                except OSError:
+                    # Ya no existe o, en Windows, sigue abierto
+                    pass
+
+    def _ensamblar(self, clips, ruta):
+        parametros = None
+        cuadros = []
+        for clip in clips:
+            if clip is None:
+                cuadros.append(self._silencio(parametros, self.PAUSA_FRASE))
+                continue
+            with wave.open(os.path.join(self.directorio_voz, f'{clip}.wav'), 'rb') as origen:
+                actuales = origen.getparams()
+                if parametros is None:
+                    parametros = actuales
+                elif actuales[:3] != parametros[:3]:
+                    raise ValueError(f'El clip {clip}.wav no tiene el mismo formato que los demás')
+                elif cuadros:
+                    cuadros.append(self._silencio(parametros, self.PAUSA_PALABRA))
+                cuadros.append(origen.readframes(origen.getnframes()))
+
+        # Escritura atómica: otra pantalla nunca lee un WAV a medio escribir
+        descriptor, temporal = tempfile.mkstemp(dir=self.directorio_cache, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as archivo, wave.open(archivo, 'wb') as destino:
+                destino.setnchannels(parametros.nchannels)
+                destino.setsampwidth(parametros.sampwidth)
+                destino.setframerate(parametros.framerate)
+                destino.writeframes(b''.join(cuadros))
+            os.replace(temporal, ruta)
+        except BaseException:
+            os.remove(temporal)
+            raise
+
+    @staticmethod
+    def _silencio(parametros, segundos):
+        # En PCM de 8 bits el silencio es 128; en 16 bits o más, 0
+        muestra = b'\x80' if parametros.sampwidth == 1 else b'\x00' * parametros.sampwidth
+        return muestra * parametros.nchannels * int(parametros.framerate * segundos)
+
+
+anunciador = Anunciador()
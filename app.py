@@ -1,38 +1,135 @@
-from flask import Flask, render_template, redirect, url_for, session, request, flash, jsonify
+from flask import Flask, render_template, redirect, url_for, session, request, flash, jsonify, send_from_directory, send_file, abort, has_request_context
+from contextlib import nullcontext
 from functools import wraps
+import csv
 import os
-from datetime import datetime
-from models import db, Mesa, Usuario, TurnoHistorial, TurnoGeneral
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from models import db, Mesa, Usuario, TurnoHistorial, TurnoGeneral, Trabajo, Cita, SEDE_PREDETERMINADA
 from flask_migrate import Migrate
+from historial_buffer import buffer_historial
+from metricas import metricas
+from perfilador import perfilador
+from cache_sedes import CacheEstadoSedes
+from consultas_lentas import consultas_lentas
+from idempotencia import almacen_idempotencia, idempotente
+from contrasenas import contrasenas, VerificacionesSaturadas
+from anuncios import anunciador, CLIPS
+from trabajos import ejecutor_trabajos
+from telemetria import telemetria_pantallas
+from tablero_materializado import materializador_tablero
+from citas import indice_citas
+import consultas
+from simulador import ajustar_llegadas, tiempos_servicio, planificar
+from estimador import registrar_avance, espera_estimada, espera_por_tasa, estadisticas_mesa, calcular_estadisticas_historial
+from sqlalchemy import select, func, delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 
 app = Flask(__name__)
 
 DATABASE_URL = os.getenv('DATABASE_URL')
 if DATABASE_URL and DATABASE_URL.startswith('postgres://'):
     DATABASE_URL = DATABASE_URL.replace("postgres://","postgressql://", 1)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///turnero.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('TURNERO_DATABASE_URI', 'sqlite:///turnero.db')
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-key-please-change')
 app.config['DEBUG'] = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
 
+app.config['HISTORIAL_SINCRONO'] = os.getenv('HISTORIAL_SINCRONO', 'True').lower() == 'true'
+app.config['HISTORIAL_LOTE'] = int(os.getenv('HISTORIAL_LOTE', 200))
+app.config['HISTORIAL_INTERVALO'] = float(os.getenv('HISTORIAL_INTERVALO', 1.0))
+app.config['HISTORIAL_REINTENTOS'] = int(os.getenv('HISTORIAL_REINTENTOS', 5))
+app.config['HISTORIAL_REINTENTO_ESPERA'] = float(os.getenv('HISTORIAL_REINTENTO_ESPERA', 0.5))
+
+app.config['PERFIL_HABILITADO'] = os.getenv('PERFIL_HABILITADO', 'False').lower() == 'true'
+app.config['PERFIL_ENDPOINTS'] = os.getenv('PERFIL_ENDPOINTS', 'admin_dashboard,api_estado_sistema').split(',')
+app.config['PERFIL_MUESTREO'] = float(os.getenv('PERFIL_MUESTREO', 0.0))
+app.config['PERFIL_MAXIMO'] = int(os.getenv('PERFIL_MAXIMO', 50))
+
+app.config['CACHE_SEDES_TTL'] = float(os.getenv('CACHE_SEDES_TTL', 1.0))
+
+app.config['ESTIMADOR_ALFA'] = float(os.getenv('ESTIMADOR_ALFA', 0.2))
+app.config['ESTIMADOR_PAUSA_MAXIMA'] = float(os.getenv('ESTIMADOR_PAUSA_MAXIMA', 1800))
+app.config['ESPERA_POSICIONES'] = int(os.getenv('ESPERA_POSICIONES', 5))
+
+app.config['CONFLICTO_REINTENTOS'] = int(os.getenv('CONFLICTO_REINTENTOS', 5))
+
+app.config['CONSULTAS_LENTAS_HABILITADO'] = os.getenv('CONSULTAS_LENTAS_HABILITADO', 'True').lower() == 'true'
+app.config['CONSULTAS_LENTAS_UMBRAL_MS'] = float(os.getenv('CONSULTAS_LENTAS_UMBRAL_MS', 100))
+
+app.config['SIMULADOR_DIAS_HISTORIA'] = int(os.getenv('SIMULADOR_DIAS_HISTORIA', 60))
+app.config['SIMULADOR_DIAS'] = int(os.getenv('SIMULADOR_DIAS', 2000))
+app.config['SIMULADOR_OBJETIVO_MINUTOS'] = float(os.getenv('SIMULADOR_OBJETIVO_MINUTOS', 15))
+
+app.config['IDEMPOTENCIA_TTL'] = float(os.getenv('IDEMPOTENCIA_TTL', 600))
+app.config['IDEMPOTENCIA_MAXIMO'] = int(os.getenv('IDEMPOTENCIA_MAXIMO', 10000))
+
+# scrypt:16384:8:1 verifica en ~55 ms por núcleo (benchmarks/bench_login.py --calibrar)
+app.config['PASSWORD_METODO'] = os.getenv('PASSWORD_METODO', 'scrypt:16384:8:1')
+app.config['PASSWORD_CONCURRENCIA'] = int(os.getenv('PASSWORD_CONCURRENCIA', 0)) or None
+app.config['PASSWORD_ESPERA'] = float(os.getenv('PASSWORD_ESPERA', 5.0))
+
+app.config['ANUNCIOS_VOZ_DIR'] = os.getenv('ANUNCIOS_VOZ_DIR')
+app.config['ANUNCIOS_CACHE_MAXIMO'] = int(os.getenv('ANUNCIOS_CACHE_MAXIMO', 500))
+app.config['ANUNCIOS_MAX_AGE'] = int(os.getenv('ANUNCIOS_MAX_AGE', 365 * 24 * 3600))
+
+app.config['TRABAJOS_HILOS'] = int(os.getenv('TRABAJOS_HILOS', 2))
+app.config['TRABAJOS_LOTE'] = int(os.getenv('TRABAJOS_LOTE', 5000))
+app.config['TRABAJOS_LATIDO'] = float(os.getenv('TRABAJOS_LATIDO', 30))
+app.config['TRABAJOS_LATIDO_MAXIMO'] = float(os.getenv('TRABAJOS_LATIDO_MAXIMO', 120))
+
+app.config['PANTALLAS_SLO_MS'] = float(os.getenv('PANTALLAS_SLO_MS', 5000))
+app.config['PANTALLAS_SIN_REPORTE'] = float(os.getenv('PANTALLAS_SIN_REPORTE', 45))
+app.config['PANTALLAS_MAXIMO'] = int(os.getenv('PANTALLAS_MAXIMO', 500))
+app.config['PANTALLAS_SEDES_TTL'] = float(os.getenv('PANTALLAS_SEDES_TTL', 60))
+
+# Directorio de los archivos del tablero; el proxy puede servirlo directamente
+app.config['TABLERO_DIR'] = os.getenv('TABLERO_DIR')
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE', 'False').lower() == 'true'
+
+app.config['CITAS_HORA_INICIO'] = os.getenv('CITAS_HORA_INICIO', '08:00')
+app.config['CITAS_HORA_FIN'] = os.getenv('CITAS_HORA_FIN', '17:00')
+app.config['CITAS_DURACION_MINUTOS'] = int(os.getenv('CITAS_DURACION_MINUTOS', 15))
+app.config['CITAS_ADELANTO_MINUTOS'] = int(os.getenv('CITAS_ADELANTO_MINUTOS', 5))
+app.config['CITAS_INDICE_TTL'] = float(os.getenv('CITAS_INDICE_TTL', 30))
+
 db.init_app(app)
 migrate = Migrate(app, db)
+buffer_historial.init_app(app)
+perfilador.init_app(app)
+consultas_lentas.init_app(app, db)
+almacen_idempotencia.init_app(app)
+contrasenas.init_app(app)
+anunciador.init_app(app)
+ejecutor_trabajos.init_app(app)
+telemetria_pantallas.init_app(app, sedes=consultas.sedes)
+materializador_tablero.init_app(app, db.session, modelos=(Mesa, TurnoGeneral))
+indice_citas.init_app(app)
 
-ultimo_turno_avanzado = None
+estado_sedes = CacheEstadoSedes(ttl=app.config['CACHE_SEDES_TTL'])
 
-def obtener_proximo_turno():
-    ultimo_turno = TurnoGeneral.query.order_by(TurnoGeneral.numero_turno.desc()).first()
-    if ultimo_turno:
-        return ultimo_turno.numero_turno + 1
+def sede_actual():
+    """Sede del usuario en sesión, o la indicada en la URL para las vistas públicas"""
+    if 'usuario' in session:
+        return session['usuario'].get('sede', SEDE_PREDETERMINADA)
+    return request.args.get('sede', SEDE_PREDETERMINADA)
+
+def obtener_proximo_turno(sede):
+    ultimo_numero = consultas.ultimo_numero_turno(sede)
+    if ultimo_numero:
+        return ultimo_numero + 1
     return 1
 
-def obtener_proximo_numero_mesa():
-    ultima_mesa = Mesa.query.filter_by(eliminada=False).order_by(Mesa.numero.desc()).first()
+def obtener_proximo_numero_mesa(sede):
+    ultima_mesa = Mesa.query.filter_by(sede=sede, eliminada=False).order_by(Mesa.numero.desc()).first()
     if ultima_mesa:
         return ultima_mesa.numero + 1
     
-    mesas = Mesa.query.filter_by(eliminada=False).order_by(Mesa.numero).all()
+    mesas = Mesa.query.filter_by(sede=sede, eliminada=False).order_by(Mesa.numero).all()
     numeros_existentes = [mesa.numero for mesa in mesas]
     
     for i in range(1, 1000): 
@@ -41,10 +138,10 @@ def obtener_proximo_numero_mesa():
     
     return 1
 
-def reordenar_mesas():
-    """Reordenar las mesas para que tengan números consecutivos (solo las no eliminadas)"""
+def reordenar_mesas(sede):
+    """Reordenar las mesas de una sede para que tengan números consecutivos (solo las no eliminadas)"""
     try:
-        mesas = Mesa.query.filter_by(eliminada=False).order_by(Mesa.numero).all()
+        mesas = Mesa.query.filter_by(sede=sede, eliminada=False).order_by(Mesa.numero).all()
         
         for index, mesa in enumerate(mesas, start=1):
             mesa.numero = index
@@ -56,6 +153,10 @@ def reordenar_mesas():
         print(f"Error reordenando mesas: {e}")
         return False
 
+def milisegundos_utc(momento):
+    """Milisegundos desde epoch de un datetime naive en UTC (como los timestamps guardados)"""
+    return int(momento.replace(tzinfo=timezone.utc).timestamp() * 1000) if momento else None
+
 def docente_ya_asignado(docente_id):
     """Verificar si un docente ya está asignado a otra mesa activa"""
     if not docente_id:
@@ -100,6 +201,33 @@ def docente_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def reintentar_en_conflicto(*excepciones):
+    """Reintentar la vista si otra petición modificó la misma fila entre la lectura y el commit.
+
+    Mesa lleva un número de versión (version_id_col): un UPDATE con una versión vieja
+    lanza StaleDataError. En ese caso se revierte la sesión y se vuelve a ejecutar la
+    vista completa, que relee la fila ya actualizada.
+    """
+    excepciones = (StaleDataError,) + excepciones
+    
+    def decorador(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            intentos = app.config['CONFLICTO_REINTENTOS']
+            for intento in range(1, intentos + 1):
+                try:
+                    return f(*args, **kwargs)
+                except excepciones:
+                    db.session.rollback()
+                    metricas.incrementar('concurrencia.conflictos')
+                    if intento < intentos:
+                        time.sleep(random.uniform(0, 0.01 * 2 ** intento))
+            
+            metricas.incrementar('concurrencia.reintentos_agotados')
+            return jsonify({'success': False, 'error': 'La mesa fue modificada por otro usuario, intenta nuevamente'})
+        return decorated_function
+    return decorador
+
 def inicializar_base_datos():
     with app.app_context():
         db.create_all()
@@ -108,7 +236,7 @@ def inicializar_base_datos():
             admin = Usuario(
                 nombre="Administrador Principal",
                 email="admin@turnero.com",
-                password="admin123",
+                password=contrasenas.generar("admin123"),
                 rol="admin"
             )
             db.session.add(admin)
@@ -116,7 +244,7 @@ def inicializar_base_datos():
             docente = Usuario(
                 nombre="Docente Ejemplo",
                 email="docente@turnero.com",
-                password="docente123",
+                password=contrasenas.generar("docente123"),
                 rol="docente"
             )
             db.session.add(docente)
@@ -127,6 +255,13 @@ def inicializar_base_datos():
             
             db.session.add_all([mesa1, mesa2, mesa3])
             db.session.commit()
+        
+        ejecutor_trabajos.marcar_interrumpidos()
+        indice_citas.reconstruir()
+        
+        sedes = set(db.session.execute(select(Mesa.sede).distinct()).scalars()) | {SEDE_PREDETERMINADA}
+        for sede in sedes:
+            materializador_tablero.escribir(sede)
 
 @app.route('/')
 def index():
@@ -138,14 +273,25 @@ def login():
         email = request.form['email']
         password = request.form['password']
         
-        usuario = Usuario.query.filter_by(email=email, password=password, activo=True).first()
+        usuario = Usuario.query.filter_by(email=email, activo=True).first()
+        
+        try:
+            valido = contrasenas.verificar(usuario.password if usuario else None, password)
+        except VerificacionesSaturadas:
+            flash('Hay muchos inicios de sesión en este momento. Intenta nuevamente en unos segundos.', 'warning')
+            return render_template('auth/login.html'), 503
         
-        if usuario:
+        if valido:
+            if contrasenas.necesita_actualizar(usuario.password):
+                usuario.password = contrasenas.generar(password)
+                db.session.commit()
+            
             session['usuario'] = {
                 'id': usuario.id,
                 'nombre': usuario.nombre,
                 'email': usuario.email,
-                'rol': usuario.rol
+                'rol': usuario.rol,
+                'sede': usuario.sede
             }
             session.modified = True
             
@@ -170,45 +316,27 @@ def logout():
 @login_required
 @admin_required
 def admin_dashboard():
-    usuarios = Usuario.query.filter_by(activo=True).all()
-    mesas = Mesa.query.filter_by(eliminada=False).all()  
-    
-    mesas_con_docente = []
-    for mesa in mesas:
-        mesa_dict = mesa.to_dict()
-        if mesa.docente_id:
-            docente = Usuario.query.get(mesa.docente_id)
-            mesa_dict['docente_nombre'] = docente.nombre if docente else 'Sin asignar'
-        else:
-            mesa_dict['docente_nombre'] = 'Sin asignar'
-        mesas_con_docente.append(mesa_dict)
-    
-    mesas_activas = Mesa.query.filter_by(activa=True, eliminada=False).all() 
-    ultimo_turno = TurnoGeneral.query.order_by(TurnoGeneral.numero_turno.desc()).first()
-    
-    proximo_turno = obtener_proximo_turno()
-    
-    total_turnos = TurnoGeneral.query.count()
-    
-    ultimos_turnos = TurnoGeneral.query.order_by(
-        TurnoGeneral.numero_turno.desc()
-    ).limit(10).all()
+    sede = sede_actual()
+    ultimos_turnos = consultas.ultimos_turnos_sede(sede)
+    ultimo_turno = ultimos_turnos[0] if ultimos_turnos else None
     
     return render_template('admin/dashboard.html', 
-                         usuarios=[u.to_dict() for u in usuarios],
-                         mesas=mesas_con_docente,
-                         mesas_activas=mesas_activas,
+                         usuarios=consultas.usuarios_activos(sede),
+                         mesas=consultas.mesas_con_docente(sede),
+                         mesas_activas=consultas.mesas_activas(sede),
                          ultimo_turno=ultimo_turno,
-                         proximo_turno=proximo_turno,
-                         total_turnos=total_turnos,
-                         ultimos_turnos=ultimos_turnos)
+                         proximo_turno=ultimo_turno.numero_turno + 1 if ultimo_turno else 1,
+                         total_turnos=consultas.total_turnos(sede),
+                         ultimos_turnos=ultimos_turnos,
+                         sede=sede)
 
 @app.route('/admin/mesas')
 @login_required
 @admin_required
 def admin_mesas():
-    mesas = Mesa.query.filter_by(eliminada=False).all()  
-    docentes = Usuario.query.filter_by(rol='docente', activo=True).all()
+    sede = sede_actual()
+    mesas = Mesa.query.filter_by(sede=sede, eliminada=False).all()  
+    docentes = Usuario.query.filter_by(sede=sede, rol='docente', activo=True).all()
     
     for docente in docentes:
         docente_dict = docente.to_dict()
@@ -222,8 +350,9 @@ def admin_mesas():
 @login_required
 @admin_required
 def admin_usuarios():
-    usuarios = Usuario.query.filter_by(activo=True).all()
-    mesas = Mesa.query.filter_by(eliminada=False).all() 
+    sede = sede_actual()
+    usuarios = Usuario.query.filter_by(sede=sede, activo=True).all()
+    mesas = Mesa.query.filter_by(sede=sede, eliminada=False).all() 
     return render_template('admin/usuarios.html', 
                          usuarios=[u.to_dict() for u in usuarios],
                          mesas=[m.to_dict() for m in mesas])
@@ -237,66 +366,53 @@ def docente_dashboard():
     
     usuario_actual = session['usuario']
     
-    usuario = Usuario.query.get(usuario_actual['id'])
+    usuario = consultas.usuario(usuario_actual['id'])
     
     if not usuario:
         flash('Usuario no encontrado', 'danger')
         return redirect(url_for('logout'))
     
-    mesa = None
-    mesa_asignada = Mesa.query.filter_by(docente_id=usuario.id, eliminada=False).first()
-    if mesa_asignada:
-        mesa = mesa_asignada
+    mesa = consultas.mesa_de_docente(usuario.id)
     
     ultimos_turnos = []
     if mesa:
-        ultimos_turnos = TurnoGeneral.query.filter_by(mesa_id=mesa.id)\
-            .order_by(TurnoGeneral.numero_turno.desc())\
-            .limit(5)\
-            .all()
+        ultimos_turnos = consultas.ultimos_turnos_mesa(mesa.id)
     
     return render_template('docente/dashboard.html', 
-                         mesa=mesa.to_dict() if mesa else None,
-                         usuario=usuario.to_dict(),
+                         mesa=mesa,
+                         usuario=usuario,
+                         sede=mesa.sede if mesa else sede_actual(),
                          ultimos_turnos=ultimos_turnos)
 
 @app.route('/public/turnos')
-def public_turnos():
-    mesas = Mesa.query.filter_by(activa=True, eliminada=False).all() 
-    ultimo_turno = TurnoGeneral.query.order_by(TurnoGeneral.numero_turno.desc()).first()
-    
+@app.route('/public/turnos/<sede>')
+def public_turnos(sede=SEDE_PREDETERMINADA):
     return render_template('public/turnos.html',
-                         mesas=[m.to_dict() for m in mesas],
-                         ultimo_turno=ultimo_turno)
+                         estado=estado_sedes.obtener(sede, lambda: cargar_ultimo_turno(sede)),
+                         sede=sede)
 
 @app.route('/api/estado_sistema')
 def api_estado_sistema():
     try:
-        mesas = Mesa.query.filter_by(eliminada=False).all()
+        sede = sede_actual()
+        mesas = consultas.mesas_con_docente(sede)
         mesas_data = []
         
         for mesa in mesas:
-            docente_nombre = 'Sin asignar'
-            if hasattr(mesa, 'docente') and mesa.docente:
-                docente_nombre = mesa.docente.nombre
-            
             mesas_data.append({
                 'id': mesa.id,
                 'numero': mesa.numero,
                 'activa': mesa.activa,
                 'turno_actual': mesa.turno_actual,
-                'docente': docente_nombre
+                'docente': mesa.docente_nombre,
+                'tiempo_servicio': estadisticas_mesa(mesa)
             })
         
-        proximo_turno = obtener_proximo_turno()
+        proximo_turno = obtener_proximo_turno(sede)
     
-        ultimos_turnos = TurnoGeneral.query.order_by(
-            TurnoGeneral.numero_turno.desc()
-        ).limit(10).all()
-        
         ultimos_turnos_data = []
-        for turno in ultimos_turnos:
-            mesa_numero = turno.mesa.numero if turno.mesa else 'N/A'
+        for turno in consultas.ultimos_turnos_sede(sede):
+            mesa_numero = turno.mesa_numero or 'N/A'
             ultimos_turnos_data.append({
                 'numero': turno.numero_turno,
                 'mesa': mesa_numero,
@@ -310,7 +426,8 @@ def api_estado_sistema():
             'proximo_turno': proximo_turno,
             'mesas': mesas_data,
             'ultimos_turnos': ultimos_turnos_data,
-            'total_turnos': TurnoGeneral.query.count(),
+            'total_turnos': consultas.total_turnos(sede),
+            'espera_estimada': espera_estimada(mesas, proximo_turno - 1, app.config['ESPERA_POSICIONES']),
             'timestamp': datetime.now().strftime("%H:%M:%S")
         })
     
@@ -320,41 +437,148 @@ def api_estado_sistema():
             'error': f'Error al obtener estado: {str(e)}'
         })
 
-@app.route('/api/ultimo_turno')
-def api_ultimo_turno():
-    ultimo_turno = TurnoGeneral.query.order_by(TurnoGeneral.numero_turno.desc()).first()
+def cargar_ultimo_turno(sede, conexion=None):
+    """Último turno de la sede y espera estimada, en una sola consulta indexada"""
+    ultimo_turno = consultas.ultimo_turno(sede, conexion)
     
     if not ultimo_turno:
-        return jsonify({
-            'success': True, 
-            'ultimo_turno': {
-                'turno': 0,
-                'mesa_numero': 0,
-                'docente': 'Sistema',
-                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                'mensaje': 'Esperando primer turno...'
-            }
-        })
+        return {
+            'turno': 0,
+            'mesa_numero': 0,
+            'docente': 'Sistema',
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'mensaje': 'Esperando primer turno...',
+            'espera_estimada': [],
+            'confirmado': None,
+            'cita': None
+        }
     
-    mesa_numero = ultimo_turno.mesa.numero if ultimo_turno.mesa else 0
+    mesa_numero = ultimo_turno.mesa_numero or 0
+    
+    return {
+        'turno': ultimo_turno.numero_turno,
+        'mesa_numero': mesa_numero,
+        'docente': ultimo_turno.docente,
+        'timestamp': ultimo_turno.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+        'mensaje': f'Turno {ultimo_turno.numero_turno} - Mesa {mesa_numero}',
+        'espera_estimada': espera_por_tasa(ultimo_turno.tasa_atencion, ultimo_turno.numero_turno, app.config['ESPERA_POSICIONES']),
+        'confirmado': milisegundos_utc(ultimo_turno.timestamp),
+        'cita': ultimo_turno.cita_hora.strftime("%H:%M") if ultimo_turno.cita_hora else None
+    }
+
+@app.route('/api/ultimo_turno')
+@app.route('/api/ultimo_turno/<sede>')
+def api_ultimo_turno(sede=None):
+    sede = sede or sede_actual()
     
     return jsonify({
         'success': True, 
-        'ultimo_turno': {
-            'turno': ultimo_turno.numero_turno,
-            'mesa_numero': mesa_numero,
-            'docente': ultimo_turno.docente,
-            'timestamp': ultimo_turno.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-            'mensaje': f'Turno {ultimo_turno.numero_turno} - Mesa {mesa_numero}'
-        }
+        'ultimo_turno': estado_sedes.obtener(sede, lambda: cargar_ultimo_turno(sede))
+    })
+
+def datos_tablero(estado):
+    """Solo lo que dibuja la pantalla pública: turno llamado, mesa y espera estimada"""
+    anuncio = None
+    if estado['turno'] and anunciador.disponible(estado['turno'], estado['mesa_numero']):
+        anuncio = url_for('audio_anuncio', huella=anunciador.huella, turno=estado['turno'], mesa=estado['mesa_numero'])
+    
+    return {
+        'success': True,
+        'turno': estado['turno'],
+        'mesa_numero': estado['mesa_numero'],
+        'espera_estimada': estado['espera_estimada'],
+        'anuncio': anuncio,
+        'confirmado': estado['confirmado'],
+        'cita': estado.get('cita')
+    }
+
+@app.route('/api/public/tablero')
+@app.route('/api/public/tablero/<sede>')
+def api_tablero_publico(sede=SEDE_PREDETERMINADA):
+    datos = datos_tablero(estado_sedes.obtener(sede, lambda: cargar_ultimo_turno(sede)))
+    datos['servidor'] = int(time.time() * 1000)
+    return jsonify(datos)
+
+@materializador_tablero.generador
+def generar_tablero(sede):
+    """Contenido de los archivos del tablero; se llama tras cada commit que toca la sede"""
+    with db.engine.connect() as conexion:
+        estado = cargar_ultimo_turno(sede, conexion)
+    estado_sedes.fijar(sede, estado)
+    
+    # Los trabajos en segundo plano confirman sin petición activa: url_for la necesita
+    with nullcontext() if has_request_context() else app.test_request_context():
+        datos = datos_tablero(estado)
+        datos['ultimo_turno'] = estado
+        datos['generado'] = int(time.time() * 1000)
+        return datos, render_template('public/_tablero.html', estado=estado)
+
+@app.route('/tablero/<sede>.<formato>')
+def tablero_materializado(sede, formato):
+    """Archivo del tablero ya generado: sin consultas ni plantillas, con ETag y 304"""
+    if formato not in ('json', 'html'):
+        abort(404)
+    if not os.path.exists(materializador_tablero.ruta(sede, formato)):
+        if not consultas.sede_existe(sede):
+            abort(404)
+        materializador_tablero.escribir(sede)
+    
+    respuesta = send_from_directory(materializador_tablero.directorio, f'{sede}.{formato}', conditional=True, etag=True, max_age=0)
+    respuesta.cache_control.no_cache = True
+    return respuesta
+
+def enviar_anuncio(ruta):
+    return send_file(ruta, mimetype='audio/wav', conditional=True, max_age=app.config['ANUNCIOS_MAX_AGE'])
+
+@app.route('/audio/anuncio/<huella>/turno-<int:turno>-mesa-<int:mesa>.wav')
+def audio_anuncio(huella, turno, mesa):
+    """Anuncio hablado "Turno N, mesa M", armado una vez y cacheado en disco y en el navegador"""
+    if huella != anunciador.huella:
+        return redirect(url_for('audio_anuncio', huella=anunciador.huella, turno=turno, mesa=mesa))
+    if not anunciador.disponible(turno, mesa):
+        return jsonify({'success': False, 'error': 'No hay grabaciones para este anuncio'}), 404
+    
+    try:
+        with anunciador.sirviendo(turno, mesa) as ruta:
+            respuesta = enviar_anuncio(ruta)
+    except FileNotFoundError:
+        # Otro worker lo descartó de la caché compartida antes de abrirlo: se vuelve a armar
+        with anunciador.sirviendo(turno, mesa) as ruta:
+            respuesta = enviar_anuncio(ruta)
+    respuesta.cache_control.public = True
+    respuesta.cache_control.immutable = True
+    return respuesta
+
+@app.route('/api/docente/mi_mesa')
+@login_required
+@docente_required
+def api_docente_mi_mesa():
+    """Solo lo que dibuja el panel del docente: su mesa y el último turno general de su sede"""
+    mesa = consultas.mi_mesa(session['usuario']['id'])
+    
+    if not mesa:
+        return jsonify({'success': True, 'mesa': None})
+    
+    return jsonify({
+        'success': True,
+        'mesa': {
+            'id': mesa.id,
+            'numero': mesa.numero,
+            'activa': mesa.activa,
+            'turno_actual': mesa.turno_actual
+        },
+        'sede': mesa.sede,
+        'ultimo_turno_general': mesa.ultimo_turno_general or 0,
+        'confirmado': milisegundos_utc(mesa.ultimo_confirmado),
+        'servidor': int(time.time() * 1000)
     })
 
 @app.route('/api/siguiente_turno/<int:mesa_id>', methods=['POST'])
 @login_required
+@idempotente
+@reintentar_en_conflicto(IntegrityError)
 def siguiente_turno(mesa_id):
-    global ultimo_turno_avanzado
-    
-    mesa = Mesa.query.get(mesa_id)
+    mesa = Mesa.query.filter_by(id=mesa_id, sede=sede_actual()).first()
     if not mesa or not mesa.activa or mesa.eliminada: 
         return jsonify({'success': False, 'error': 'Mesa no encontrada, inactiva o eliminada'})
     
@@ -362,37 +586,55 @@ def siguiente_turno(mesa_id):
     if hasattr(mesa, 'docente') and mesa.docente:
         docente_nombre = mesa.docente.nombre
     
-    numero_turno = obtener_proximo_turno()
+    numero_turno = obtener_proximo_turno(mesa.sede)
+    ahora = datetime.utcnow()
+    # Una cita ya presentada cuya hora llegó se atiende antes que el siguiente sin cita
+    cita = consultas.cita_en_espera(mesa_id, datetime.now() + timedelta(minutes=app.config['CITAS_ADELANTO_MINUTOS']))
 
     nuevo_turno = TurnoGeneral(
+        sede=mesa.sede,
         numero_turno=numero_turno,
         estado='atendiendo',
         mesa_id=mesa_id,
-        docente=docente_nombre
+        docente=docente_nombre,
+        timestamp=ahora
     )
     db.session.add(nuevo_turno)
     
+    if cita:
+        db.session.flush()
+        # Solo si sigue presente: una cancelación confirmada entre la lectura y aquí gana
+        atendida = db.session.execute(
+            update(Cita).where(Cita.id == cita.id, Cita.estado == 'presente')
+            .values(estado='atendida', turno_id=nuevo_turno.id)
+        ).rowcount == 1
+        if atendida:
+            metricas.incrementar('citas.atendidas')
+        else:
+            cita = None
+    
     mesa.turno_actual = numero_turno
+    registrar_avance(mesa, ahora, app.config['ESTIMADOR_ALFA'], app.config['ESTIMADOR_PAUSA_MAXIMA'])
     
-    historial = TurnoHistorial(
+    buffer_historial.registrar(
         mesa_id=mesa_id,
         turno=numero_turno,
         docente=docente_nombre,
-        accion='avance'
+        accion='avance',
+        sede=mesa.sede
     )
-    db.session.add(historial)
-    
-    ultimo_turno_avanzado = {
-        'turno': numero_turno,
-        'mesa_numero': mesa.numero,
-        'mesa_id': mesa_id,
-        'docente': docente_nombre,
-        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        'mensaje': f'Turno {numero_turno} - Mesa {mesa.numero}'
-    }
     
+    # El commit regenera el tablero (generar_tablero) y deja el estado nuevo en estado_sedes
     db.session.commit()
     
+    if cita:
+        return jsonify({
+            'success': True,
+            'nuevo_turno': numero_turno,
+            'cita': {'id': cita.id, 'nombre': cita.nombre, 'hora': cita.hora.strftime("%H:%M")},
+            'mensaje': f'Turno {numero_turno} (cita de las {cita.hora.strftime("%H:%M")}: {cita.nombre}) asignado a Mesa {mesa.numero}'
+        })
+    
     return jsonify({
         'success': True, 
         'nuevo_turno': numero_turno,
@@ -402,13 +644,15 @@ def siguiente_turno(mesa_id):
 @app.route('/api/asignar_docente_mesa', methods=['POST'])
 @login_required
 @admin_required
+@reintentar_en_conflicto()
 def asignar_docente_mesa():
     data = request.get_json()
     mesa_id = data.get('mesa_id')
     docente_id = data.get('docente_id')
     
-    mesa = Mesa.query.get(mesa_id)
-    docente = Usuario.query.get(docente_id)
+    sede = sede_actual()
+    mesa = Mesa.query.filter_by(id=mesa_id, sede=sede).first()
+    docente = Usuario.query.filter_by(id=docente_id, sede=sede).first()
     
     if not mesa or mesa.eliminada or not docente or docente.rol != 'docente':  
         return jsonify({'success': False, 'error': 'No se pudo realizar la asignación'})
@@ -432,21 +676,24 @@ def asignar_docente_mesa():
 @app.route('/api/activar_mesa/<int:mesa_id>', methods=['POST'])
 @login_required
 @admin_required
+@reintentar_en_conflicto()
 def activar_mesa(mesa_id):
-    mesa = Mesa.query.get(mesa_id)
+    mesa = Mesa.query.filter_by(id=mesa_id, sede=sede_actual()).first()
     if not mesa or mesa.eliminada:  
         return jsonify({'success': False, 'error': 'Mesa no encontrada o eliminada'})
     
-    mesa.activa = not mesa.activa
+    activa = mesa.activa = not mesa.activa
     db.session.commit()
     
-    return jsonify({'success': True, 'activa': mesa.activa})
+    return jsonify({'success': True, 'activa': activa})
 
 @app.route('/api/reiniciar_turnos/<int:mesa_id>', methods=['POST'])
 @login_required
 @admin_required
+@idempotente
+@reintentar_en_conflicto()
 def reiniciar_turnos(mesa_id):
-    mesa = Mesa.query.get(mesa_id)
+    mesa = Mesa.query.filter_by(id=mesa_id, sede=sede_actual()).first()
     if not mesa or mesa.eliminada:  
         return jsonify({'success': False, 'error': 'Mesa no encontrada or eliminada'})
 
@@ -454,13 +701,13 @@ def reiniciar_turnos(mesa_id):
     if hasattr(mesa, 'docente') and mesa.docente:
         docente_nombre = mesa.docente.nombre
     
-    historial = TurnoHistorial(
+    buffer_historial.registrar(
         mesa_id=mesa_id,
         turno=mesa.turno_actual,
         docente=docente_nombre,
-        accion='reinicio'
+        accion='reinicio',
+        sede=mesa.sede
     )
-    db.session.add(historial)
     
     mesa.turno_actual = 0
     db.session.commit()
@@ -470,11 +717,14 @@ def reiniciar_turnos(mesa_id):
 @app.route('/api/crear_mesa', methods=['POST'])
 @login_required
 @admin_required
+@idempotente
+@reintentar_en_conflicto()
 def api_crear_mesa():
     try:
-        numero = obtener_proximo_numero_mesa()
+        sede = sede_actual()
+        numero = obtener_proximo_numero_mesa(sede)
         
-        mesa_eliminada = Mesa.query.filter_by(numero=numero, eliminada=True).first()
+        mesa_eliminada = Mesa.query.filter_by(sede=sede, numero=numero, eliminada=True).first()
         
         if mesa_eliminada:
             mesa_eliminada.eliminada = False
@@ -491,14 +741,14 @@ def api_crear_mesa():
                 'message': f'Mesa {numero} recuperada correctamente'
             })
         else:
-            mesa_existente = Mesa.query.filter_by(numero=numero, eliminada=False).first()
+            mesa_existente = Mesa.query.filter_by(sede=sede, numero=numero, eliminada=False).first()
             if mesa_existente:
                 return jsonify({
                     'success': False, 
                     'error': f'Ya existe una mesa con el número {numero}'
                 })
             
-            nueva_mesa = Mesa(numero=numero, activa=True, turno_actual=0, eliminada=False)
+            nueva_mesa = Mesa(sede=sede, numero=numero, activa=True, turno_actual=0, eliminada=False)
             db.session.add(nueva_mesa)
             db.session.commit()
             
@@ -509,6 +759,8 @@ def api_crear_mesa():
                 'message': f'Mesa {numero} creada correctamente'
             })
         
+    except StaleDataError:
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)})
@@ -516,20 +768,23 @@ def api_crear_mesa():
 @app.route('/api/activar_mesa_api/<int:mesa_id>', methods=['POST'])
 @login_required
 @admin_required
+@reintentar_en_conflicto()
 def api_activar_mesa(mesa_id):
     try:
-        mesa = Mesa.query.get_or_404(mesa_id)
+        mesa = Mesa.query.filter_by(id=mesa_id, sede=sede_actual()).first_or_404()
         if mesa.eliminada: 
             return jsonify({'success': False, 'error': 'No se puede activar una mesa eliminada'})
             
-        mesa.activa = not mesa.activa
+        activa = mesa.activa = not mesa.activa
         db.session.commit()
         
         return jsonify({
             'success': True,
-            'activa': mesa.activa,
-            'message': f'Mesa {"activada" if mesa.activa else "desactivada"} correctamente'
+            'activa': activa,
+            'message': f'Mesa {"activada" if activa else "desactivada"} correctamente'
         })
+    except StaleDataError:
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)})
@@ -537,35 +792,37 @@ def api_activar_mesa(mesa_id):
 @app.route('/api/asignar_docente_api', methods=['POST'])
 @login_required
 @admin_required
+@reintentar_en_conflicto()
 def api_asignar_docente():
     try:
         data = request.get_json()
         mesa_id = data.get('mesa_id')
         docente_id = data.get('docente_id')
         
-        mesa = Mesa.query.get_or_404(mesa_id)
+        mesa = Mesa.query.filter_by(id=mesa_id, sede=sede_actual()).first_or_404()
         
         if mesa.eliminada: 
             return jsonify({'success': False, 'error': 'No se puede asignar docente a una mesa eliminada'})
         
         if docente_id:
+            # Primero la sede: de un docente de otra sede no se revela ni el nombre
+            docente = Usuario.query.filter_by(id=docente_id, sede=mesa.sede).first()
+            if not docente or docente.rol != 'docente':
+                return jsonify({'success': False, 'error': 'Docente no válido'})
+            
             if docente_ya_asignado(docente_id):
-                docente_existente = Usuario.query.get(docente_id)
                 mesa_existente = Mesa.query.filter_by(
                     docente_id=docente_id, 
+                    sede=mesa.sede,
                     activa=True, 
                     eliminada=False
                 ).first()
                 
                 return jsonify({
                     'success': False, 
-                    'error': f'El docente {docente_existente.nombre} ya está asignado a la Mesa {mesa_existente.numero}'
+                    'error': f'El docente {docente.nombre} ya está asignado a la Mesa {mesa_existente.numero}'
                 })
             
-            docente = Usuario.query.get(docente_id)
-            if not docente or docente.rol != 'docente':
-                return jsonify({'success': False, 'error': 'Docente no válido'})
-            
             mesa.docente_id = docente_id
             docente_name = docente.nombre
         else:
@@ -579,6 +836,8 @@ def api_asignar_docente():
             'docente': docente_name,
             'message': 'Docente asignado correctamente' if docente_id else 'Docente removido correctamente'
         })
+    except StaleDataError:
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)})
@@ -586,9 +845,10 @@ def api_asignar_docente():
 @app.route('/api/eliminar_mesa/<int:mesa_id>', methods=['DELETE'])
 @login_required
 @admin_required
+@reintentar_en_conflicto()
 def api_eliminar_mesa(mesa_id):
     try:
-        mesa = Mesa.query.get_or_404(mesa_id)
+        mesa = Mesa.query.filter_by(id=mesa_id, sede=sede_actual()).first_or_404()
         
         mesa.eliminada = True
         mesa.activa = False
@@ -602,6 +862,8 @@ def api_eliminar_mesa(mesa_id):
             'message': 'Mesa marcada como eliminada',
             'mesa_numero': mesa.numero  
         })
+    except StaleDataError:
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)})
@@ -609,9 +871,10 @@ def api_eliminar_mesa(mesa_id):
 @app.route('/api/recuperar_mesa/<int:mesa_id>', methods=['POST'])
 @login_required
 @admin_required
+@reintentar_en_conflicto()
 def api_recuperar_mesa(mesa_id):
     try:
-        mesa = Mesa.query.get_or_404(mesa_id)
+        mesa = Mesa.query.filter_by(id=mesa_id, sede=sede_actual()).first_or_404()
         
         if not mesa.eliminada:
             return jsonify({'success': False, 'error': 'La mesa no está eliminada'})
@@ -626,6 +889,8 @@ def api_recuperar_mesa(mesa_id):
             'message': f'Mesa {mesa.numero} recuperada correctamente',
             'mesa': mesa.to_dict()
         })
+    except StaleDataError:
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)})
@@ -635,7 +900,7 @@ def api_recuperar_mesa(mesa_id):
 @admin_required
 def api_mesas_eliminadas():
     try:
-        mesas_eliminadas = Mesa.query.filter_by(eliminada=True).order_by(Mesa.numero).all()
+        mesas_eliminadas = Mesa.query.filter_by(sede=sede_actual(), eliminada=True).order_by(Mesa.numero).all()
         
         return jsonify({
             'success': True,
@@ -647,9 +912,11 @@ def api_mesas_eliminadas():
 @app.route('/api/reiniciar_turnos_mesa/<int:mesa_id>', methods=['POST'])
 @login_required
 @admin_required
+@idempotente
+@reintentar_en_conflicto()
 def api_reiniciar_turnos(mesa_id):
     try:
-        mesa = Mesa.query.get_or_404(mesa_id)
+        mesa = Mesa.query.filter_by(id=mesa_id, sede=sede_actual()).first_or_404()
         
         if mesa.eliminada: 
             return jsonify({'success': False, 'error': 'No se puede reiniciar turnos de una mesa eliminada'})
@@ -658,13 +925,13 @@ def api_reiniciar_turnos(mesa_id):
         if hasattr(mesa, 'docente') and mesa.docente:
             docente_nombre = mesa.docente.nombre
         
-        historial = TurnoHistorial(
+        buffer_historial.registrar(
             mesa_id=mesa_id,
             turno=mesa.turno_actual,
             docente=docente_nombre,
-            accion='reinicio'
+            accion='reinicio',
+            sede=mesa.sede
         )
-        db.session.add(historial)
         
         mesa.turno_actual = 0
         db.session.commit()
@@ -674,13 +941,82 @@ def api_reiniciar_turnos(mesa_id):
             'nuevo_turno': mesa.turno_actual,
             'message': 'Turno reiniciado correctamente'
         })
+    except StaleDataError:
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/simular_mesas')
+@login_required
+@admin_required
+def api_simular_mesas():
+    """Cuántas mesas abrir en una franja horaria, simulando muchas jornadas con la demanda registrada"""
+    try:
+        sede = sede_actual()
+        desde = request.args.get('desde', 9, type=int)
+        hasta = request.args.get('hasta', 12, type=int)
+        mesas_max = min(request.args.get('mesas_max', 10, type=int), 50)
+        dias = min(request.args.get('dias', app.config['SIMULADOR_DIAS'], type=int), 20000)
+        objetivo = request.args.get('objetivo', app.config['SIMULADOR_OBJETIVO_MINUTOS'], type=float)
+        fecha = request.args.get('fecha')
+        
+        if not 0 <= desde < hasta <= 24:
+            return jsonify({'success': False, 'error': 'Franja horaria no válida'})
+        
+        dia_semana = datetime.strptime(fecha, '%Y-%m-%d').weekday() if fecha else None
+        inicio = time.perf_counter()
+        
+        # Los timestamps se guardan en UTC; la franja pedida es en hora local
+        desfase = datetime.now() - datetime.utcnow()
+        limite = datetime.utcnow() - timedelta(days=app.config['SIMULADOR_DIAS_HISTORIA'])
+        
+        llegadas = [t + desfase for t in db.session.execute(
+            select(TurnoGeneral.timestamp)
+            .where(TurnoGeneral.sede == sede, TurnoGeneral.timestamp >= limite)
+        ).scalars()]
+        if dia_semana is not None:
+            llegadas = [t for t in llegadas if t.weekday() == dia_semana]
+        
+        avances = db.session.execute(
+            select(TurnoHistorial.mesa_id, TurnoHistorial.timestamp)
+            .where(TurnoHistorial.sede == sede, TurnoHistorial.accion == 'avance', TurnoHistorial.timestamp >= limite)
+        ).all()
+        servicio = tiempos_servicio(
+            [a.mesa_id or 0 for a in avances],
+            [a.timestamp.timestamp() for a in avances],
+            app.config['ESTIMADOR_PAUSA_MAXIMA']
+        )
+        
+        if not llegadas or len(servicio) == 0:
+            return jsonify({'success': False, 'error': 'No hay historial suficiente para simular'})
+        
+        dias_observados = len({t.date() for t in llegadas})
+        tasas = ajustar_llegadas([t.hour for t in llegadas], dias_observados, desde, hasta)
+        recomendacion, escenarios = planificar(tasas, servicio, mesas_max, dias, objetivo)
+        
+        return jsonify({
+            'success': True,
+            'recomendacion': recomendacion,
+            'objetivo_minutos': objetivo,
+            'escenarios': escenarios,
+            'modelo': {
+                'llegadas_por_hora': {f'{desde + i:02d}:00': round(float(t), 2) for i, t in enumerate(tasas)},
+                'dias_observados': dias_observados,
+                'servicio_media_min': round(float(servicio.mean()) / 60.0, 2),
+                'muestras_servicio': int(len(servicio)),
+                'jornadas_simuladas': dias
+            },
+            'duracion_ms': round((time.perf_counter() - inicio) * 1000, 1)
+        })
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Error al simular: {str(e)}'})
+
 @app.route('/api/crear_usuario', methods=['POST'])
 @login_required
 @admin_required
+@idempotente
 def crear_usuario():
     try:
         data = request.get_json()
@@ -699,9 +1035,10 @@ def crear_usuario():
             return jsonify({'success': False, 'error': 'Rol no válido'})
         
         nuevo_usuario = Usuario(
+            sede=sede_actual(),
             nombre=nombre,
             email=email,
-            password=password,
+            password=contrasenas.generar(password),
             rol=rol,
             activo=True
         )
@@ -731,7 +1068,7 @@ def editar_usuario(usuario_id):
         rol = data.get('rol')
         activo = data.get('activo')
         
-        usuario = Usuario.query.get(usuario_id)
+        usuario = Usuario.query.filter_by(id=usuario_id, sede=sede_actual()).first()
         if not usuario:
             return jsonify({'success': False, 'error': 'Usuario no encontrado'})
         
@@ -750,7 +1087,7 @@ def editar_usuario(usuario_id):
             usuario.activo = activo
         
         if password:
-            usuario.password = password
+            usuario.password = contrasenas.generar(password)
         
         db.session.commit()
         
@@ -767,9 +1104,10 @@ def editar_usuario(usuario_id):
 @app.route('/api/eliminar_usuario/<int:usuario_id>', methods=['DELETE'])
 @login_required
 @admin_required
+@reintentar_en_conflicto()
 def eliminar_usuario(usuario_id):
     try:
-        usuario = Usuario.query.get(usuario_id)
+        usuario = Usuario.query.filter_by(id=usuario_id, sede=sede_actual()).first()
         if not usuario:
             return jsonify({'success': False, 'error': 'Usuario no encontrado'})
         
@@ -789,6 +1127,8 @@ def eliminar_usuario(usuario_id):
             'message': f'Usuario {usuario.nombre} eliminado exitosamente'
         })
         
+    except StaleDataError:
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': f'Error al eliminar usuario: {str(e)}'})
@@ -798,7 +1138,7 @@ def eliminar_usuario(usuario_id):
 @admin_required
 def obtener_usuario(usuario_id):
     try:
-        usuario = Usuario.query.get(usuario_id)
+        usuario = Usuario.query.filter_by(id=usuario_id, sede=sede_actual()).first()
         if not usuario:
             return jsonify({'success': False, 'error': 'Usuario no encontrado'})
         
@@ -819,32 +1159,385 @@ def obtener_usuario(usuario_id):
     except Exception as e:
         return jsonify({'success': False, 'error': f'Error al obtener usuario: {str(e)}'})
 
+def borrar_por_lotes(modelo, condicion, lote, al_borrar=None):
+    """Borrar las filas que cumplen la condición en transacciones cortas de `lote` filas"""
+    total = 0
+    while True:
+        ids = select(modelo.id).where(condicion).limit(lote)
+        borradas = db.session.execute(delete(modelo).where(modelo.id.in_(ids))).rowcount
+        db.session.commit()
+        if not borradas:
+            return total
+        total += borradas
+        if al_borrar:
+            al_borrar(borradas)
+
+@ejecutor_trabajos.tarea('reiniciar_sistema')
+def trabajo_reiniciar_sistema(trabajo_id, progreso, sede):
+    buffer_historial.vaciar()
+    
+    mesa_ids = db.session.execute(select(Mesa.id).where(Mesa.sede == sede)).scalars().all()
+    total = db.session.execute(select(func.count()).select_from(TurnoHistorial).where(TurnoHistorial.mesa_id.in_(mesa_ids))).scalar() \
+        + db.session.execute(select(func.count()).select_from(TurnoGeneral).where(TurnoGeneral.sede == sede)).scalar()
+    borradas = 0
+    
+    def avanzar(cantidad):
+        nonlocal borradas
+        borradas += cantidad
+        progreso(borradas / max(total, 1), f'{borradas} de {total} registros eliminados')
+    
+    lote = app.config['TRABAJOS_LOTE']
+    borrar_por_lotes(TurnoHistorial, TurnoHistorial.mesa_id.in_(mesa_ids), lote, avanzar)
+    borrar_por_lotes(TurnoGeneral, TurnoGeneral.sede == sede, lote, avanzar)
+    db.session.execute(delete(Cita).where(Cita.mesa_id.in_(mesa_ids)))
+    db.session.execute(delete(Mesa).where(Mesa.id.in_(mesa_ids)))
+    materializador_tablero.marcar(db.session, sede)
+    db.session.commit()
+    
+    indice_citas.invalidar(sede)
+    
+    return {
+        'mesas_eliminadas': len(mesa_ids),
+        'registros_eliminados': borradas,
+        'message': 'Sistema reiniciado correctamente. Todas las mesas han sido eliminadas permanentemente.'
+    }
+
+@ejecutor_trabajos.tarea('exportar_historial')
+def trabajo_exportar_historial(trabajo_id, progreso, sede):
+    total = db.session.execute(select(func.count()).select_from(TurnoHistorial).where(TurnoHistorial.sede == sede)).scalar()
+    directorio = os.path.join(app.instance_path, 'exportaciones')
+    os.makedirs(directorio, exist_ok=True)
+    nombre = f'historial-{sede}-{trabajo_id}.csv'
+    temporal = os.path.join(directorio, nombre + '.tmp')
+    
+    # Lotes por clave (id > último exportado): ninguna lectura queda abierta mientras se
+    # informa el progreso, que en SQLite necesita escribir desde otra conexión
+    consulta = select(TurnoHistorial.id, TurnoHistorial.timestamp, Mesa.numero, TurnoHistorial.turno,
+                      TurnoHistorial.docente, TurnoHistorial.accion)\
+        .outerjoin(Mesa, TurnoHistorial.mesa_id == Mesa.id)\
+        .where(TurnoHistorial.sede == sede)\
+        .order_by(TurnoHistorial.id)\
+        .limit(app.config['TRABAJOS_LOTE'])
+    
+    escritas = 0
+    ultimo_id = 0
+    with open(temporal, 'w', newline='', encoding='utf-8') as archivo:
+        escritor = csv.writer(archivo)
+        escritor.writerow(['fecha', 'mesa', 'turno', 'docente', 'accion'])
+        while True:
+            filas = db.session.execute(consulta.where(TurnoHistorial.id > ultimo_id)).all()
+            db.session.commit()
+            if not filas:
+                break
+            escritor.writerows([
+                fila.timestamp.strftime("%Y-%m-%d %H:%M:%S") if fila.timestamp else '',
+                fila.numero, fila.turno, fila.docente, fila.accion
+            ] for fila in filas)
+            escritas += len(filas)
+            ultimo_id = filas[-1].id
+            progreso(escritas / max(total, 1), f'{escritas} de {total} registros exportados')
+    os.replace(temporal, os.path.join(directorio, nombre))
+    
+    return {'archivo': nombre, 'filas': escritas, 'message': f'{escritas} registros exportados'}
+
+def respuesta_trabajo(trabajo, codigo=200):
+    datos = trabajo.to_dict()
+    if trabajo.tipo == 'exportar_historial' and trabajo.estado == 'completado':
+        datos['descarga'] = url_for('api_descargar_trabajo', trabajo_id=trabajo.id)
+    return jsonify({
+        'success': True,
+        'trabajo': datos,
+        'estado_url': url_for('api_trabajo', trabajo_id=trabajo.id)
+    }), codigo
+
 @app.route('/api/reiniciar_sistema', methods=['POST'])
 @login_required
 @admin_required
+@idempotente
 def reiniciar_sistema():
+    """Lanza el reinicio en segundo plano; el avance se consulta en /api/jobs/<id>"""
     try:
-        mesas = Mesa.query.all()
-        for mesa in mesas:
-            TurnoHistorial.query.filter_by(mesa_id=mesa.id).delete()
-            TurnoGeneral.query.filter_by(mesa_id=mesa.id).delete()
-            db.session.delete(mesa)
-        
-        TurnoGeneral.query.delete()
+        trabajo = ejecutor_trabajos.lanzar('reiniciar_sistema', sede_actual(), session['usuario']['id'])
+        return respuesta_trabajo(trabajo, 202)
     
-        global ultimo_turno_avanzado
-        ultimo_turno_avanzado = None
-        
-        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': f'Error al reiniciar: {str(e)}'})
 
-        return jsonify({
-            'success': True, 
-            'message': 'Sistema reiniciado correctamente. Todas las mesas han sido eliminadas permanentemente.'
-        })
+@app.route('/api/exportar_historial', methods=['POST'])
+@login_required
+@admin_required
+@idempotente
+def api_exportar_historial():
+    try:
+        trabajo = ejecutor_trabajos.lanzar('exportar_historial', sede_actual(), session['usuario']['id'])
+        return respuesta_trabajo(trabajo, 202)
     
     except Exception as e:
         db.session.rollback()
-        return jsonify({'success': False, 'error': f'Error al reiniciar: {str(e)}'})
+        return jsonify({'success': False, 'error': f'Error al exportar: {str(e)}'})
+
+@app.route('/api/jobs/<int:trabajo_id>')
+@login_required
+@admin_required
+def api_trabajo(trabajo_id):
+    trabajo = Trabajo.query.filter_by(id=trabajo_id, sede=sede_actual()).first()
+    if not trabajo:
+        return jsonify({'success': False, 'error': 'Trabajo no encontrado'}), 404
+    return respuesta_trabajo(trabajo)
+
+@app.route('/api/jobs/<int:trabajo_id>/archivo')
+@login_required
+@admin_required
+def api_descargar_trabajo(trabajo_id):
+    trabajo = Trabajo.query.filter_by(id=trabajo_id, sede=sede_actual(), estado='completado').first()
+    resultado = trabajo.to_dict()['resultado'] if trabajo else None
+    if not resultado or 'archivo' not in resultado:
+        return jsonify({'success': False, 'error': 'Archivo no disponible'}), 404
+    
+    return send_from_directory(os.path.join(app.instance_path, 'exportaciones'), resultado['archivo'], as_attachment=True)
+
+def leer_fecha(texto):
+    try:
+        return datetime.strptime(texto, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+def leer_hora(texto):
+    try:
+        return datetime.strptime(texto, "%H:%M").time()
+    except (TypeError, ValueError):
+        return None
+
+def leer_entero(valor):
+    try:
+        return int(valor) if valor not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+def mesas_para_citas(sede, mesa_id=None, docente_id=None):
+    """Mesas de la sede que pueden recibir citas.
+
+    Sin mesa ni docente indicados, solo las activas con docente asignado: siguiente_turno
+    rechaza las inactivas, así que una cita asignada a una de ellas nunca se llamaría.
+    """
+    mesas = consultas.mesas_con_docente(sede)
+    if mesa_id:
+        mesas = [m for m in mesas if m.id == mesa_id]
+    if docente_id:
+        mesas = [m for m in mesas if m.docente_id == docente_id]
+    if not mesa_id and not docente_id:
+        mesas = [m for m in mesas if m.activa and m.docente_id]
+    return mesas
+
+@app.route('/api/citas/disponibles')
+@login_required
+def api_citas_disponibles():
+    """Franjas libres del día por mesa, respondidas desde el índice en memoria"""
+    sede = sede_actual()
+    fecha = leer_fecha(request.args.get('fecha')) or datetime.now().date()
+    mesas = mesas_para_citas(sede, request.args.get('mesa_id', type=int), request.args.get('docente_id', type=int))
+    
+    libres = indice_citas.disponibles(sede, fecha, [m.id for m in mesas], indice_citas.primera_franja(fecha))
+    
+    return jsonify({
+        'success': True,
+        'fecha': fecha.isoformat(),
+        'duracion_minutos': indice_citas.duracion,
+        'mesas': [{
+            'mesa_id': m.id,
+            'mesa': m.numero,
+            'docente_id': m.docente_id,
+            'docente': m.docente_nombre,
+            'horas': [indice_citas.hora(f).strftime("%H:%M") for f in libres[m.id]]
+        } for m in mesas]
+    })
+
+@app.route('/api/citas')
+@login_required
+def api_citas():
+    fecha = leer_fecha(request.args.get('fecha')) or datetime.now().date()
+    citas = Cita.query.filter_by(sede=sede_actual(), fecha=fecha).order_by(Cita.hora, Cita.mesa_id).all()
+    return jsonify({'success': True, 'fecha': fecha.isoformat(), 'citas': [c.to_dict() for c in citas]})
+
+@app.route('/api/citas', methods=['POST'])
+@login_required
+@idempotente
+def api_reservar_cita():
+    data = request.get_json(silent=True) or {}
+    sede = sede_actual()
+    fecha = leer_fecha(data.get('fecha'))
+    hora = leer_hora(data.get('hora'))
+    nombre = (data.get('nombre') or '').strip()[:100]
+    
+    if not fecha or not hora or not nombre:
+        return jsonify({'success': False, 'error': 'Fecha (AAAA-MM-DD), hora (HH:MM) y nombre son requeridos'})
+    
+    franja = indice_citas.franja(hora)
+    if franja is None:
+        return jsonify({'success': False, 'error': f'La hora no coincide con ninguna franja de {indice_citas.duracion} minutos'})
+    if franja < indice_citas.primera_franja(fecha):
+        return jsonify({'success': False, 'error': 'Esa franja ya pasó'})
+    
+    mesa_id, docente_id = leer_entero(data.get('mesa_id')), leer_entero(data.get('docente_id'))
+    if (data.get('mesa_id') and mesa_id is None) or (data.get('docente_id') and docente_id is None):
+        return jsonify({'success': False, 'error': 'mesa_id y docente_id deben ser números'}), 400
+    
+    mesas = mesas_para_citas(sede, mesa_id, docente_id)
+    if not mesas:
+        return jsonify({'success': False, 'error': 'No hay mesas que puedan recibir citas con esos datos'}), 404
+    mesa_id = indice_citas.mesa_libre(sede, fecha, [m.id for m in mesas], franja)
+    if mesa_id is None:
+        return jsonify({'success': False, 'error': 'No hay mesas libres en esa franja'}), 409
+    mesa = next(m for m in mesas if m.id == mesa_id)
+    
+    cita = Cita(
+        sede=sede,
+        mesa_id=mesa_id,
+        docente_id=mesa.docente_id,
+        fecha=fecha,
+        hora=hora,
+        nombre=nombre,
+        contacto=(data.get('contacto') or '').strip()[:100] or None
+    )
+    db.session.add(cita)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Otro worker la reservó y este índice todavía no lo sabía
+        db.session.rollback()
+        indice_citas.invalidar(sede, fecha)
+        return jsonify({'success': False, 'error': 'La franja acaba de ser reservada, elige otra'}), 409
+    
+    indice_citas.ocupar(sede, fecha, mesa_id, hora)
+    metricas.incrementar('citas.reservadas')
+    
+    return jsonify({
+        'success': True,
+        'message': f'Cita reservada para el {fecha.strftime("%d/%m/%Y")} a las {hora.strftime("%H:%M")} en la Mesa {mesa.numero}',
+        'cita': cita.to_dict()
+    })
+
+@app.route('/api/citas/<int:cita_id>/presentar', methods=['POST'])
+@login_required
+def api_presentar_cita(cita_id):
+    """Registrar la llegada: la mesa llamará la cita en su próximo avance desde su hora"""
+    cita = Cita.query.filter_by(id=cita_id, sede=sede_actual()).first()
+    if not cita or cita.estado != 'reservada':
+        return jsonify({'success': False, 'error': 'Cita no encontrada o ya presentada, atendida o cancelada'})
+    if cita.fecha != datetime.now().date():
+        return jsonify({'success': False, 'error': 'La cita no es de hoy'})
+    
+    cita.estado = 'presente'
+    cita.presentado = datetime.utcnow()
+    db.session.commit()
+    metricas.incrementar('citas.presentadas')
+    
+    return jsonify({
+        'success': True,
+        'message': f'{cita.nombre} será llamado en la Mesa {cita.mesa.numero} a partir de las {cita.hora.strftime("%H:%M")}',
+        'cita': cita.to_dict()
+    })
+
+@app.route('/api/citas/<int:cita_id>/cancelar', methods=['POST'])
+@login_required
+def api_cancelar_cita(cita_id):
+    cita = Cita.query.filter_by(id=cita_id, sede=sede_actual()).first()
+    if not cita or cita.estado not in ('reservada', 'presente'):
+        return jsonify({'success': False, 'error': 'Cita no encontrada o ya atendida o cancelada'})
+    
+    cita.estado = 'cancelada'
+    db.session.commit()
+    indice_citas.liberar(cita.sede, cita.fecha, cita.mesa_id, cita.hora)
+    
+    return jsonify({'success': True, 'cita': cita.to_dict()})
+
+@app.route('/api/metricas')
+@login_required
+@admin_required
+def api_metricas():
+    return jsonify({'success': True, 'metricas': metricas.resumen()})
+
+@app.route('/api/telemetria', methods=['POST'])
+def api_telemetria():
+    """Latido de una pantalla: versión dibujada, ida y vuelta y latencia de los turnos nuevos"""
+    datos = request.get_json(silent=True)
+    if not isinstance(datos, dict) or not telemetria_pantallas.registrar(datos, request.remote_addr, request.user_agent.string):
+        return jsonify({'success': False, 'error': 'Datos de telemetría no válidos'}), 400
+    return jsonify({'success': True, 'servidor': int(time.time() * 1000)})
+
+@app.route('/admin/pantallas')
+@login_required
+@admin_required
+def admin_pantallas():
+    versiones = {sede: estado_sedes.obtener(sede, lambda sede=sede: cargar_ultimo_turno(sede))['turno']
+                 for sede in telemetria_pantallas.sedes()}
+    return render_template('admin/pantallas.html', resumen=telemetria_pantallas.resumen(versiones))
+
+@app.route('/admin/consultas_lentas')
+@login_required
+@admin_required
+def admin_consultas_lentas():
+    return render_template('admin/consultas_lentas.html',
+                         consultas=consultas_lentas.peores(),
+                         umbral_ms=app.config['CONSULTAS_LENTAS_UMBRAL_MS'])
+
+@app.route('/admin/perfiles')
+@login_required
+@admin_required
+def admin_perfiles():
+    return jsonify({'success': True, 'perfiles': perfilador.listar()})
+
+@app.route('/admin/perfiles/<nombre>.<formato>')
+@login_required
+@admin_required
+def admin_descargar_perfil(nombre, formato):
+    if formato not in ('prof', 'collapsed'):
+        abort(404)
+    return send_from_directory(perfilador.directorio, f'{nombre}.{formato}', as_attachment=True)
+
+@app.cli.command('inicializar-estimador')
+def inicializar_estimador():
+    """Calcular las estadísticas de atención de cada mesa a partir del historial existente"""
+    filas = db.session.query(TurnoHistorial.mesa_id, TurnoHistorial.timestamp)\
+        .filter(TurnoHistorial.accion == 'avance', TurnoHistorial.mesa_id.isnot(None))\
+        .all()
+    
+    estadisticas = calcular_estadisticas_historial(
+        [fila.mesa_id for fila in filas],
+        [fila.timestamp.timestamp() for fila in filas],
+        app.config['ESTIMADOR_ALFA'],
+        app.config['ESTIMADOR_PAUSA_MAXIMA']
+    )
+    
+    for mesa in Mesa.query.filter(Mesa.id.in_(list(estadisticas))).all():
+        media, varianza, muestras, ultimo = estadisticas[mesa.id]
+        mesa.servicio_media = media
+        mesa.servicio_var = varianza
+        mesa.servicio_muestras = muestras
+        mesa.ultimo_avance = datetime.fromtimestamp(ultimo)
+    
+    db.session.commit()
+    print(f"Estadísticas inicializadas para {len(estadisticas)} mesas a partir de {len(filas)} avances")
+
+@app.cli.command('hashear-contrasenas')
+def hashear_contrasenas():
+    """Convertir a hash las contraseñas que siguen en texto plano sin esperar al próximo login"""
+    usuarios = [u for u in Usuario.query.all() if not contrasenas.es_hash(u.password)]
+    for usuario in usuarios:
+        usuario.password = contrasenas.generar(usuario.password)
+    
+    db.session.commit()
+    print(f"Contraseñas convertidas a hash: {len(usuarios)}")
+
+@app.cli.command('verificar-voz')
+def verificar_voz():
+    """Listar los clips de voz que faltan para anunciar cualquier turno y mesa"""
+    faltantes = anunciador.faltantes(CLIPS)
+    if faltantes:
+        print(f"Faltan {len(faltantes)} de {len(CLIPS)} clips en {anunciador.directorio_voz}: {', '.join(faltantes)}")
+    else:
+        print(f"Los {len(CLIPS)} clips de voz están disponibles (huella {anunciador.huella})")
 
 @app.errorhandler(404)
 def pagina_no_encontrada(error):
@@ -854,9 +1547,19 @@ def pagina_no_encontrada(error):
 def error_servidor(error):
     return render_template('errors/500.html'), 500
 
+base_datos_inicializada = False
+lock_inicializacion = threading.Lock()
+
 @app.before_request
 def create_tables():
-    inicializar_base_datos()
+    global base_datos_inicializada
+    if base_datos_inicializada:
+        return
+    # Las primeras peticiones llegan a la vez en un servidor con hilos: inicializar una sola vez
+    with lock_inicializacion:
+        if not base_datos_inicializada:
+            inicializar_base_datos()
+            base_datos_inicializada = True
 
 if __name__ == '__main__':
     host = os.getenv('FLASK_HOST', '0.0.0.0')
@@ -0,0 +1,111 @@
+"""Benchmark de la búsqueda de franjas libres para citas.
+
+Llena un día con miles de citas repartidas entre muchas mesas y mide:
+
+- la consulta de franjas libres de todas las mesas desde el índice en memoria
+  (IndiceCitas.disponibles) y la búsqueda de una mesa libre para una franja;
+- lo mismo resuelto leyendo las citas del día desde la base en cada consulta,
+  que es lo que costaría sin índice (y lo que cuesta recargar un día al vencer el TTL);
+- la reconstrucción completa del índice al iniciar.
+
+Uso:
+    python benchmarks/bench_citas.py --mesas 50 --duracion 5 --ocupacion 0.6
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def medir(funcion, repeticiones):
+    funcion()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1e6)
+    tiempos.sort()
+    return statistics.median(tiempos), tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.99))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Franjas libres de citas: índice en memoria contra la base')
+    parser.add_argument('--db', default='sqlite:////tmp/turnero_bench_citas.db')
+    parser.add_argument('--mesas', type=int, default=50)
+    parser.add_argument('--duracion', type=int, default=5, help='minutos por franja')
+    parser.add_argument('--ocupacion', type=float, default=0.6)
+    parser.add_argument('--dias', type=int, default=30, help='días con citas (solo cuentan para la reconstrucción)')
+    parser.add_argument('--repeticiones', type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ['TURNERO_DATABASE_URI'] = args.db
+    os.environ['CITAS_DURACION_MINUTOS'] = str(args.duracion)
+    os.environ.setdefault('CONSULTAS_LENTAS_HABILITADO', 'False')
+    from app import app, db, inicializar_base_datos
+    from citas import indice_citas
+    from models import Cita, Mesa, SEDE_PREDETERMINADA
+
+    with app.app_context():
+        db.drop_all()
+    inicializar_base_datos()
+
+    sede = SEDE_PREDETERMINADA
+    manana = datetime.now().date() + timedelta(days=1)
+    rng = random.Random(0)
+
+    with app.app_context():
+        db.session.query(Mesa).delete()
+        db.session.add_all([Mesa(sede=sede, numero=n, activa=True, eliminada=False) for n in range(1, args.mesas + 1)])
+        db.session.commit()
+        mesas = [m.id for m in Mesa.query.filter_by(sede=sede).order_by(Mesa.numero)]
+
+        filas = []
+        for dia in range(args.dias):
+            fecha = manana + timedelta(days=dia)
+            for mesa_id in mesas:
+                for franja in range(indice_citas.franjas):
+                    if rng.random() < args.ocupacion:
+                        filas.append({'sede': sede, 'mesa_id': mesa_id, 'fecha': fecha, 'hora': indice_citas.hora(franja),
+                                      'nombre': f'Cliente {len(filas)}', 'estado': 'reservada'})
+        for desde in range(0, len(filas), 20000):
+            db.session.execute(insert(Cita), filas[desde:desde + 20000])
+        db.session.commit()
+        del_dia = sum(1 for f in filas if f['fecha'] == manana)
+        print(f'{args.mesas} mesas x {indice_citas.franjas} franjas de {args.duracion} min; '
+              f'{del_dia} citas el día medido, {len(filas)} en total ({args.dias} días)\n')
+
+        inicio = time.perf_counter()
+        indice_citas.reconstruir()
+        print(f'reconstrucción del índice: {(time.perf_counter() - inicio) * 1000:.1f} ms')
+
+        franja_media = indice_citas.franjas // 2
+        desde = 0
+
+        def sin_indice():
+            mapas = indice_citas._cargar_dia(sede, manana)
+            return {m: [f for f in range(desde, indice_citas.franjas) if not mapas.get(m, 0) >> f & 1] for m in mesas}
+
+        casos = {
+            'franjas libres de todas las mesas (índice)': lambda: indice_citas.disponibles(sede, manana, mesas, desde),
+            'mesa libre para una franja (índice)': lambda: indice_citas.mesa_libre(sede, manana, mesas, franja_media),
+            'franjas libres leyendo la base': sin_indice,
+        }
+        print(f'\n{"caso":48} {"p50 (us)":>10} {"p99 (us)":>10}')
+        for nombre, funcion in casos.items():
+            repeticiones = args.repeticiones if 'índice' in nombre else max(args.repeticiones // 20, 20)
+            p50, p99 = medir(funcion, repeticiones)
+            print(f'{nombre:48} {p50:10.1f} {p99:10.1f}')
+
+        assert indice_citas.disponibles(sede, manana, mesas, desde) == sin_indice()
+        print('\nel índice coincide con la base')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Prueba de contención sobre una misma mesa con control de concurrencia optimista.
+
+Lanza varios hilos que alternan activa/inactiva sobre la misma mesa y otros que avanzan
+turnos en paralelo, y comprueba que no se pierde ninguna actualización:
+
+- cada cambio de estado confirmado parte del estado dejado por el anterior, así que
+  las respuestas 'activa' alternan y el estado final coincide con la paridad;
+- cada avance confirmado tiene su propio numero_turno, sin huecos ni duplicados, y
+  turno_actual de cada mesa es el último número que se le asignó.
+
+Uso:
+    python benchmarks/bench_concurrencia.py --hilos 8 --operaciones 25
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def en_paralelo(hilos, trabajo):
+    barrera = threading.Barrier(hilos)
+    resultados = [None] * hilos
+
+    def ejecutar(indice):
+        barrera.wait()
+        resultados[indice] = trabajo(indice)
+
+    trabajadores = [threading.Thread(target=ejecutar, args=(i,)) for i in range(hilos)]
+    inicio = time.perf_counter()
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+    return resultados, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de contención sobre Mesa')
+    parser.add_argument('--db', default='sqlite:////tmp/turnero_concurrencia.db')
+    parser.add_argument('--hilos', type=int, default=8)
+    parser.add_argument('--operaciones', type=int, default=25)
+    args = parser.parse_args()
+
+    os.environ['TURNERO_DATABASE_URI'] = args.db
+    from app import app, db, inicializar_base_datos
+    from metricas import metricas
+    from models import Mesa, TurnoGeneral
+
+    with app.app_context():
+        db.drop_all()
+    inicializar_base_datos()
+
+    def cliente():
+        c = app.test_client()
+        c.post('/login', data={'email': 'admin@turnero.com', 'password': 'admin123'})
+        return c
+
+    clientes = [cliente() for _ in range(args.hilos)]
+    with app.app_context():
+        mesa_cambios = Mesa.query.filter_by(numero=3).first()
+        estado_inicial = mesa_cambios.activa
+        mesa_cambios_id = mesa_cambios.id
+        mesas_avance = [m.id for m in Mesa.query.filter_by(activa=True).all()]
+
+    def alternar(indice):
+        respuestas = []
+        for _ in range(args.operaciones):
+            datos = clientes[indice].post(f'/api/activar_mesa_api/{mesa_cambios_id}').get_json()
+            if datos and datos.get('success'):
+                respuestas.append(datos['activa'])
+        return respuestas
+
+    resultados, duracion = en_paralelo(args.hilos, alternar)
+    respuestas = [r for lista in resultados for r in lista]
+    with app.app_context():
+        estado_final = db.session.get(Mesa, mesa_cambios_id).activa
+    esperado = estado_inicial if len(respuestas) % 2 == 0 else not estado_inicial
+    activas, inactivas = respuestas.count(True), respuestas.count(False)
+
+    print(f"Cambios de estado: {len(respuestas)}/{args.hilos * args.operaciones} confirmados "
+          f"en {duracion:.2f} s ({len(respuestas) / duracion:.0f} op/s)")
+    print(f"  respuestas activa={activas} inactiva={inactivas}, estado final {estado_final} (esperado {esperado})")
+    sin_perdidas = abs(activas - inactivas) <= 1 and estado_final == esperado
+
+    def avanzar(indice):
+        asignados = []
+        for i in range(args.operaciones):
+            mesa_id = mesas_avance[(indice + i) % len(mesas_avance)]
+            datos = clientes[indice].post(f'/api/siguiente_turno/{mesa_id}').get_json()
+            if datos and datos.get('success'):
+                asignados.append((mesa_id, datos['nuevo_turno']))
+        return asignados
+
+    resultados, duracion = en_paralelo(args.hilos, avanzar)
+    asignados = [a for lista in resultados for a in lista]
+    numeros = sorted(n for _, n in asignados)
+    with app.app_context():
+        total = TurnoGeneral.query.count()
+        actuales = {m.id: m.turno_actual for m in Mesa.query.filter(Mesa.id.in_(mesas_avance)).all()}
+    ultimos = {}
+    for mesa_id, numero in asignados:
+        ultimos[mesa_id] = max(ultimos.get(mesa_id, 0), numero)
+
+    print(f"Avances: {len(asignados)}/{args.hilos * args.operaciones} confirmados "
+          f"en {duracion:.2f} s ({len(asignados) / duracion:.0f} op/s)")
+    print(f"  filas en turno_general={total}, números únicos y consecutivos="
+          f"{numeros == list(range(1, len(numeros) + 1))}, turno_actual correcto={actuales == ultimos}")
+    sin_perdidas = sin_perdidas and total == len(asignados) and numeros == list(range(1, len(numeros) + 1)) \
+        and actuales == ultimos
+
+    contadores = metricas.resumen()['contadores']
+    print(f"Conflictos reintentados: {contadores.get('concurrencia.conflictos', 0)}, "
+          f"reintentos agotados: {contadores.get('concurrencia.reintentos_agotados', 0)}")
+    print('SIN ACTUALIZACIONES PERDIDAS' if sin_perdidas else 'SE PERDIERON ACTUALIZACIONES')
+    sys.exit(0 if sin_perdidas else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Benchmark de las consultas y vistas más usadas a distintos tamaños de historial.
+
+Para cada escala recrea una base de datos de prueba, la llena con datos_sinteticos y
+mide las consultas calientes y los endpoints (api_estado_sistema, admin_dashboard,
+docente_dashboard y login) con el cliente de pruebas de Flask.
+
+Uso:
+    python benchmarks/bench_consultas.py --escalas 10000,1000000,10000000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from sqlalchemy import func, select
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datos_sinteticos import PASSWORD_SINTETICO, dias_para_filas, generar
+
+
+def medir(funcion, repeticiones):
+    funcion()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return statistics.median(tiempos), tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]
+
+
+def consultas_calientes(db, modelos, sede, mesa_id, docente_id):
+    Mesa, TurnoGeneral, Usuario = modelos
+    return {
+        'ultimo turno (ORDER BY numero_turno DESC)': lambda: db.session.execute(
+            select(TurnoGeneral).where(TurnoGeneral.sede == sede)
+            .order_by(TurnoGeneral.numero_turno.desc()).limit(1)).first(),
+        'total de turnos (COUNT)': lambda: db.session.execute(
+            select(func.count()).select_from(TurnoGeneral).where(TurnoGeneral.sede == sede)).scalar(),
+        'ultimos 10 turnos': lambda: db.session.execute(
+            select(TurnoGeneral).where(TurnoGeneral.sede == sede)
+            .order_by(TurnoGeneral.numero_turno.desc()).limit(10)).all(),
+        'ultimos 5 turnos de una mesa': lambda: db.session.execute(
+            select(TurnoGeneral).where(TurnoGeneral.mesa_id == mesa_id)
+            .order_by(TurnoGeneral.numero_turno.desc()).limit(5)).all(),
+        'mesas activas': lambda: db.session.execute(
+            select(Mesa).where(Mesa.sede == sede, Mesa.activa.is_(True), Mesa.eliminada.is_(False))).all(),
+        'mesa por docente_id': lambda: db.session.execute(
+            select(Mesa).where(Mesa.docente_id == docente_id, Mesa.eliminada.is_(False))).first(),
+        'usuario por email': lambda: db.session.execute(
+            select(Usuario).where(Usuario.email == 'admin@turnero.com')).first(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de consultas por tamaño de historial')
+    parser.add_argument('--db', default='sqlite:////tmp/turnero_bench.db')
+    parser.add_argument('--escalas', default='10000,1000000,10000000')
+    parser.add_argument('--mesas', type=int, default=10)
+    parser.add_argument('--turnos-hora', type=int, default=60)
+    parser.add_argument('--repeticiones', type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ['TURNERO_DATABASE_URI'] = args.db
+    from app import app, db, inicializar_base_datos
+    from models import Mesa, TurnoGeneral, Usuario, SEDE_PREDETERMINADA
+
+    for escala in [int(e) for e in args.escalas.split(',')]:
+        with app.app_context():
+            db.drop_all()
+        inicializar_base_datos()
+
+        with app.app_context():
+            inicio = time.perf_counter()
+            with db.engine.begin() as conexion:
+                generado = generar(conexion, mesas=args.mesas, docentes=args.mesas,
+                                   dias=dias_para_filas(escala, args.turnos_hora),
+                                   turnos_por_hora=args.turnos_hora)
+            carga = time.perf_counter() - inicio
+
+            mesa = Mesa.query.filter(Mesa.docente_id.isnot(None)).first()
+            docente = db.session.get(Usuario, mesa.docente_id)
+
+            print(f"\n== {generado['turnos']:,} turnos ({carga:.1f} s de carga) ==")
+            print(f"{'consulta / endpoint':45} {'p50 ms':>9} {'p95 ms':>9}")
+            for nombre, consulta in consultas_calientes(db, (Mesa, TurnoGeneral, Usuario), SEDE_PREDETERMINADA,
+                                                        mesa.id, docente.id).items():
+                p50, p95 = medir(consulta, args.repeticiones)
+                print(f"{nombre:45} {p50:9.3f} {p95:9.3f}")
+            docente_email = docente.email
+
+        admin = app.test_client()
+        admin.post('/login', data={'email': 'admin@turnero.com', 'password': 'admin123'})
+        docente_cliente = app.test_client()
+        docente_cliente.post('/login', data={'email': docente_email, 'password': PASSWORD_SINTETICO})
+        anonimo = app.test_client()
+
+        endpoints = {
+            'GET /api/estado_sistema': lambda: admin.get('/api/estado_sistema'),
+            'GET /admin/dashboard': lambda: admin.get('/admin/dashboard'),
+            'GET /docente/dashboard': lambda: docente_cliente.get('/docente/dashboard'),
+            'POST /login': lambda: anonimo.post('/login', data={'email': docente_email,
+                                                                'password': PASSWORD_SINTETICO}),
+        }
+        for nombre, peticion in endpoints.items():
+            p50, p95 = medir(peticion, args.repeticiones)
+            print(f"{nombre:45} {p50:9.3f} {p95:9.3f}")
+
+
+if __name__ == '__main__':
+    main()
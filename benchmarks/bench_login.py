@@ -0,0 +1,144 @@
+"""Pico de inicios de sesión al comienzo de la jornada.
+
+Crea N docentes y los hace iniciar sesión todos a la vez mientras un cliente consulta
+el tablero público, para ver cuánto tarda cada login con el costo de hash configurado
+y si el resto de peticiones sigue respondiendo durante el pico.
+
+Con --calibrar mide la verificación de cada costo candidato y recomienda el más alto
+que cumple el objetivo de latencia (PASSWORD_METODO).
+
+Uso:
+    python benchmarks/bench_login.py --docentes 60
+    python benchmarks/bench_login.py --calibrar --objetivo-ms 60
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datos_sinteticos import PASSWORD_SINTETICO, generar
+
+CANDIDATOS = [
+    'scrypt:4096:8:1',
+    'scrypt:8192:8:1',
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+    'scrypt:65536:8:1',
+    'pbkdf2:sha256:600000',
+]
+
+
+def percentiles(valores):
+    valores = sorted(valores)
+    if not valores:
+        return 0.0, 0.0, 0.0
+    return (statistics.median(valores),
+            valores[min(len(valores) - 1, int(len(valores) * 0.95))],
+            valores[-1])
+
+
+def calibrar(objetivo_ms, repeticiones):
+    from werkzeug.security import check_password_hash, generate_password_hash
+
+    print(f"{'método':24} {'p50 ms':>9} {'p95 ms':>9}")
+    recomendado = None
+    for metodo in CANDIDATOS:
+        guardado = generate_password_hash(PASSWORD_SINTETICO, method=metodo)
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            check_password_hash(guardado, PASSWORD_SINTETICO)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        p50, p95, _ = percentiles(tiempos)
+        print(f"{metodo:24} {p50:9.1f} {p95:9.1f}")
+        if metodo.startswith('scrypt:') and p50 <= objetivo_ms:
+            recomendado = metodo
+
+    print(f"\nPASSWORD_METODO recomendado para {objetivo_ms:.0f} ms: {recomendado or CANDIDATOS[0]}")
+
+
+def pico(args):
+    os.environ['TURNERO_DATABASE_URI'] = args.db
+    from app import app, db, inicializar_base_datos
+    from metricas import metricas
+    from models import Usuario
+
+    with app.app_context():
+        db.drop_all()
+    inicializar_base_datos()
+    with app.app_context():
+        with db.engine.begin() as conexion:
+            generar(conexion, mesas=args.docentes, docentes=args.docentes, dias=0)
+        emails = [u.email for u in Usuario.query.filter_by(rol='docente').all() if u.email.endswith('.sintetico')]
+
+    print(f"Método {app.config['PASSWORD_METODO']}, {len(emails)} docentes, "
+          f"concurrencia de verificación {app.extensions['contrasenas'].concurrencia}")
+
+    barrera = threading.Barrier(len(emails) + 1)
+    resultados = [None] * len(emails)
+    terminado = threading.Event()
+    sondeos = []
+
+    def iniciar_sesion(indice):
+        cliente = app.test_client()
+        barrera.wait()
+        inicio = time.perf_counter()
+        respuesta = cliente.post('/login', data={'email': emails[indice], 'password': PASSWORD_SINTETICO})
+        resultados[indice] = (respuesta.status_code, (time.perf_counter() - inicio) * 1000)
+
+    def sondear():
+        cliente = app.test_client()
+        barrera.wait()
+        while not terminado.is_set():
+            inicio = time.perf_counter()
+            cliente.get('/api/public/tablero')
+            sondeos.append((time.perf_counter() - inicio) * 1000)
+            time.sleep(0.02)
+
+    hilos = [threading.Thread(target=iniciar_sesion, args=(i,)) for i in range(len(emails))]
+    sondeo = threading.Thread(target=sondear)
+    inicio = time.perf_counter()
+    for hilo in hilos + [sondeo]:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+    terminado.set()
+    sondeo.join()
+
+    correctos = [ms for estado, ms in resultados if estado == 302]
+    saturados = sum(1 for estado, _ in resultados if estado == 503)
+    p50, p95, maximo = percentiles(correctos)
+    print(f"Logins: {len(correctos)}/{len(emails)} correctos, {saturados} rechazados por saturación, "
+          f"{duracion:.2f} s en total ({len(correctos) / duracion:.1f} logins/s)")
+    print(f"  latencia login p50={p50:.0f} ms p95={p95:.0f} ms max={maximo:.0f} ms")
+    p50, p95, maximo = percentiles(sondeos)
+    print(f"  tablero público durante el pico ({len(sondeos)} consultas): "
+          f"p50={p50:.1f} ms p95={p95:.1f} ms max={maximo:.1f} ms")
+    verificacion = metricas.resumen()['distribuciones'].get('login.verificacion_ms')
+    if verificacion:
+        print(f"  verificación de hash: n={verificacion['n']} p50={verificacion['p50']:.0f} ms "
+              f"p95={verificacion['p95']:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pico de inicios de sesión')
+    parser.add_argument('--db', default='sqlite:////tmp/turnero_login.db')
+    parser.add_argument('--docentes', type=int, default=60)
+    parser.add_argument('--calibrar', action='store_true')
+    parser.add_argument('--objetivo-ms', type=float, default=60)
+    parser.add_argument('--repeticiones', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.calibrar:
+        calibrar(args.objetivo_ms, args.repeticiones)
+    else:
+        pico(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""Benchmark del relleno por lotes (migrations/lotes.py) contra un UPDATE único.
+
+Crea una tabla sintética con la forma de turno_general (millones de filas con el
+nombre del docente como texto) y rellena una columna docente_id nueva con una
+subconsulta correlacionada, como haría una migración que normaliza el docente.
+Mientras corre el relleno, un hilo simula la aplicación insertando un turno cada
+--intervalo-ms y mide cuánto tarda cada escritura: con el UPDATE único las
+escrituras esperan a que termine toda la transacción; por lotes solo esperan un lote.
+
+También interrumpe un relleno a mitad de camino y lo reanuda desde el punto de
+control para comprobar que el resultado final es el mismo.
+
+Uso:
+    python benchmarks/bench_migracion_lotes.py --filas 5000000 --lote 20000
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+import sqlalchemy as sa
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations'))
+
+from lotes import rellenar_con_conexion, por_lotes
+
+metadata = sa.MetaData()
+usuario = sa.Table(
+    'usuario', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('nombre', sa.String(100), nullable=False, unique=True)
+)
+turno = sa.Table(
+    'turno_sintetico', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('sede', sa.String(50), nullable=False),
+    sa.Column('numero_turno', sa.Integer, nullable=False),
+    sa.Column('docente', sa.String(100)),
+    sa.Column('docente_id', sa.Integer)
+)
+
+DOCENTES = [f'Docente {i}' for i in range(1, 21)]
+
+
+def preparar(motor, filas, lote=50000):
+    metadata.drop_all(motor)
+    metadata.create_all(motor)
+    rng = random.Random(0)
+    inicio = time.perf_counter()
+    with motor.begin() as conexion:
+        conexion.execute(sa.insert(usuario), [{'nombre': n} for n in DOCENTES])
+        for desde in range(0, filas, lote):
+            conexion.execute(sa.insert(turno), [
+                {'sede': 'principal', 'numero_turno': i + 1, 'docente': rng.choice(DOCENTES)}
+                for i in range(desde, min(desde + lote, filas))
+            ])
+    print(f'{filas} filas generadas en {time.perf_counter() - inicio:.1f} s')
+
+
+def limpiar(motor):
+    with motor.begin() as conexion:
+        conexion.execute(sa.update(turno).values(docente_id=None))
+        conexion.execute(sa.delete(turno).where(turno.c.sede == 'escritor'))
+
+
+def valor_docente_id():
+    return sa.select(usuario.c.id).where(usuario.c.nombre == turno.c.docente).scalar_subquery()
+
+
+class Escritor(threading.Thread):
+    """Inserta un turno cada intervalo y anota la latencia de cada commit"""
+
+    def __init__(self, motor, intervalo):
+        super().__init__(daemon=True)
+        self.motor = motor
+        self.intervalo = intervalo
+        self.latencias = []
+        self.errores = 0
+        self.detener = threading.Event()
+
+    def run(self):
+        numero = 0
+        while not self.detener.is_set():
+            numero += 1
+            inicio = time.perf_counter()
+            try:
+                with self.motor.begin() as conexion:
+                    conexion.execute(sa.insert(turno).values(sede='escritor', numero_turno=numero, docente=DOCENTES[0]))
+                self.latencias.append((time.perf_counter() - inicio) * 1000)
+            except sa.exc.OperationalError:
+                self.errores += 1
+            self.detener.wait(self.intervalo)
+
+
+def con_escritor(motor, intervalo, funcion):
+    escritor = Escritor(motor, intervalo)
+    escritor.start()
+    time.sleep(0.2)
+    inicio = time.perf_counter()
+    resultado = funcion()
+    duracion = time.perf_counter() - inicio
+    escritor.detener.set()
+    escritor.join()
+    latencias = sorted(escritor.latencias)
+    return resultado, duracion, {
+        'escrituras': len(latencias),
+        'errores': escritor.errores,
+        'p50_ms': statistics.median(latencias) if latencias else None,
+        'p99_ms': latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))] if latencias else None,
+        'max_ms': latencias[-1] if latencias else None
+    }
+
+
+def informar(titulo, filas, duracion, escritor):
+    print(f'\n{titulo}')
+    print(f'  {filas} filas en {duracion:.1f} s ({filas / max(duracion, 1e-9):,.0f} filas/s)')
+    if escritor['escrituras']:
+        print(f'  escrituras de la aplicación: {escritor["escrituras"]}, errores {escritor["errores"]}, '
+              f'p50 {escritor["p50_ms"]:.1f} ms, p99 {escritor["p99_ms"]:.1f} ms, máx {escritor["max_ms"]:.1f} ms')
+    else:
+        print(f'  escrituras de la aplicación: ninguna completada, errores {escritor["errores"]}')
+
+
+def verificar(motor):
+    """Filas sin rellenar o mal rellenadas, incluidas las que el escritor insertó durante el relleno"""
+    with motor.connect() as conexion:
+        faltantes = conexion.execute(
+            sa.select(turno.c.sede, sa.func.count()).where(turno.c.docente_id.is_(None)).group_by(turno.c.sede)
+        ).all()
+        incorrectos = conexion.execute(
+            sa.select(sa.func.count()).select_from(turno.join(usuario, usuario.c.id == turno.c.docente_id))
+            .where(usuario.c.nombre != turno.c.docente)
+        ).scalar()
+    faltantes = dict(faltantes)
+    correcto = not faltantes and incorrectos == 0
+    detalle = f'sin rellenar {faltantes.get("principal", 0)} previas y {faltantes.get("escritor", 0)} del escritor, ' \
+              f'{incorrectos} incorrectas'
+    return f'{correcto} ({detalle})'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Relleno por lotes contra UPDATE único')
+    parser.add_argument('--db', default='sqlite:////tmp/turnero_migracion_lotes.db')
+    parser.add_argument('--filas', type=int, default=2000000)
+    parser.add_argument('--lote', type=int, default=20000)
+    parser.add_argument('--objetivo-ms', type=float, default=50)
+    parser.add_argument('--pausa', type=float, default=0.01)
+    parser.add_argument('--intervalo-ms', type=float, default=20)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='    %(message)s')
+    # Espera de bloqueo amplia: se quiere medir cuánto espera el escritor, no que falle
+    argumentos = {'connect_args': {'timeout': 120}} if args.db.startswith('sqlite') else {}
+    motor = sa.create_engine(args.db, **argumentos)
+    autocommit = motor.execution_options(isolation_level='AUTOCOMMIT')
+    intervalo = args.intervalo_ms / 1000
+
+    preparar(motor, args.filas)
+
+    def update_unico():
+        with motor.begin() as conexion:
+            return conexion.execute(sa.update(turno).values(docente_id=valor_docente_id())).rowcount
+
+    filas, duracion, escritor = con_escritor(motor, intervalo, update_unico)
+    informar('UPDATE único (una transacción)', filas, duracion, escritor)
+    print(f'  resultado correcto: {verificar(motor)}')
+
+    limpiar(motor)
+
+    def por_lotes_():
+        with autocommit.connect() as conexion:
+            return rellenar_con_conexion(conexion, turno, {'docente_id': valor_docente_id()},
+                                         donde=turno.c.docente_id.is_(None), nombre='bench_docente_id',
+                                         lote=args.lote, objetivo_ms=args.objetivo_ms, pausa=args.pausa)
+
+    filas, duracion, escritor = con_escritor(motor, intervalo, por_lotes_)
+    informar(f'Por lotes (lote inicial {args.lote}, objetivo {args.objetivo_ms:.0f} ms, pausa {args.pausa * 1000:.0f} ms)',
+             filas, duracion, escritor)
+    print(f'  resultado correcto: {verificar(motor)}')
+
+    limpiar(motor)
+
+    # Interrumpir a mitad de camino y reanudar con el mismo nombre de punto de control
+    class Interrupcion(Exception):
+        pass
+
+    lotes = [0]
+    limite = max(1, args.filas // args.lote // 2)
+
+    def actualizar(conexion, desde, hasta):
+        if lotes[0] == limite:
+            raise Interrupcion()
+        lotes[0] += 1
+        return conexion.execute(
+            sa.update(turno).where(turno.c.id > desde, turno.c.id <= hasta, turno.c.docente_id.is_(None))
+            .values(docente_id=valor_docente_id())
+        ).rowcount
+
+    with autocommit.connect() as conexion:
+        try:
+            por_lotes(conexion, turno, actualizar, nombre='bench_reanudar', lote=args.lote)
+        except Interrupcion:
+            print(f'\nInterrumpido después de {limite} lotes')
+        lotes[0] = -1
+        filas = por_lotes(conexion, turno, actualizar, nombre='bench_reanudar', lote=args.lote)
+    print(f'Reanudado: {filas} filas en total, resultado correcto: {verificar(motor)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,495 @@
+"""Reproducción de una jornada real de turnos contra una instancia local.
+
+Toma los avances registrados de un día (el historial por mesa de data/mesas.json o
+las filas 'avance' de turno_historial) y los vuelve a ejecutar respetando los
+intervalos originales entre avances, opcionalmente acelerados --velocidad veces.
+Junto a cada mostrador corre el panel del docente consultando su mesa, y varias
+pantallas públicas consultan el tablero con If-None-Match, piden el anuncio de cada
+turno nuevo y envían sus latidos de telemetría, como lo hace el navegador. Los
+intervalos de sondeo se aceleran igual que la traza, así que la proporción entre
+avances y consultas es la de la jornada real.
+
+Informa la latencia de cada endpoint y el retraso desde que el mostrador pide el
+siguiente turno hasta que la primera pantalla (y todas) lo muestran.
+
+Por defecto crea una base SQLite nueva y usa el cliente de prueba de Flask en el
+mismo proceso; con --url se ejecuta contra un servidor en marcha (¡avanza turnos
+reales de las mesas de la sede del usuario!).
+
+Uso:
+    python benchmarks/bench_reproduccion.py --velocidad 60 --pausa-maxima 300 --pantallas 4
+    python benchmarks/bench_reproduccion.py --historial sqlite:////tmp/turnero_sintetico.db \\
+        --fecha 2026-10-01 --velocidad 30 --salida /tmp/reproduccion.json
+    python benchmarks/bench_reproduccion.py --url http://127.0.0.1:5000 \\
+        --email docente@turnero.com --password docente123 --velocidad 60
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+
+import sqlalchemy as sa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD_REPRODUCCION = 'reproduccion'
+
+
+def elegir_dia(eventos, fecha=None):
+    """Avances (hora, número de mesa) del día pedido o, si no se indica, del más concurrido"""
+    if not eventos:
+        raise SystemExit('La traza no tiene avances')
+    dia = fecha or Counter(momento.date() for momento, _ in eventos).most_common(1)[0][0]
+    del_dia = sorted(e for e in eventos if e[0].date() == dia)
+    if not del_dia:
+        raise SystemExit(f'La traza no tiene avances el {dia}')
+    return dia, del_dia
+
+
+def traza_desde_json(ruta, fecha=None):
+    """Historial por mesa de data/mesas.json; el turno 0 es un reinicio, no un avance"""
+    with open(ruta, encoding='utf-8') as archivo:
+        mesas = json.load(archivo)
+    eventos = []
+    for mesa in mesas:
+        for entrada in mesa.get('historial') or []:
+            if not entrada.get('turno'):
+                continue
+            momento = datetime.strptime(f"{entrada['fecha']} {entrada['hora']}", '%Y-%m-%d %H:%M:%S')
+            eventos.append((momento, entrada.get('mesa_numero') or mesa['numero']))
+    return elegir_dia(eventos, fecha)
+
+
+def traza_desde_historial(uri, sede, fecha=None):
+    """Filas 'avance' de turno_historial de una base existente (real o de datos_sinteticos.py)"""
+    from models import Mesa, TurnoHistorial
+
+    motor = sa.create_engine(uri)
+    historial = TurnoHistorial.__table__
+    mesa = Mesa.__table__
+    avances = historial.c.accion == 'avance', historial.c.sede == sede
+    with motor.connect() as conexion:
+        if fecha is None:
+            dia = sa.func.date(historial.c.timestamp)
+            fila = conexion.execute(
+                sa.select(dia).where(*avances).group_by(dia).order_by(sa.func.count().desc()).limit(1)
+            ).first()
+            if fila is None:
+                raise SystemExit(f'turno_historial no tiene avances en la sede {sede}')
+            fecha = date.fromisoformat(str(fila[0]))
+        inicio = datetime.combine(fecha, datetime.min.time())
+        filas = conexion.execute(
+            sa.select(historial.c.timestamp, mesa.c.numero)
+            .join(mesa, mesa.c.id == historial.c.mesa_id)
+            .where(*avances, historial.c.timestamp >= inicio, historial.c.timestamp < inicio + timedelta(days=1))
+        ).all()
+    motor.dispose()
+    return elegir_dia([(fila.timestamp, fila.numero) for fila in filas], fecha)
+
+
+def programar(eventos, velocidad, pausa_maxima=None):
+    """(segundos desde el inicio de la reproducción, número de mesa) de cada avance.
+
+    Con pausa_maxima, los huecos más largos que eso (en tiempo de la traza) se recortan:
+    una jornada con la oficina cerrada al mediodía no tiene por qué esperar horas.
+    """
+    plan = []
+    transcurrido = 0.0
+    anterior = eventos[0][0]
+    for momento, numero in eventos:
+        hueco = (momento - anterior).total_seconds()
+        if pausa_maxima is not None:
+            hueco = min(hueco, pausa_maxima)
+        transcurrido += hueco
+        anterior = momento
+        plan.append((transcurrido / velocidad, numero))
+    return plan
+
+
+class ClienteLocal:
+    """Cliente de prueba de Flask: la aplicación corre en este mismo proceso"""
+
+    def __init__(self, app):
+        self.cliente = app.test_client()
+
+    def pedir(self, metodo, ruta, datos=None, formulario=None, cabeceras=None):
+        respuesta = self.cliente.open(ruta, method=metodo, json=datos, data=formulario, headers=cabeceras or {})
+        return respuesta.status_code, respuesta.headers, respuesta.get_data()
+
+
+class ClienteHttp:
+    """Cliente HTTP con su propia sesión (cookies) contra un servidor en marcha"""
+
+    def __init__(self, base):
+        self.base = base.rstrip('/')
+        self.abridor = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def pedir(self, metodo, ruta, datos=None, formulario=None, cabeceras=None):
+        cabeceras = dict(cabeceras or {})
+        cuerpo = None
+        if datos is not None:
+            cuerpo = json.dumps(datos).encode()
+            cabeceras['Content-Type'] = 'application/json'
+        elif formulario is not None:
+            cuerpo = urllib.parse.urlencode(formulario).encode()
+            cabeceras['Content-Type'] = 'application/x-www-form-urlencoded'
+        peticion = urllib.request.Request(self.base + ruta, data=cuerpo, headers=cabeceras, method=metodo)
+        try:
+            with self.abridor.open(peticion, timeout=30) as respuesta:
+                return respuesta.status, respuesta.headers, respuesta.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.headers, error.read()
+
+
+def decodificar(cuerpo):
+    try:
+        return json.loads(cuerpo)
+    except ValueError:
+        return {}
+
+
+class Registro:
+    """Latencias y códigos de respuesta por endpoint, compartido entre hilos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = defaultdict(list)
+        self.codigos = defaultdict(Counter)
+
+    def pedir(self, cliente, nombre, metodo, ruta, **opciones):
+        inicio = time.perf_counter()
+        try:
+            codigo, cabeceras, cuerpo = cliente.pedir(metodo, ruta, **opciones)
+        except OSError:
+            codigo, cabeceras, cuerpo = 'error', {}, b''
+        fin = time.perf_counter()
+        with self._lock:
+            self.latencias[nombre].append((fin - inicio) * 1000)
+            self.codigos[nombre][codigo] += 1
+        return codigo, cabeceras, cuerpo, fin
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def resumen(valores):
+    if not valores:
+        return None
+    return {
+        'n': len(valores),
+        'p50_ms': statistics.median(valores),
+        'p95_ms': percentil(valores, 0.95),
+        'p99_ms': percentil(valores, 0.99),
+        'max_ms': max(valores)
+    }
+
+
+def mostrador(cliente, registro, mesa_id, horarios, inicio, avances):
+    """Pide el siguiente turno de una mesa en los momentos del plan"""
+    for desfase in horarios:
+        espera = inicio + desfase - time.perf_counter()
+        if espera > 0:
+            time.sleep(espera)
+        enviado = time.perf_counter()
+        codigo, _, cuerpo, fin = registro.pedir(
+            cliente, 'POST /api/siguiente_turno', 'POST', f'/api/siguiente_turno/{mesa_id}',
+            cabeceras={'Idempotency-Key': uuid.uuid4().hex}
+        )
+        datos = decodificar(cuerpo)
+        avances.append({
+            'mesa_id': mesa_id,
+            'turno': datos.get('nuevo_turno') if codigo == 200 and datos.get('success') else None,
+            'atraso_ms': (enviado - inicio - desfase) * 1000,
+            'enviado': enviado,
+            'confirmado': fin
+        })
+
+
+def sondear(detener, intervalo, fase, accion):
+    """Llamar accion() cada intervalo, empezando tras la fase, hasta que se pida detener"""
+    if detener.wait(fase):
+        return
+    proximo = time.perf_counter()
+    while not detener.is_set():
+        accion()
+        proximo += intervalo
+        detener.wait(max(0.0, proximo - time.perf_counter()))
+
+
+class Pantalla:
+    """Tablero público: consulta el archivo del tablero, pide el anuncio y envía latidos"""
+
+    def __init__(self, cliente, registro, sede, indice):
+        self.cliente = cliente
+        self.registro = registro
+        self.ruta = f'/tablero/{sede}.json'
+        self.sede = sede
+        self.id = f'reproduccion-{indice}-{uuid.uuid4().hex[:6]}'
+        self.etag = None
+        self.turno = None
+        self.observaciones = []
+        self.idas_y_vueltas = []
+        self.latencias = []
+
+    def consultar(self):
+        cabeceras = {'If-None-Match': self.etag} if self.etag else {}
+        inicio = time.perf_counter()
+        codigo, respuesta, cuerpo, fin = self.registro.pedir(self.cliente, 'GET /tablero/<sede>.json', 'GET', self.ruta,
+                                                             cabeceras=cabeceras)
+        self.idas_y_vueltas.append((fin - inicio) * 1000)
+        if codigo != 200:
+            return
+        self.etag = respuesta.get('ETag') or self.etag
+        datos = decodificar(cuerpo)
+        turno = datos.get('turno')
+        if turno is None or turno == self.turno:
+            return
+        self.turno = turno
+        self.observaciones.append((fin, turno))
+        if datos.get('confirmado'):
+            self.latencias.append(time.time() * 1000 - datos['confirmado'])
+        if datos.get('anuncio'):
+            self.registro.pedir(self.cliente, 'GET /audio/anuncio', 'GET', datos['anuncio'])
+
+    def latido(self):
+        ordenadas = sorted(self.idas_y_vueltas)
+        self.registro.pedir(self.cliente, 'POST /api/telemetria', 'POST', '/api/telemetria', datos={
+            'pantalla': self.id,
+            'tipo': 'publica',
+            'sede': self.sede,
+            'version': self.turno,
+            'rtt_ms': ordenadas[len(ordenadas) // 2] if ordenadas else None,
+            'latencias_ms': self.latencias[:20],
+            'errores': 0
+        })
+        self.idas_y_vueltas = []
+        self.latencias = []
+
+
+def retrasos(avances, pantallas):
+    """Retraso de cada turno confirmado hasta la primera y hasta la última pantalla que lo mostró.
+
+    Una pantalla "ve" el turno n cuando muestra n o uno posterior; si dos avances caen
+    dentro del mismo intervalo de sondeo el primero nunca se dibuja (se cuenta aparte).
+    """
+    primera, todas = [], []
+    nunca_vistos = sin_dibujar = 0
+    dibujados = {turno for pantalla in pantallas for _, turno in pantalla.observaciones}
+    for avance in avances:
+        if avance['turno'] is None:
+            continue
+        vistos = []
+        for pantalla in pantallas:
+            momento = next((t for t, turno in pantalla.observaciones if turno >= avance['turno']), None)
+            if momento is not None:
+                vistos.append((momento - avance['enviado']) * 1000)
+        if not vistos:
+            nunca_vistos += 1
+            continue
+        primera.append(min(vistos))
+        if len(vistos) == len(pantallas):
+            todas.append(max(vistos))
+        if avance['turno'] not in dibujados:
+            sin_dibujar += 1
+    return primera, todas, nunca_vistos, sin_dibujar
+
+
+def preparar_local(args, numeros):
+    """Base nueva con una mesa activa y un docente por cada mesa de la traza"""
+    os.environ['TURNERO_DATABASE_URI'] = args.db
+    os.environ.setdefault('CONSULTAS_LENTAS_HABILITADO', 'False')
+    from app import app, db, inicializar_base_datos
+    from contrasenas import contrasenas
+    from models import Mesa, Usuario
+
+    with app.app_context():
+        db.drop_all()
+    inicializar_base_datos()
+
+    with app.app_context():
+        password = contrasenas.generar(PASSWORD_REPRODUCCION)
+        credenciales = {}
+        for numero in numeros:
+            mesa = Mesa.query.filter_by(sede=args.sede, numero=numero).first()
+            if mesa is None:
+                mesa = Mesa(sede=args.sede, numero=numero, turno_actual=0, eliminada=False)
+                db.session.add(mesa)
+            docente = Usuario(sede=args.sede, nombre=f'Mostrador {numero}', email=f'mostrador{numero}@reproduccion.local',
+                              password=password, rol='docente')
+            db.session.add(docente)
+            mesa.activa = True
+            mesa.docente = docente
+            credenciales[numero] = docente.email
+        db.session.commit()
+        ids = {m.numero: m.id for m in Mesa.query.filter_by(sede=args.sede, eliminada=False)}
+
+    def nuevo_cliente(numero=None):
+        cliente = ClienteLocal(app)
+        if numero is not None:
+            cliente.pedir('POST', '/login', formulario={'email': credenciales[numero], 'password': PASSWORD_REPRODUCCION})
+        return cliente
+
+    return nuevo_cliente, {numero: ids[numero] for numero in numeros}
+
+
+def preparar_remoto(args, numeros):
+    """Sesiones contra --url con el usuario indicado; las mesas se buscan por número"""
+    def nuevo_cliente(numero=None):
+        cliente = ClienteHttp(args.url)
+        if numero is not None:
+            cliente.pedir('POST', '/login', formulario={'email': args.email, 'password': args.password})
+        return cliente
+
+    estado = decodificar(nuevo_cliente(numeros[0]).pedir('GET', '/api/estado_sistema')[2])
+    if not estado.get('success'):
+        raise SystemExit(f'No se pudo leer el estado del sistema en {args.url}')
+    ids = {m['numero']: m['id'] for m in estado['mesas'] if m['activa']}
+    faltantes = [n for n in numeros if n not in ids]
+    if faltantes:
+        print(f'Mesas de la traza sin mesa activa en el servidor (sus avances se omiten): {faltantes}')
+    return nuevo_cliente, {n: ids[n] for n in numeros if n in ids}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reproducción de una jornada registrada de turnos')
+    parser.add_argument('--traza', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                        'data', 'mesas.json'))
+    parser.add_argument('--historial', help='URI de una base cuyos avances de turno_historial se reproducen')
+    parser.add_argument('--fecha', type=date.fromisoformat, help='día a reproducir (por defecto el de más avances)')
+    parser.add_argument('--sede', default=None)
+    parser.add_argument('--velocidad', type=float, default=1.0, help='factor de aceleración de la traza')
+    parser.add_argument('--pausa-maxima', type=float, default=None, help='recortar huecos de la traza a estos segundos')
+    parser.add_argument('--pantallas', type=int, default=3)
+    parser.add_argument('--intervalo-pantalla', type=float, default=3.0, help='segundos entre consultas, antes de acelerar')
+    parser.add_argument('--intervalo-panel', type=float, default=3.0)
+    parser.add_argument('--intervalo-telemetria', type=float, default=15.0)
+    parser.add_argument('--db', default='sqlite:////tmp/turnero_reproduccion.db')
+    parser.add_argument('--url', help='servidor en marcha; sin esto se usa el cliente de prueba en el proceso')
+    parser.add_argument('--email', default='docente@turnero.com')
+    parser.add_argument('--password', default='docente123')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--salida', help='guardar el resumen en JSON para comparar corridas')
+    args = parser.parse_args()
+
+    from models import SEDE_PREDETERMINADA
+    args.sede = args.sede or SEDE_PREDETERMINADA
+
+    if args.historial:
+        dia, eventos = traza_desde_historial(args.historial, args.sede, args.fecha)
+        origen = 'turno_historial'
+    else:
+        dia, eventos = traza_desde_json(args.traza, args.fecha)
+        origen = os.path.basename(args.traza)
+    numeros = sorted({numero for _, numero in eventos})
+    plan = programar(eventos, args.velocidad, args.pausa_maxima)
+
+    nuevo_cliente, mesas = (preparar_remoto if args.url else preparar_local)(args, numeros)
+    horarios = defaultdict(list)
+    for desfase, numero in plan:
+        if numero in mesas:
+            horarios[numero].append(desfase)
+    if not horarios:
+        raise SystemExit('Ninguna mesa de la traza existe en el destino')
+
+    duracion_traza = (eventos[-1][0] - eventos[0][0]).total_seconds()
+    print(f'Traza {origen}, {dia}: {len(eventos)} avances en {len(numeros)} mesas, '
+          f'{duracion_traza / 60:.1f} min originales -> {plan[-1][0]:.1f} s reproducidos (x{args.velocidad:g})')
+
+    registro = Registro()
+    rng = random.Random(args.semilla)
+    intervalo_pantalla = args.intervalo_pantalla / args.velocidad
+    intervalo_panel = args.intervalo_panel / args.velocidad
+    intervalo_telemetria = args.intervalo_telemetria / args.velocidad
+    detener = threading.Event()
+    hilos = []
+
+    pantallas = [Pantalla(nuevo_cliente(), registro, args.sede, i) for i in range(args.pantallas)]
+    for pantalla in pantallas:
+        hilos.append(threading.Thread(target=sondear, daemon=True, args=(
+            detener, intervalo_pantalla, rng.uniform(0, intervalo_pantalla), pantalla.consultar)))
+        hilos.append(threading.Thread(target=sondear, daemon=True, args=(
+            detener, intervalo_telemetria, 0.0, pantalla.latido)))
+
+    for numero in mesas:
+        panel = nuevo_cliente(numero)
+
+        def consultar_panel(panel=panel):
+            registro.pedir(panel, 'GET /api/docente/mi_mesa', 'GET', '/api/docente/mi_mesa')
+
+        hilos.append(threading.Thread(target=sondear, daemon=True, args=(
+            detener, intervalo_panel, rng.uniform(0, intervalo_panel), consultar_panel)))
+
+    avances = []
+    inicio = time.perf_counter() + 0.5
+    mostradores = [
+        threading.Thread(target=mostrador, args=(nuevo_cliente(numero), registro, mesas[numero], horarios[numero], inicio, avances))
+        for numero in horarios
+    ]
+    for hilo in hilos + mostradores:
+        hilo.start()
+    for hilo in mostradores:
+        hilo.join()
+    # Dar tiempo a que todas las pantallas alcancen a ver el último turno
+    time.sleep(2 * intervalo_pantalla + 0.2)
+    detener.set()
+    for hilo in hilos:
+        hilo.join()
+
+    print(f'\n{"endpoint":30} {"peticiones":>10} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"máx ms":>8}  códigos')
+    endpoints = {}
+    for nombre in sorted(registro.latencias):
+        datos = resumen(registro.latencias[nombre])
+        codigos = ' '.join(f'{codigo}:{cuenta}' for codigo, cuenta in sorted(registro.codigos[nombre].items(), key=str))
+        endpoints[nombre] = dict(datos, codigos={str(c): n for c, n in registro.codigos[nombre].items()})
+        print(f'{nombre:30} {datos["n"]:10} {datos["p50_ms"]:8.1f} {datos["p95_ms"]:8.1f} '
+              f'{datos["p99_ms"]:8.1f} {datos["max_ms"]:8.1f}  {codigos}')
+
+    atrasos = resumen([max(0.0, a['atraso_ms']) for a in avances])
+    fallidos = sum(1 for a in avances if a['turno'] is None)
+    primera, todas, nunca_vistos, sin_dibujar = retrasos(avances, pantallas)
+    retraso_primera, retraso_todas = resumen(primera), resumen(todas)
+
+    print(f'\nAvances: {len(avances)} enviados, {fallidos} fallidos; '
+          f'atraso respecto del plan p50 {atrasos["p50_ms"]:.1f} ms, máx {atrasos["max_ms"]:.1f} ms')
+    print(f'Sondeo de pantallas cada {intervalo_pantalla * 1000:.0f} ms '
+          f'(con sondeo ideal el retraso medio hasta una pantalla es ~{intervalo_pantalla * 500:.0f} ms)')
+    for titulo, datos in (('primera pantalla', retraso_primera), ('todas las pantallas', retraso_todas)):
+        if datos:
+            print(f'  retraso hasta {titulo:20} p50 {datos["p50_ms"]:8.1f}  p95 {datos["p95_ms"]:8.1f}  '
+                  f'máx {datos["max_ms"]:8.1f} ms')
+    print(f'  turnos que ninguna pantalla vio: {nunca_vistos}; '
+          f'reemplazados antes de dibujarse (dos avances en un mismo sondeo): {sin_dibujar}')
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump({
+                'traza': {'origen': origen, 'fecha': dia.isoformat(), 'avances': len(eventos), 'mesas': numeros,
+                          'velocidad': args.velocidad, 'pausa_maxima': args.pausa_maxima},
+                'destino': args.url or args.db,
+                'pantallas': args.pantallas,
+                'intervalo_pantalla_ms': intervalo_pantalla * 1000,
+                'endpoints': endpoints,
+                'avances': {'enviados': len(avances), 'fallidos': fallidos, 'atraso': atrasos},
+                'retraso_primera_pantalla': retraso_primera,
+                'retraso_todas_las_pantallas': retraso_todas,
+                'nunca_vistos': nunca_vistos,
+                'sin_dibujar': sin_dibujar
+            }, archivo, indent=2, ensure_ascii=False)
+        print(f'\nResumen guardado en {args.salida}')
+
+
+if __name__ == '__main__':
+    main()
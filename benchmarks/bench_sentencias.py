@@ -0,0 +1,174 @@
+"""Microbenchmark del costo de armar y compilar las consultas de cada petición.
+
+Compara tres formas de ejecutar las mismas consultas calientes:
+
+    legacy      Model.query.filter_by(...) armado en cada llamada (lo que hacían las vistas)
+    select      select() 2.0 armado en cada llamada
+    consultas   sentencias del módulo consultas, armadas una vez al importar
+
+Para cada consulta mide por separado la construcción de la sentencia (sin tocar la
+base), la compilación a SQL sin caché y la ejecución completa, y cuenta los aciertos
+de la caché de compilación del engine. Al final suma las consultas de una petición a
+admin_dashboard y a docente_dashboard.
+
+Uso:
+    python benchmarks/bench_sentencias.py --repeticiones 2000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+from sqlalchemy import event, func, select
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def medir(funcion, repeticiones):
+    for _ in range(min(repeticiones, 50)):
+        funcion()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1e6)
+    return statistics.median(tiempos)
+
+
+def formas(db, consultas, modelos, sede, docente_id, mesa_id):
+    """{consulta: {forma: (construir, ejecutar)}}; construir devuelve la sentencia sin ejecutarla"""
+    Mesa, TurnoGeneral, Usuario = modelos
+
+    def legacy_ultimo():
+        return TurnoGeneral.query.filter_by(sede=sede).order_by(TurnoGeneral.numero_turno.desc()).limit(1)
+
+    def select_ultimo():
+        return select(TurnoGeneral.numero_turno).where(TurnoGeneral.sede == sede)\
+            .order_by(TurnoGeneral.numero_turno.desc()).limit(1)
+
+    def legacy_total():
+        return TurnoGeneral.query.filter_by(sede=sede)
+
+    def select_total():
+        return select(func.count()).select_from(TurnoGeneral).where(TurnoGeneral.sede == sede)
+
+    def legacy_mesas():
+        return Mesa.query.filter_by(sede=sede, activa=True, eliminada=False)
+
+    def select_mesas():
+        return select(Mesa.id, Mesa.numero, Mesa.turno_actual)\
+            .where(Mesa.sede == sede, Mesa.activa.is_(True), Mesa.eliminada.is_(False)).order_by(Mesa.numero)
+
+    def legacy_mesa_docente():
+        return Mesa.query.filter_by(docente_id=docente_id, eliminada=False)
+
+    def select_mesa_docente():
+        return select(Mesa.id, Mesa.numero, Mesa.sede, Mesa.activa, Mesa.turno_actual)\
+            .where(Mesa.docente_id == docente_id, Mesa.eliminada.is_(False)).limit(1)
+
+    def legacy_turnos_mesa():
+        return TurnoGeneral.query.filter_by(mesa_id=mesa_id).order_by(TurnoGeneral.numero_turno.desc()).limit(5)
+
+    def select_turnos_mesa():
+        return select(TurnoGeneral.numero_turno, TurnoGeneral.docente, TurnoGeneral.timestamp, TurnoGeneral.estado)\
+            .where(TurnoGeneral.mesa_id == mesa_id).order_by(TurnoGeneral.numero_turno.desc()).limit(5)
+
+    def ejecutar(sentencia, parametros=None, modo='all'):
+        resultado = db.session.execute(sentencia, parametros)
+        return getattr(resultado, modo)()
+
+    return {
+        'ultimo turno de la sede': {
+            'legacy': (legacy_ultimo, lambda: legacy_ultimo().first()),
+            'select': (select_ultimo, lambda: ejecutar(select_ultimo(), modo='scalar')),
+            'consultas': (lambda: consultas.ULTIMO_NUMERO_TURNO, lambda: consultas.ultimo_numero_turno(sede)),
+        },
+        'total de turnos': {
+            'legacy': (legacy_total, lambda: legacy_total().count()),
+            'select': (select_total, lambda: ejecutar(select_total(), modo='scalar')),
+            'consultas': (lambda: consultas.TOTAL_TURNOS, lambda: consultas.total_turnos(sede)),
+        },
+        'mesas activas': {
+            'legacy': (legacy_mesas, lambda: legacy_mesas().all()),
+            'select': (select_mesas, lambda: ejecutar(select_mesas())),
+            'consultas': (lambda: consultas.MESAS_ACTIVAS, lambda: consultas.mesas_activas(sede)),
+        },
+        'mesa por docente_id': {
+            'legacy': (legacy_mesa_docente, lambda: legacy_mesa_docente().first()),
+            'select': (select_mesa_docente, lambda: ejecutar(select_mesa_docente(), modo='first')),
+            'consultas': (lambda: consultas.MESA_DE_DOCENTE, lambda: consultas.mesa_de_docente(docente_id)),
+        },
+        'ultimos 5 turnos de una mesa': {
+            'legacy': (legacy_turnos_mesa, lambda: legacy_turnos_mesa().all()),
+            'select': (select_turnos_mesa, lambda: ejecutar(select_turnos_mesa())),
+            'consultas': (lambda: consultas.ULTIMOS_TURNOS_MESA, lambda: consultas.ultimos_turnos_mesa(mesa_id)),
+        },
+    }
+
+
+def compilar(sentencia, dialecto):
+    # Query legacy: compilar la sentencia select() que arma por dentro
+    sentencia = getattr(sentencia, 'statement', sentencia)
+    return sentencia.compile(dialect=dialecto)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Costo de construcción y compilación de las consultas por petición')
+    parser.add_argument('--db', default='sqlite:////tmp/turnero_bench_sentencias.db')
+    parser.add_argument('--repeticiones', type=int, default=2000)
+    parser.add_argument('--dias', type=int, default=30)
+    args = parser.parse_args()
+
+    os.environ['TURNERO_DATABASE_URI'] = args.db
+    os.environ.setdefault('CONSULTAS_LENTAS_HABILITADO', 'False')
+    from app import app, db, inicializar_base_datos
+    from datos_sinteticos import generar
+    from models import Mesa, TurnoGeneral, Usuario, SEDE_PREDETERMINADA
+    import consultas
+
+    with app.app_context():
+        db.drop_all()
+    inicializar_base_datos()
+
+    with app.app_context():
+        with db.engine.begin() as conexion:
+            generar(conexion, mesas=10, docentes=10, dias=args.dias, turnos_por_hora=60)
+        sede = SEDE_PREDETERMINADA
+        mesa = db.session.execute(select(Mesa.id, Mesa.docente_id).where(Mesa.docente_id.isnot(None)).limit(1)).first()
+
+        estados_cache = Counter()
+
+        @event.listens_for(db.engine, 'after_cursor_execute')
+        def contar(conexion, cursor, sentencia, parametros, contexto, varios):
+            estados_cache[str(contexto.cache_hit)] += 1
+
+        dialecto = db.engine.dialect
+        tabla = formas(db, consultas, (Mesa, TurnoGeneral, Usuario), sede, mesa.docente_id, mesa.id)
+        totales = Counter()
+
+        print(f'{args.repeticiones} repeticiones, mediana en microsegundos\n')
+        print(f'{"consulta":32} {"forma":10} {"construir":>10} {"compilar":>10} {"ejecutar":>10}  cache')
+        for nombre, variantes in tabla.items():
+            for forma, (construir, ejecutar) in variantes.items():
+                estados_cache.clear()
+                t_construir = medir(construir, args.repeticiones)
+                t_compilar = medir(lambda: compilar(construir(), dialecto), max(args.repeticiones // 10, 10))
+                t_ejecutar = medir(ejecutar, args.repeticiones)
+                db.session.rollback()
+                aciertos = sum(v for k, v in estados_cache.items() if 'CACHE_HIT' in k)
+                totales[forma] += t_ejecutar
+                print(f'{nombre:32} {forma:10} {t_construir:10.1f} {t_compilar:10.1f} {t_ejecutar:10.1f}'
+                      f'  {aciertos}/{sum(estados_cache.values())} aciertos')
+            print()
+
+        print('Suma de las consultas de arriba (una petición típica de los paneles):')
+        for forma, total in totales.items():
+            print(f'  {forma:10} {total:8.1f} us ({total / totales["legacy"]:.0%} de legacy)')
+
+        event.remove(db.engine, 'after_cursor_execute', contar)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""Generador de historial sintético de turnos para pruebas de rendimiento.
+
+Inserta usuarios docentes, mesas, TurnoGeneral y TurnoHistorial con inserciones
+masivas de SQLAlchemy Core, por lotes, sin construir objetos del ORM.
+
+Uso:
+    python benchmarks/datos_sinteticos.py --db sqlite:////tmp/turnero_sintetico.db \\
+        --mesas 8 --docentes 8 --dias 30 --turnos-hora 40
+"""
+import argparse
+import math
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func, insert, select
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD_SINTETICO = 'sintetico'
+
+
+def dias_para_filas(filas, turnos_por_hora, hora_inicio=8, hora_fin=17):
+    return max(1, math.ceil(filas / (turnos_por_hora * (hora_fin - hora_inicio))))
+
+
+def generar(conexion, mesas=5, docentes=5, dias=30, turnos_por_hora=30, hora_inicio=8, hora_fin=17,
+            sede=None, inicio=None, semilla=0, lote=50000):
+    from contrasenas import contrasenas
+    from models import Mesa, TurnoGeneral, TurnoHistorial, Usuario, SEDE_PREDETERMINADA
+
+    sede = sede or SEDE_PREDETERMINADA
+    rng = np.random.default_rng(semilla)
+    inicio = inicio or (datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=dias))
+
+    # Un único hash compartido: calcular uno por docente dominaría el tiempo de carga
+    password = contrasenas.generar(PASSWORD_SINTETICO)
+    usuario_base = (conexion.execute(select(func.max(Usuario.id))).scalar() or 0) + 1
+    usuarios = [{
+        'id': usuario_base + i,
+        'sede': sede,
+        'nombre': f'Docente Sintético {usuario_base + i}',
+        'email': f'docente{usuario_base + i}@{sede}.sintetico',
+        'password': password,
+        'rol': 'docente',
+        'activo': True
+    } for i in range(docentes)]
+    if usuarios:
+        conexion.execute(insert(Usuario), usuarios)
+
+    mesa_base = (conexion.execute(select(func.max(Mesa.id))).scalar() or 0) + 1
+    numero_base = conexion.execute(select(func.max(Mesa.numero)).where(Mesa.sede == sede)).scalar() or 0
+    filas_mesas = [{
+        'id': mesa_base + i,
+        'sede': sede,
+        'numero': numero_base + i + 1,
+        'activa': True,
+        'eliminada': False,
+        'turno_actual': 0,
+        'docente_id': usuarios[i]['id'] if i < len(usuarios) else None
+    } for i in range(mesas)]
+    conexion.execute(insert(Mesa), filas_mesas)
+
+    mesa_ids = np.array([m['id'] for m in filas_mesas])
+    nombres = np.array([usuarios[i]['nombre'] if i < len(usuarios) else 'Sin asignar' for i in range(mesas)], dtype=object)
+
+    numero = conexion.execute(select(func.max(TurnoGeneral.numero_turno)).where(TurnoGeneral.sede == sede)).scalar() or 0
+    horas = hora_fin - hora_inicio
+    turnos_total = 0
+    pendientes_general, pendientes_historial = [], []
+
+    def volcar():
+        if pendientes_general:
+            conexion.execute(insert(TurnoGeneral), pendientes_general)
+            conexion.execute(insert(TurnoHistorial), pendientes_historial)
+            pendientes_general.clear()
+            pendientes_historial.clear()
+
+    for dia in range(dias):
+        cuentas = rng.poisson(turnos_por_hora, size=horas)
+        n = int(cuentas.sum())
+        if n == 0:
+            continue
+        segundos = np.sort(np.concatenate([
+            (hora_inicio + h) * 3600 + rng.uniform(0, 3600, size=c) for h, c in enumerate(cuentas)
+        ]))
+        elegidas = rng.integers(0, mesas, size=n)
+        base = inicio + timedelta(days=dia)
+
+        for segundo, indice in zip(segundos.tolist(), elegidas.tolist()):
+            numero += 1
+            momento = base + timedelta(seconds=segundo)
+            pendientes_general.append({
+                'sede': sede,
+                'numero_turno': numero,
+                'estado': 'atendiendo',
+                'mesa_id': int(mesa_ids[indice]),
+                'docente': nombres[indice],
+                'timestamp': momento
+            })
+            pendientes_historial.append({
+                'sede': sede,
+                'mesa_id': int(mesa_ids[indice]),
+                'turno': numero,
+                'docente': nombres[indice],
+                'accion': 'avance',
+                'timestamp': momento
+            })
+
+        turnos_total += n
+        if len(pendientes_general) >= lote:
+            volcar()
+
+    volcar()
+    return {'usuarios': len(usuarios), 'mesas': mesas, 'turnos': turnos_total, 'ultimo_turno': numero}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generar historial sintético de turnos')
+    parser.add_argument('--db', default='sqlite:////tmp/turnero_sintetico.db')
+    parser.add_argument('--mesas', type=int, default=8)
+    parser.add_argument('--docentes', type=int, default=8)
+    parser.add_argument('--dias', type=int, default=30)
+    parser.add_argument('--filas', type=int, help='Número aproximado de turnos; calcula --dias')
+    parser.add_argument('--turnos-hora', type=int, default=40)
+    parser.add_argument('--hora-inicio', type=int, default=8)
+    parser.add_argument('--hora-fin', type=int, default=17)
+    parser.add_argument('--sede', default=None)
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ['TURNERO_DATABASE_URI'] = args.db
+    from app import app, db
+
+    dias = args.dias
+    if args.filas:
+        dias = dias_para_filas(args.filas, args.turnos_hora, args.hora_inicio, args.hora_fin)
+
+    with app.app_context():
+        db.create_all()
+        inicio = time.perf_counter()
+        with db.engine.begin() as conexion:
+            resultado = generar(conexion, mesas=args.mesas, docentes=args.docentes, dias=dias,
+                                turnos_por_hora=args.turnos_hora, hora_inicio=args.hora_inicio,
+                                hora_fin=args.hora_fin, sede=args.sede, semilla=args.semilla)
+        duracion = time.perf_counter() - inicio
+
+    print(f"{resultado['turnos']} turnos, {resultado['mesas']} mesas, {resultado['usuarios']} docentes "
+          f"en {duracion:.1f} s ({resultado['turnos'] / max(duracion, 1e-9):,.0f} turnos/s)")
+
+
+if __name__ == '__main__':
+    main()
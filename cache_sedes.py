@@ -0,0 +1,38 @@
+import threading
+import time
+
+
+class CacheEstadoSedes:
+    """Caché en memoria del estado público de cada sede.
+
+    Cada sede tiene su propia entrada, así que el tráfico de una sede nunca invalida
+    ni bloquea la de otra. Las escrituras del mismo proceso actualizan la entrada al
+    instante; el TTL acota lo que puede tardar en verse un cambio hecho por otro worker.
+    """
+
+    def __init__(self, ttl=1.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entradas = {}
+
+    def obtener(self, sede, cargar):
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(sede)
+        if entrada and entrada[0] > ahora:
+            return entrada[1]
+
+        valor = cargar()
+        self.fijar(sede, valor)
+        return valor
+
+    def fijar(self, sede, valor):
+        with self._lock:
+            self._entradas[sede] = (time.monotonic() + self.ttl, valor)
+
+    def invalidar(self, sede=None):
+        with self._lock:
+            if sede is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(sede, None)
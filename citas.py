@@ -0,0 +1,162 @@
+import threading
+import time
+from datetime import date, datetime, time as hora_del_dia
+
+from sqlalchemy import select
+
+from metricas import metricas
+from models import db, Cita
+
+ESTADOS_VIGENTES = ('reservada', 'presente', 'atendida')
+
+
+def _minutos(texto):
+    horas, minutos = texto.split(':')
+    return int(horas) * 60 + int(minutos)
+
+
+class IndiceCitas:
+    """Índice en memoria de las franjas ocupadas, por sede y día.
+
+    El día se divide en franjas de CITAS_DURACION_MINUTOS entre CITAS_HORA_INICIO y
+    CITAS_HORA_FIN. Cada mesa tiene un entero usado como mapa de bits (bit k = franja
+    k ocupada), así que las franjas libres de todas las mesas salen con unas pocas
+    operaciones de bits por mesa, sin consultar la base.
+
+    Se reconstruye desde la base al iniciar y se actualiza en cada reserva y
+    cancelación. Las reservas hechas por otro worker se ven al vencer el TTL del día
+    (CITAS_INDICE_TTL); mientras tanto el índice único de la tabla cita impide la doble
+    reserva y quien pierde la carrera invalida el día para recargarlo.
+    """
+
+    def __init__(self, app=None):
+        self.inicio = 8 * 60
+        self.duracion = 15
+        self.franjas = 36
+        self.ttl = 30.0
+        self._lock = threading.Lock()
+        self._dias = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.inicio = _minutos(app.config.get('CITAS_HORA_INICIO', '08:00'))
+        self.duracion = app.config.get('CITAS_DURACION_MINUTOS', 15)
+        self.franjas = (_minutos(app.config.get('CITAS_HORA_FIN', '17:00')) - self.inicio) // self.duracion
+        self.ttl = app.config.get('CITAS_INDICE_TTL', 30.0)
+        app.extensions['indice_citas'] = self
+
+    @property
+    def mascara(self):
+        return (1 << self.franjas) - 1
+
+    def franja(self, hora):
+        """Índice de la franja que empieza a esa hora, o None si no coincide con ninguna"""
+        minutos = hora.hour * 60 + hora.minute - self.inicio
+        if hora.second or minutos < 0 or minutos % self.duracion:
+            return None
+        franja = minutos // self.duracion
+        return franja if franja < self.franjas else None
+
+    def hora(self, franja):
+        minutos = self.inicio + franja * self.duracion
+        return hora_del_dia(minutos // 60, minutos % 60)
+
+    def reconstruir(self):
+        """Cargar todas las citas vigentes de hoy en adelante"""
+        filas = db.session.execute(
+            select(Cita.sede, Cita.fecha, Cita.mesa_id, Cita.hora)
+            .where(Cita.fecha >= date.today(), Cita.estado.in_(ESTADOS_VIGENTES))
+        ).all()
+        vence = time.monotonic() + self.ttl
+        dias = {}
+        for fila in filas:
+            mapas = dias.setdefault((fila.sede, fila.fecha), (vence, {}))[1]
+            franja = self.franja(fila.hora)
+            if franja is not None:
+                mapas[fila.mesa_id] = mapas.get(fila.mesa_id, 0) | (1 << franja)
+        with self._lock:
+            self._dias = dias
+        return len(filas)
+
+    def _cargar_dia(self, sede, fecha):
+        mapas = {}
+        for fila in db.session.execute(
+            select(Cita.mesa_id, Cita.hora)
+            .where(Cita.sede == sede, Cita.fecha == fecha, Cita.estado.in_(ESTADOS_VIGENTES))
+        ):
+            franja = self.franja(fila.hora)
+            if franja is not None:
+                mapas[fila.mesa_id] = mapas.get(fila.mesa_id, 0) | (1 << franja)
+        metricas.incrementar('citas.indice_recargas')
+        return mapas
+
+    def _mapas(self, sede, fecha):
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._dias.get((sede, fecha))
+        if entrada and entrada[0] > ahora:
+            return entrada[1]
+
+        mapas = self._cargar_dia(sede, fecha)
+        with self._lock:
+            self._dias[(sede, fecha)] = (ahora + self.ttl, mapas)
+        return mapas
+
+    def ocupar(self, sede, fecha, mesa_id, hora):
+        franja = self.franja(hora)
+        with self._lock:
+            entrada = self._dias.get((sede, fecha))
+            if entrada and franja is not None:
+                entrada[1][mesa_id] = entrada[1].get(mesa_id, 0) | (1 << franja)
+
+    def liberar(self, sede, fecha, mesa_id, hora):
+        franja = self.franja(hora)
+        with self._lock:
+            entrada = self._dias.get((sede, fecha))
+            if entrada and franja is not None:
+                entrada[1][mesa_id] = entrada[1].get(mesa_id, 0) & ~(1 << franja)
+
+    def invalidar(self, sede, fecha=None):
+        with self._lock:
+            for clave in [c for c in self._dias if c[0] == sede and (fecha is None or c[1] == fecha)]:
+                del self._dias[clave]
+
+    def _libres(self, mapas, mesa_id, desde):
+        return ~mapas.get(mesa_id, 0) & self.mascara & ~((1 << desde) - 1)
+
+    def primera_franja(self, fecha, ahora=None):
+        """Primera franja que todavía se puede reservar (las de hoy ya empezadas no)"""
+        ahora = ahora or datetime.now()
+        if fecha > ahora.date():
+            return 0
+        if fecha < ahora.date():
+            return self.franjas
+        minutos = ahora.hour * 60 + ahora.minute - self.inicio
+        return min(self.franjas, max(0, -(-minutos // self.duracion)))
+
+    def disponibles(self, sede, fecha, mesas, desde=0):
+        """{mesa_id: [franjas libres]} para las mesas dadas, desde la franja `desde`"""
+        mapas = self._mapas(sede, fecha)
+        resultado = {}
+        for mesa_id in mesas:
+            libres = self._libres(mapas, mesa_id, desde)
+            franjas = []
+            while libres:
+                bit = libres & -libres
+                franjas.append(bit.bit_length() - 1)
+                libres ^= bit
+            resultado[mesa_id] = franjas
+        return resultado
+
+    def mesa_libre(self, sede, fecha, mesas, franja):
+        """Primera mesa (en el orden dado) con esa franja libre, o None"""
+        mapas = self._mapas(sede, fecha)
+        bit = 1 << franja
+        for mesa_id in mesas:
+            if not mapas.get(mesa_id, 0) & bit:
+                return mesa_id
+        return None
+
+
+indice_citas = IndiceCitas()
@@ -0,0 +1,188 @@
+from sqlalchemy import bindparam, func, select
+
+from models import db, Mesa, Usuario, TurnoGeneral, Cita, SEDE_PREDETERMINADA
+
+# Sentencias armadas una sola vez al importar el módulo. Un select() ya construido
+# memoriza su clave de caché, así que cada petición solo liga los parámetros: no se
+# vuelven a crear las expresiones ORM ni a compilar el SQL (la caché de compilación
+# del engine encuentra la sentencia en cada ejecución). Devuelven filas (Row) con las
+# columnas que se dibujan, no objetos ORM completos.
+
+ULTIMO_NUMERO_TURNO = select(TurnoGeneral.numero_turno)\
+    .where(TurnoGeneral.sede == bindparam('sede'))\
+    .order_by(TurnoGeneral.numero_turno.desc())\
+    .limit(1)
+
+TOTAL_TURNOS = select(func.count())\
+    .select_from(TurnoGeneral)\
+    .where(TurnoGeneral.sede == bindparam('sede'))
+
+_TASA_ATENCION = select(func.sum(1.0 / Mesa.servicio_media))\
+    .where(Mesa.sede == bindparam('sede'), Mesa.activa.is_(True), Mesa.eliminada.is_(False), Mesa.servicio_media > 0)\
+    .correlate(None)\
+    .scalar_subquery()
+
+ULTIMO_TURNO = select(
+        TurnoGeneral.numero_turno,
+        TurnoGeneral.docente,
+        TurnoGeneral.timestamp,
+        Mesa.numero.label('mesa_numero'),
+        Cita.hora.label('cita_hora'),
+        _TASA_ATENCION.label('tasa_atencion')
+    )\
+    .outerjoin(Mesa, TurnoGeneral.mesa_id == Mesa.id)\
+    .outerjoin(Cita, Cita.turno_id == TurnoGeneral.id)\
+    .where(TurnoGeneral.sede == bindparam('sede'))\
+    .order_by(TurnoGeneral.numero_turno.desc())\
+    .limit(1)
+
+ULTIMOS_TURNOS_SEDE = select(
+        TurnoGeneral.numero_turno,
+        TurnoGeneral.docente,
+        TurnoGeneral.timestamp,
+        TurnoGeneral.estado,
+        Mesa.numero.label('mesa_numero')
+    )\
+    .outerjoin(Mesa, TurnoGeneral.mesa_id == Mesa.id)\
+    .where(TurnoGeneral.sede == bindparam('sede'))\
+    .order_by(TurnoGeneral.numero_turno.desc())\
+    .limit(10)
+
+ULTIMOS_TURNOS_MESA = select(
+        TurnoGeneral.numero_turno,
+        TurnoGeneral.docente,
+        TurnoGeneral.timestamp,
+        TurnoGeneral.estado
+    )\
+    .where(TurnoGeneral.mesa_id == bindparam('mesa_id'))\
+    .order_by(TurnoGeneral.numero_turno.desc())\
+    .limit(5)
+
+MESAS_ACTIVAS = select(Mesa.id, Mesa.numero, Mesa.turno_actual)\
+    .where(Mesa.sede == bindparam('sede'), Mesa.activa.is_(True), Mesa.eliminada.is_(False))\
+    .order_by(Mesa.numero)
+
+MESAS_CON_DOCENTE = select(
+        Mesa.id,
+        Mesa.numero,
+        Mesa.turno_actual,
+        Mesa.activa,
+        Mesa.docente_id,
+        Mesa.servicio_media,
+        Mesa.servicio_var,
+        Mesa.servicio_muestras,
+        func.coalesce(Usuario.nombre, 'Sin asignar').label('docente_nombre')
+    )\
+    .outerjoin(Usuario, Mesa.docente_id == Usuario.id)\
+    .where(Mesa.sede == bindparam('sede'), Mesa.eliminada.is_(False))\
+    .order_by(Mesa.numero)
+
+MESA_DE_DOCENTE = select(Mesa.id, Mesa.numero, Mesa.sede, Mesa.activa, Mesa.turno_actual)\
+    .where(Mesa.docente_id == bindparam('docente_id'), Mesa.eliminada.is_(False))\
+    .limit(1)
+
+_ULTIMO_TURNO_GENERAL = select(func.max(TurnoGeneral.numero_turno))\
+    .where(TurnoGeneral.sede == Mesa.sede)\
+    .scalar_subquery()
+
+_ULTIMO_CONFIRMADO = select(TurnoGeneral.timestamp)\
+    .where(TurnoGeneral.sede == Mesa.sede)\
+    .order_by(TurnoGeneral.numero_turno.desc())\
+    .limit(1)\
+    .scalar_subquery()
+
+MI_MESA = select(
+        Mesa.id,
+        Mesa.numero,
+        Mesa.sede,
+        Mesa.activa,
+        Mesa.turno_actual,
+        _ULTIMO_TURNO_GENERAL.label('ultimo_turno_general'),
+        _ULTIMO_CONFIRMADO.label('ultimo_confirmado')
+    )\
+    .where(Mesa.docente_id == bindparam('docente_id'), Mesa.eliminada.is_(False))\
+    .limit(1)
+
+CITA_EN_ESPERA = select(Cita.id, Cita.nombre, Cita.hora)\
+    .where(
+        Cita.mesa_id == bindparam('mesa_id'),
+        Cita.fecha == bindparam('fecha'),
+        Cita.estado == 'presente',
+        Cita.hora <= bindparam('hasta')
+    )\
+    .order_by(Cita.hora)\
+    .limit(1)
+
+SEDE_EXISTE = select(Mesa.id)\
+    .where(Mesa.sede == bindparam('sede'))\
+    .limit(1)
+
+SEDES = select(Mesa.sede).distinct()
+
+USUARIOS_ACTIVOS = select(Usuario.id, Usuario.nombre, Usuario.rol, Usuario.activo)\
+    .where(Usuario.sede == bindparam('sede'), Usuario.activo.is_(True))
+
+USUARIO = select(Usuario.id, Usuario.nombre, Usuario.email, Usuario.rol, Usuario.sede)\
+    .where(Usuario.id == bindparam('usuario_id'))
+
+
+def ultimo_numero_turno(sede):
+    """Número del último turno general de la sede, o None si todavía no hay"""
+    return db.session.execute(ULTIMO_NUMERO_TURNO, {'sede': sede}).scalar()
+
+
+def total_turnos(sede):
+    return db.session.execute(TOTAL_TURNOS, {'sede': sede}).scalar()
+
+
+def ultimo_turno(sede, conexion=None):
+    """Último turno con el número de su mesa y la tasa de atención conjunta de la sede"""
+    return (conexion or db.session).execute(ULTIMO_TURNO, {'sede': sede}).first()
+
+
+def ultimos_turnos_sede(sede):
+    return db.session.execute(ULTIMOS_TURNOS_SEDE, {'sede': sede}).all()
+
+
+def ultimos_turnos_mesa(mesa_id):
+    return db.session.execute(ULTIMOS_TURNOS_MESA, {'mesa_id': mesa_id}).all()
+
+
+def mesas_activas(sede):
+    return db.session.execute(MESAS_ACTIVAS, {'sede': sede}).all()
+
+
+def mesas_con_docente(sede):
+    """Mesas no eliminadas con el nombre de su docente y sus estadísticas, en la misma consulta"""
+    return db.session.execute(MESAS_CON_DOCENTE, {'sede': sede}).all()
+
+
+def mesa_de_docente(docente_id):
+    return db.session.execute(MESA_DE_DOCENTE, {'docente_id': docente_id}).first()
+
+
+def mi_mesa(docente_id):
+    """Mesa del docente con el último turno general de su sede y cuándo se confirmó"""
+    return db.session.execute(MI_MESA, {'docente_id': docente_id}).first()
+
+
+def cita_en_espera(mesa_id, ahora):
+    """Cita ya presentada de la mesa cuya hora llegó (o llega antes de `ahora`)"""
+    return db.session.execute(CITA_EN_ESPERA, {'mesa_id': mesa_id, 'fecha': ahora.date(), 'hasta': ahora.time()}).first()
+
+
+def sede_existe(sede):
+    return db.session.execute(SEDE_EXISTE, {'sede': sede}).first() is not None
+
+
+def sedes():
+    """Sedes con al menos una mesa, más la predeterminada"""
+    return set(db.session.execute(SEDES).scalars()) | {SEDE_PREDETERMINADA}
+
+
+def usuarios_activos(sede):
+    return db.session.execute(USUARIOS_ACTIVOS, {'sede': sede}).all()
+
+
+def usuario(usuario_id):
+    return db.session.execute(USUARIO, {'usuario_id': usuario_id}).first()
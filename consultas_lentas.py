@@ -0,0 +1,176 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+from metricas import metricas
+
+
+def redactar_parametros(parametros):
+    """Conservar números y nulos (ids, flags); ocultar el contenido de los textos"""
+    if isinstance(parametros, dict):
+        return {clave: redactar_parametros(valor) for clave, valor in parametros.items()}
+    if isinstance(parametros, (list, tuple)):
+        return [redactar_parametros(valor) for valor in parametros]
+    if parametros is None or isinstance(parametros, (bool, int, float)):
+        return parametros
+    return f'<{type(parametros).__name__}:{len(str(parametros))}>'
+
+
+class RegistroConsultasLentas:
+    """Registro de consultas SQL que superan un umbral de duración.
+
+    Cada consulta lenta se escribe como una línea JSON en un log rotativo de instance/
+    con el SQL, los parámetros redactados, el endpoint de Flask que la originó y su plan
+    (EXPLAIN QUERY PLAN en SQLite, EXPLAIN en PostgreSQL). Además se acumula en memoria
+    el total por sentencia para mostrar las que más tiempo consumen.
+    """
+
+    MAXIMO_SENTENCIAS = 500
+
+    def __init__(self, app=None):
+        self.umbral = None
+        self._lock = threading.Lock()
+        self._totales = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, base=None):
+        app.extensions['consultas_lentas'] = self
+        if not app.config.get('CONSULTAS_LENTAS_HABILITADO', True):
+            return
+
+        self.umbral = app.config.get('CONSULTAS_LENTAS_UMBRAL_MS', 100) / 1000.0
+        os.makedirs(app.instance_path, exist_ok=True)
+
+        self.logger = logging.getLogger('turnero.consultas_lentas')
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            manejador = RotatingFileHandler(
+                os.path.join(app.instance_path, 'consultas_lentas.log'),
+                maxBytes=app.config.get('CONSULTAS_LENTAS_MAX_BYTES', 5 * 1024 * 1024),
+                backupCount=app.config.get('CONSULTAS_LENTAS_ARCHIVOS', 5),
+                encoding='utf-8'
+            )
+            manejador.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(manejador)
+
+        # Solo el motor de la aplicación: Alembic y los motores de los benchmarks quedan fuera
+        with app.app_context():
+            motor = base.engine
+        event.listen(motor, 'before_cursor_execute', self._antes)
+        event.listen(motor, 'after_cursor_execute', self._despues)
+        event.listen(motor, 'handle_error', self._error)
+
+    def _antes(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('inicio_consulta', []).append((context, time.perf_counter()))
+
+    def _despues(self, conn, cursor, statement, parameters, context, executemany):
+        inicios = conn.info.get('inicio_consulta')
+        if not inicios:
+            return
+        duracion = time.perf_counter() - inicios.pop()[1]
+        if duracion < self.umbral or conn.info.get('explicando'):
+            return
+
+        endpoint = request.endpoint if has_request_context() else None
+        plan = None if executemany else self._plan(conn, statement, parameters)
+
+        self.logger.info(json.dumps({
+            'fecha': datetime.now().isoformat(timespec='milliseconds'),
+            'duracion_ms': round(duracion * 1000, 2),
+            'endpoint': endpoint,
+            'sql': statement,
+            'parametros': redactar_parametros(parameters) if not executemany else f'<{len(parameters)} filas>',
+            'plan': plan
+        }, ensure_ascii=False, default=str))
+
+        metricas.incrementar('consultas.lentas')
+        self._acumular(statement, duracion, endpoint)
+
+    def _error(self, contexto):
+        # La sentencia falló: after_cursor_execute no llega, descartar su inicio
+        inicios = contexto.connection.info.get('inicio_consulta') if contexto.connection is not None else None
+        if inicios and contexto.execution_context is not None and inicios[-1][0] is contexto.execution_context:
+            inicios.pop()
+
+    def _plan(self, conn, statement, parameters):
+        dialecto = conn.dialect.name
+        if dialecto == 'sqlite':
+            prefijo = 'EXPLAIN QUERY PLAN '
+        elif dialecto == 'postgresql':
+            prefijo = 'EXPLAIN '
+        else:
+            return None
+        if not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'WITH')):
+            return None
+
+        # En PostgreSQL un EXPLAIN fallido abortaría la transacción de la petición:
+        # se ejecuta dentro de un SAVEPOINT y, si falla, se vuelve a él
+        conexion_dbapi = conn.connection.dbapi_connection
+        savepoint = dialecto == 'postgresql' and not getattr(conexion_dbapi, 'autocommit', False)
+
+        conn.info['explicando'] = True
+        try:
+            cursor = conexion_dbapi.cursor()
+            try:
+                if savepoint:
+                    cursor.execute('SAVEPOINT explicar_consulta_lenta')
+                try:
+                    cursor.execute(prefijo + statement, parameters)
+                    filas = cursor.fetchall()
+                except Exception:
+                    if savepoint:
+                        cursor.execute('ROLLBACK TO SAVEPOINT explicar_consulta_lenta')
+                    raise
+                finally:
+                    if savepoint:
+                        cursor.execute('RELEASE SAVEPOINT explicar_consulta_lenta')
+            finally:
+                cursor.close()
+        except Exception as e:
+            return f'No se pudo obtener el plan: {e}'
+        finally:
+            conn.info['explicando'] = False
+
+        if dialecto == 'sqlite':
+            return [fila[-1] for fila in filas]
+        return [fila[0] for fila in filas]
+
+    def _acumular(self, statement, duracion, endpoint):
+        with self._lock:
+            total = self._totales.get(statement)
+            if total is None:
+                if len(self._totales) >= self.MAXIMO_SENTENCIAS:
+                    menor = min(self._totales, key=lambda s: self._totales[s]['total_ms'])
+                    del self._totales[menor]
+                total = {'sql': statement, 'veces': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'endpoints': set()}
+                self._totales[statement] = total
+            total['veces'] += 1
+            total['total_ms'] += duracion * 1000
+            total['max_ms'] = max(total['max_ms'], duracion * 1000)
+            if endpoint:
+                total['endpoints'].add(endpoint)
+
+    def peores(self, limite=20):
+        """Sentencias lentas ordenadas por tiempo total acumulado"""
+        with self._lock:
+            totales = sorted(self._totales.values(), key=lambda t: t['total_ms'], reverse=True)[:limite]
+            return [{
+                'sql': t['sql'],
+                'veces': t['veces'],
+                'total_ms': round(t['total_ms'], 1),
+                'media_ms': round(t['total_ms'] / t['veces'], 1),
+                'max_ms': round(t['max_ms'], 1),
+                'endpoints': sorted(t['endpoints'])
+            } for t in totales]
+
+
+consultas_lentas = RegistroConsultasLentas()
@@ -0,0 +1,81 @@
+import hmac
+import os
+import threading
+import time
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from metricas import metricas
+
+# Prefijos de los hashes de werkzeug ("metodo$sal$hash"); cualquier otro valor es texto plano heredado
+PREFIJOS_HASH = ('scrypt:', 'pbkdf2:')
+
+
+class VerificacionesSaturadas(Exception):
+    """No hubo un turno libre para verificar la contraseña dentro del tiempo máximo de espera"""
+
+
+class Contrasenas:
+    """Hash de contraseñas con sal y costo configurable (PASSWORD_METODO).
+
+    Verificar un hash es CPU puro, así que se limita cuántas verificaciones corren a la
+    vez por proceso (PASSWORD_CONCURRENCIA) y cuánto se espera por un turno
+    (PASSWORD_ESPERA): en el pico de inicio de jornada el resto de peticiones sigue
+    atendiéndose y los logins que no alcanzan turno fallan rápido en lugar de acumularse.
+    """
+
+    def __init__(self, app=None):
+        self.metodo = 'scrypt:16384:8:1'
+        self.espera = 5.0
+        self.concurrencia = os.cpu_count() or 2
+        self._turnos = threading.BoundedSemaphore(self.concurrencia)
+        self._hash_falso = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.metodo = app.config.get('PASSWORD_METODO', self.metodo)
+        self.espera = app.config.get('PASSWORD_ESPERA', self.espera)
+        self.concurrencia = app.config.get('PASSWORD_CONCURRENCIA') or os.cpu_count() or 2
+        self._turnos = threading.BoundedSemaphore(self.concurrencia)
+        self._hash_falso = None
+        app.extensions['contrasenas'] = self
+
+    def generar(self, password):
+        return generate_password_hash(password, method=self.metodo)
+
+    @staticmethod
+    def es_hash(valor):
+        return bool(valor) and valor.startswith(PREFIJOS_HASH) and valor.count('$') == 2
+
+    def necesita_actualizar(self, valor):
+        """Texto plano heredado o hash hecho con otro método/costo distinto al configurado"""
+        return not self.es_hash(valor) or valor.split('$', 1)[0] != self.metodo
+
+    def verificar(self, guardado, password):
+        """Comparar password con el valor guardado (hash o texto plano heredado).
+
+        Con guardado=None se verifica contra un hash ficticio para que un email
+        inexistente tarde lo mismo que una contraseña incorrecta.
+        """
+        if not self._turnos.acquire(timeout=self.espera):
+            metricas.incrementar('login.saturado')
+            raise VerificacionesSaturadas()
+        try:
+            inicio = time.perf_counter()
+            if guardado is None:
+                if self._hash_falso is None:
+                    self._hash_falso = self.generar(os.urandom(16).hex())
+                check_password_hash(self._hash_falso, password)
+                valido = False
+            elif self.es_hash(guardado):
+                valido = check_password_hash(guardado, password)
+            else:
+                valido = hmac.compare_digest(guardado.encode(), password.encode())
+            metricas.observar('login.verificacion_ms', (time.perf_counter() - inicio) * 1000)
+            return valido
+        finally:
+            self._turnos.release()
+
+
+contrasenas = Contrasenas()
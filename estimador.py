@@ -0,0 +1,104 @@
+import math
+
+import numpy as np
+
+
+def registrar_avance(mesa, momento, alfa, pausa_maxima):
+    """Actualizar en O(1) la media y varianza exponenciales del tiempo de atención de una mesa.
+
+    El tiempo de atención es el intervalo entre dos avances consecutivos de la mesa;
+    los intervalos mayores que pausa_maxima (segundos) se consideran pausas y se ignoran.
+    """
+    if mesa.ultimo_avance is not None:
+        intervalo = (momento - mesa.ultimo_avance).total_seconds()
+        if 0 < intervalo <= pausa_maxima:
+            if not mesa.servicio_muestras:
+                mesa.servicio_media = intervalo
+                mesa.servicio_var = 0.0
+            else:
+                diferencia = intervalo - mesa.servicio_media
+                incremento = alfa * diferencia
+                mesa.servicio_media = mesa.servicio_media + incremento
+                mesa.servicio_var = (1 - alfa) * (mesa.servicio_var + diferencia * incremento)
+            mesa.servicio_muestras = (mesa.servicio_muestras or 0) + 1
+
+    mesa.ultimo_avance = momento
+
+
+def espera_estimada(mesas, ultimo_turno, posiciones):
+    """Espera estimada (segundos) para los próximos turnos según las mesas activas.
+
+    Las mesas activas con estadísticas atienden en paralelo, así que la cola avanza a
+    la suma de sus tasas de atención (1 / media de cada mesa).
+    """
+    tasa = sum(1.0 / m.servicio_media for m in mesas if m.activa and m.servicio_media)
+    return espera_por_tasa(tasa, ultimo_turno, posiciones)
+
+
+def espera_por_tasa(tasa, ultimo_turno, posiciones):
+    """Espera estimada a partir de la tasa de atención conjunta (turnos por segundo)"""
+    if not tasa or tasa <= 0:
+        return []
+
+    return [{
+        'posicion': posicion,
+        'turno': ultimo_turno + posicion,
+        'segundos': round(posicion / tasa)
+    } for posicion in range(1, posiciones + 1)]
+
+
+def estadisticas_mesa(mesa):
+    if not mesa.servicio_muestras:
+        return None
+    return {
+        'media': round(mesa.servicio_media, 1),
+        'desviacion': round(math.sqrt(max(mesa.servicio_var or 0.0, 0.0)), 1),
+        'muestras': mesa.servicio_muestras
+    }
+
+
+def calcular_estadisticas_historial(mesa_ids, tiempos, alfa, pausa_maxima):
+    """Cálculo vectorizado de las mismas estadísticas a partir del historial de avances.
+
+    mesa_ids y tiempos (segundos, float) son arreglos paralelos con un elemento por
+    evento 'avance'. Devuelve {mesa_id: (media, varianza, muestras, ultimo_tiempo)}
+    con el mismo resultado que aplicar registrar_avance evento por evento.
+    """
+    mesa_ids = np.asarray(mesa_ids, dtype=np.int64)
+    tiempos = np.asarray(tiempos, dtype=np.float64)
+    if len(mesa_ids) == 0:
+        return {}
+
+    orden = np.lexsort((tiempos, mesa_ids))
+    mesa_ids = mesa_ids[orden]
+    tiempos = tiempos[orden]
+
+    ultimos_indices = np.flatnonzero(np.r_[mesa_ids[1:] != mesa_ids[:-1], True])
+    resultado = {int(mesa_ids[i]): (None, None, 0, float(tiempos[i])) for i in ultimos_indices}
+
+    intervalos = np.diff(tiempos)
+    validos = (mesa_ids[1:] == mesa_ids[:-1]) & (intervalos > 0) & (intervalos <= pausa_maxima)
+    x = intervalos[validos]
+    grupos = mesa_ids[1:][validos]
+    if len(x) == 0:
+        return resultado
+
+    unicos, inicios, cuentas = np.unique(grupos, return_index=True, return_counts=True)
+    posicion = np.arange(len(x)) - np.repeat(inicios, cuentas)
+    n = np.repeat(cuentas, cuentas)
+
+    # El primer intervalo inicializa la media; cada uno de los siguientes entra con peso alfa
+    # y decae (1 - alfa) por cada intervalo posterior. Los pesos de cada mesa suman 1.
+    pesos = alfa * (1 - alfa) ** (n - 1 - posicion)
+    primeros = posicion == 0
+    pesos[primeros] = (1 - alfa) ** (n[primeros] - 1)
+
+    indice_grupo = np.repeat(np.arange(len(unicos)), cuentas)
+    medias = np.bincount(indice_grupo, weights=pesos * x)
+    segundos_momentos = np.bincount(indice_grupo, weights=pesos * x * x)
+    varianzas = np.maximum(segundos_momentos - medias ** 2, 0.0)
+
+    for mesa_id, media, varianza, cuenta in zip(unicos, medias, varianzas, cuentas):
+        ultimo = resultado[int(mesa_id)][3]
+        resultado[int(mesa_id)] = (float(media), float(varianza), int(cuenta), ultimo)
+    return resultado
@@ -0,0 +1,197 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import event, insert
+
+from metricas import metricas
+from models import db, TurnoHistorial
+
+logger = logging.getLogger('turnero.historial')
+
+
+class BufferHistorial:
+    """Escritura diferida (write-behind) de los eventos de TurnoHistorial.
+
+    En modo síncrono (HISTORIAL_SINCRONO=True, el valor por defecto) cada evento se
+    agrega a la transacción de la petición, igual que antes. En modo diferido los
+    eventos se guardan en la sesión y solo se encolan cuando esa transacción hace
+    commit; un hilo en segundo plano los inserta por lotes, por tamaño o por tiempo.
+
+    Un lote que falla se reintenta con espera exponencial (HISTORIAL_REINTENTOS); si
+    se agotan los reintentos se inserta fila por fila y solo se descartan, registrándolas
+    en el log, las que siguen fallando. Con la cola llena los eventos se escriben en la
+    misma petición en lugar de bloquearla.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.sincrono = True
+        self._cola = None
+        self._hilo = None
+        self._detener = threading.Event()
+        self._lock_escritura = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.sincrono = app.config.get('HISTORIAL_SINCRONO', True)
+        self.tamano_lote = app.config.get('HISTORIAL_LOTE', 200)
+        self.intervalo = app.config.get('HISTORIAL_INTERVALO', 1.0)
+        self.reintentos = max(1, app.config.get('HISTORIAL_REINTENTOS', 5))
+        self.espera_reintento = app.config.get('HISTORIAL_REINTENTO_ESPERA', 0.5)
+        app.extensions['buffer_historial'] = self
+
+        if self.sincrono:
+            return
+
+        self._cola = queue.Queue(maxsize=app.config.get('HISTORIAL_COLA_MAX', 10000))
+        event.listen(db.session, 'after_commit', self._al_confirmar)
+        event.listen(db.session, 'after_soft_rollback', self._al_revertir)
+
+        self._hilo = threading.Thread(target=self._trabajar, name='buffer-historial', daemon=True)
+        self._hilo.start()
+        atexit.register(self.detener)
+
+    def registrar(self, mesa_id, turno, docente, accion, **extra):
+        if self.sincrono:
+            db.session.add(TurnoHistorial(
+                mesa_id=mesa_id,
+                turno=turno,
+                docente=docente,
+                accion=accion,
+                **extra
+            ))
+            return
+
+        pendientes = db.session.info.setdefault('historial_pendiente', [])
+        pendientes.append({
+            'mesa_id': mesa_id,
+            'turno': turno,
+            'docente': docente,
+            'accion': accion,
+            'timestamp': datetime.utcnow(),
+            **extra
+        })
+
+    def _al_confirmar(self, session):
+        pendientes = session.info.pop('historial_pendiente', None)
+        if not pendientes:
+            return
+        encolado = time.monotonic()
+        desbordados = []
+        for fila in pendientes:
+            try:
+                self._cola.put_nowait((encolado, fila))
+            except queue.Full:
+                desbordados.append((encolado, fila))
+        metricas.fijar('historial.cola', self._cola.qsize())
+
+        if desbordados:
+            # Cola llena: escribir aquí, un solo intento, antes que bloquear la petición
+            metricas.incrementar('historial.desbordes', len(desbordados))
+            self._escribir_con_reintentos(desbordados, 1)
+
+    def _al_revertir(self, session, previous_transaction):
+        session.info.pop('historial_pendiente', None)
+
+    def _trabajar(self):
+        while not self._detener.is_set():
+            # Tomar e insertar bajo el mismo lock: vaciar() espera también al lote en curso
+            with self._lock_escritura:
+                lote = self._tomar_lote()
+                if lote:
+                    self._escribir_con_reintentos(lote, self.reintentos)
+
+    def _tomar_lote(self):
+        lote = []
+        limite = time.monotonic() + self.intervalo
+        while len(lote) < self.tamano_lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._cola.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _insertar(self, filas):
+        with self.app.app_context():
+            try:
+                db.session.execute(insert(TurnoHistorial), filas)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def _escribir_con_reintentos(self, lote, intentos):
+        filas = [fila for _, fila in lote]
+        for intento in range(1, intentos + 1):
+            try:
+                self._insertar(filas)
+                break
+            except Exception as e:
+                metricas.incrementar('historial.errores')
+                if intento == intentos:
+                    logger.error('Lote de historial (%d filas) falló tras %d intentos: %s', len(filas), intentos, e)
+                    self._insertar_por_fila(filas)
+                    return
+                espera = min(self.espera_reintento * 2 ** (intento - 1), 30.0)
+                logger.warning('Error escribiendo lote de historial, reintento %d de %d en %.1f s: %s',
+                               intento + 1, intentos, espera, e)
+                # Al detener no se espera: se reintenta de inmediato para no demorar la salida
+                self._detener.wait(espera)
+
+        retraso = time.monotonic() - min(encolado for encolado, _ in lote)
+        metricas.observar('historial.lote_tamano', len(lote))
+        metricas.observar('historial.retraso_segundos', retraso)
+        metricas.incrementar('historial.escritos', len(lote))
+        metricas.fijar('historial.cola', self._cola.qsize())
+
+    def _insertar_por_fila(self, filas):
+        """Último recurso: aislar las filas que fallan y descartar solo esas"""
+        for fila in filas:
+            try:
+                self._insertar([fila])
+                metricas.incrementar('historial.escritos')
+            except Exception as e:
+                metricas.incrementar('historial.descartados')
+                logger.error('Evento de historial descartado: %s (%s)', fila, e)
+
+    def vaciar(self):
+        """Escribir de inmediato todo lo que esté en cola, incluido el lote que el hilo ya tomó.
+
+        Al volver no queda ninguna escritura pendiente ni en curso de lo encolado hasta
+        ese momento (el reinicio de una sede lo usa antes de borrar su historial).
+        """
+        if self.sincrono:
+            return
+        with self._lock_escritura:
+            lote = []
+            while True:
+                try:
+                    lote.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+                if len(lote) >= self.tamano_lote:
+                    self._escribir_con_reintentos(lote, self.reintentos)
+                    lote = []
+            if lote:
+                self._escribir_con_reintentos(lote, self.reintentos)
+
+    def detener(self):
+        """Detener el hilo de escritura drenando la cola antes de salir"""
+        if self._hilo is None:
+            return
+        self._detener.set()
+        self._hilo.join(timeout=self.intervalo + 5)
+        self._hilo = None
+        self.vaciar()
+
+
+buffer_historial = BufferHistorial()
@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, jsonify, make_response, request, session
+
+from metricas import metricas
+
+CABECERA = 'Idempotency-Key'
+
+
+class AlmacenIdempotencia:
+    """Respuestas ya enviadas a peticiones con cabecera Idempotency-Key.
+
+    El cliente manda una clave por acción (la misma en cada reintento). La primera
+    petición con esa clave se ejecuta y, si tuvo éxito, su respuesta se guarda; las
+    repeticiones reciben la respuesta original sin volver a ejecutar la vista. Si llega
+    un duplicado mientras la original sigue en curso, espera a que termine.
+
+    El almacén vive en memoria del proceso, con tamaño máximo y expiración por TTL.
+    """
+
+    def __init__(self, app=None):
+        self.ttl = 600
+        self.maximo = 10000
+        self.espera_maxima = 30
+        self._lock = threading.Lock()
+        self._respuestas = OrderedDict()
+        self._en_curso = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('IDEMPOTENCIA_TTL', 600)
+        self.maximo = app.config.get('IDEMPOTENCIA_MAXIMO', 10000)
+        self.espera_maxima = app.config.get('IDEMPOTENCIA_ESPERA', 30)
+        app.extensions['idempotencia'] = self
+
+    def _purgar(self, ahora):
+        # Todas las entradas tienen el mismo TTL: el orden de inserción es el de expiración
+        while self._respuestas:
+            clave, (expira, _) = next(iter(self._respuestas.items()))
+            if expira > ahora and len(self._respuestas) <= self.maximo:
+                break
+            self._respuestas.popitem(last=False)
+
+    def ejecutar(self, clave, vista):
+        """Devolver (respuesta, repetida): la guardada para la clave o la de ejecutar vista()"""
+        while True:
+            with self._lock:
+                self._purgar(time.monotonic())
+                guardada = self._respuestas.get(clave)
+                if guardada:
+                    return self._reconstruir(guardada[1]), True
+                evento = self._en_curso.get(clave)
+                if evento is None:
+                    evento = self._en_curso[clave] = threading.Event()
+                    break
+            if not evento.wait(self.espera_maxima):
+                return None, True
+
+        guardar = None
+        try:
+            respuesta = make_response(vista())
+            datos = respuesta.get_json(silent=True) if respuesta.is_json else None
+            if respuesta.status_code < 400 and isinstance(datos, dict) and datos.get('success'):
+                guardar = (respuesta.status_code, respuesta.get_data(), respuesta.mimetype)
+            return respuesta, False
+        finally:
+            with self._lock:
+                if guardar is not None:
+                    self._respuestas[clave] = (time.monotonic() + self.ttl, guardar)
+                    self._purgar(time.monotonic())
+                self._en_curso.pop(clave).set()
+
+    def _reconstruir(self, guardada):
+        estado, cuerpo, tipo = guardada
+        return current_app.response_class(cuerpo, status=estado, mimetype=tipo)
+
+
+almacen_idempotencia = AlmacenIdempotencia()
+
+
+def idempotente(f):
+    """Atender una sola vez cada Idempotency-Key; sin cabecera la vista se ejecuta normalmente.
+
+    La clave se aísla por usuario y ruta, así que dos usuarios (o dos mesas) nunca
+    comparten respuestas aunque el cliente repita la misma clave.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        clave = request.headers.get(CABECERA)
+        if not clave:
+            return f(*args, **kwargs)
+
+        usuario = session.get('usuario', {}).get('id')
+        respuesta, repetida = almacen_idempotencia.ejecutar(
+            (usuario, request.path, clave[:200]),
+            lambda: f(*args, **kwargs)
+        )
+        if respuesta is None:
+            metricas.incrementar('idempotencia.en_curso')
+            return jsonify({'success': False, 'error': 'La misma operación todavía se está procesando'}), 409
+
+        if repetida:
+            metricas.incrementar('idempotencia.repetidas')
+            respuesta.headers['Idempotent-Replayed'] = 'true'
+        return respuesta
+    return decorated_function
@@ -0,0 +1,63 @@
+import threading
+from collections import deque
+
+
+class Metricas:
+    """Registro en memoria de contadores, valores y distribuciones del proceso"""
+
+    def __init__(self, muestras=1024):
+        self._lock = threading.Lock()
+        self._muestras = muestras
+        self._contadores = {}
+        self._valores = {}
+        self._distribuciones = {}
+
+    def incrementar(self, nombre, valor=1):
+        with self._lock:
+            self._contadores[nombre] = self._contadores.get(nombre, 0) + valor
+
+    def fijar(self, nombre, valor):
+        with self._lock:
+            self._valores[nombre] = valor
+
+    def observar(self, nombre, valor):
+        with self._lock:
+            dist = self._distribuciones.get(nombre)
+            if dist is None:
+                dist = {'n': 0, 'suma': 0.0, 'min': valor, 'max': valor,
+                        'muestras': deque(maxlen=self._muestras)}
+                self._distribuciones[nombre] = dist
+            dist['n'] += 1
+            dist['suma'] += valor
+            dist['min'] = min(dist['min'], valor)
+            dist['max'] = max(dist['max'], valor)
+            dist['muestras'].append(valor)
+
+    def resumen(self):
+        with self._lock:
+            distribuciones = {}
+            for nombre, dist in self._distribuciones.items():
+                ordenadas = sorted(dist['muestras'])
+                distribuciones[nombre] = {
+                    'n': dist['n'],
+                    'media': dist['suma'] / dist['n'],
+                    'min': dist['min'],
+                    'max': dist['max'],
+                    'p50': _percentil(ordenadas, 0.50),
+                    'p95': _percentil(ordenadas, 0.95),
+                    'p99': _percentil(ordenadas, 0.99),
+                }
+            return {
+                'contadores': dict(self._contadores),
+                'valores': dict(self._valores),
+                'distribuciones': distribuciones,
+            }
+
+
+def _percentil(ordenadas, q):
+    if not ordenadas:
+        return None
+    return ordenadas[min(len(ordenadas) - 1, int(q * len(ordenadas)))]
+
+
+metricas = Metricas()
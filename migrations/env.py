@@ -1,4 +1,6 @@
 import logging
+import os
+import sys
 from logging.config import fileConfig
 
 from flask import current_app
@@ -14,6 +16,9 @@ config = context.config
 fileConfig(config.config_file_name)
 logger = logging.getLogger('alembic.env')
 
+# Las migraciones importan los ayudantes de este directorio (from lotes import rellenar)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
 
 def get_engine():
     try:
@@ -100,6 +105,8 @@ def run_migrations_online():
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
+            # Una transacción por archivo: los rellenos por lotes confirman a mitad de la migración
+            transaction_per_migration=True,
             **conf_args
         )
 
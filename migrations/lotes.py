@@ -0,0 +1,185 @@
+"""Migraciones de datos por lotes para las tablas grandes de turnos.
+
+Un UPDATE sobre toda turno_general o turno_historial corre en una sola transacción
+que bloquea la tabla (en SQLite, toda la base) mientras dura. Con este módulo el
+relleno avanza por rangos de la clave primaria (keyset: nunca OFFSET sobre la tabla
+completa), cada lote se confirma por separado, el avance queda guardado en la tabla
+alembic_lotes y una migración interrumpida continúa desde el último lote confirmado.
+
+Patrón para agregar una columna a una tabla grande:
+
+    from lotes import rellenar, columna_no_nula
+
+    def upgrade():
+        with op.batch_alter_table('turno_general') as batch_op:
+            batch_op.add_column(sa.Column('docente_id', sa.Integer(), nullable=True))
+
+        turno = sa.table('turno_general', sa.column('id'), sa.column('docente'), sa.column('docente_id'))
+        usuario = sa.table('usuario', sa.column('id'), sa.column('nombre'))
+        rellenar(
+            turno,
+            {'docente_id': sa.select(usuario.c.id).where(usuario.c.nombre == turno.c.docente).scalar_subquery()},
+            donde=turno.c.docente_id.is_(None),
+            nombre=f'{revision}_docente_id',
+        )
+
+        columna_no_nula('turno_general', 'docente_id', sa.Integer())
+
+El relleno alcanza también las filas que la aplicación inserta mientras corre, pero
+no las que lleguen después de terminar: columna_no_nula solo es segura cuando la
+versión desplegada ya escribe la columna nueva.
+
+Cada lote es una sola sentencia y debe ser idempotente (repetir un rango no cambia
+el resultado): al reanudar se puede volver a ejecutar el último lote. El modo batch
+de Alembic solo se usa para los cambios de esquema que SQLite no soporta con ALTER.
+"""
+import logging
+import time
+from datetime import datetime
+
+import sqlalchemy as sa
+from alembic import op
+
+logger = logging.getLogger('alembic.lotes')
+
+puntos_control = sa.Table(
+    'alembic_lotes', sa.MetaData(),
+    sa.Column('nombre', sa.String(150), primary_key=True),
+    sa.Column('ultima_clave', sa.BigInteger(), nullable=False),
+    sa.Column('filas', sa.BigInteger(), nullable=False),
+    sa.Column('actualizado', sa.DateTime(), nullable=False)
+)
+
+
+def _leer_punto_control(conexion, nombre):
+    return conexion.execute(
+        sa.select(puntos_control.c.ultima_clave, puntos_control.c.filas).where(puntos_control.c.nombre == nombre)
+    ).first()
+
+
+def _guardar_punto_control(conexion, nombre, ultima_clave, filas):
+    valores = {'ultima_clave': ultima_clave, 'filas': filas, 'actualizado': datetime.utcnow()}
+    actualizadas = conexion.execute(
+        sa.update(puntos_control).where(puntos_control.c.nombre == nombre).values(**valores)
+    ).rowcount
+    if not actualizadas:
+        conexion.execute(sa.insert(puntos_control).values(nombre=nombre, **valores))
+
+
+def _borrar_punto_control(conexion, nombre):
+    conexion.execute(sa.delete(puntos_control).where(puntos_control.c.nombre == nombre))
+    if conexion.execute(sa.select(sa.func.count()).select_from(puntos_control)).scalar() == 0:
+        puntos_control.drop(conexion, checkfirst=True)
+
+
+def por_lotes(conexion, tabla, funcion, nombre, clave='id', lote=5000, pausa=0.0, objetivo_ms=None,
+              lote_minimo=100, lote_maximo=100000, intervalo_progreso=5.0, reloj=time.monotonic):
+    """Ejecutar funcion(conexion, desde, hasta) sobre rangos consecutivos de la clave.
+
+    Cada llamada cubre las filas con desde < clave <= hasta y devuelve cuántas filas
+    tocó. La conexión debe estar en autocommit: cada sentencia se confirma sola y el
+    punto de control se guarda después de cada lote. `pausa` deja respirar a las
+    escrituras de la aplicación entre lotes; con `objetivo_ms` el tamaño del lote se
+    ajusta para que cada uno tarde alrededor de ese tiempo. Al llegar al final se vuelve
+    a leer la clave máxima y se sigue con las filas que la aplicación insertó mientras
+    tanto, hasta que no aparezcan nuevas. Devuelve las filas tocadas.
+    """
+    columna = tabla.c[clave]
+    puntos_control.create(conexion, checkfirst=True)
+
+    previo = _leer_punto_control(conexion, nombre)
+    ultima, filas = (previo.ultima_clave, previo.filas) if previo else (None, 0)
+    if previo:
+        logger.info('%s: reanudando después de %s=%s (%d filas ya procesadas)', nombre, clave, ultima, filas)
+    else:
+        ultima = conexion.execute(sa.select(sa.func.min(columna))).scalar()
+        if ultima is None:
+            logger.info('%s: la tabla %s está vacía', nombre, tabla.name)
+            return 0
+        ultima -= 1
+
+    maxima = conexion.execute(sa.select(sa.func.max(columna))).scalar()
+    inicio_clave = ultima
+    inicio = ultimo_aviso = reloj()
+    lotes = 0
+
+    while True:
+        while ultima < maxima:
+            # Límite superior del lote buscado en el índice de la clave, sin leer las filas
+            hasta = conexion.execute(
+                sa.select(columna).where(columna > ultima).order_by(columna).offset(lote - 1).limit(1)
+            ).scalar()
+            if hasta is None:
+                hasta = maxima
+
+            inicio_lote = reloj()
+            filas += funcion(conexion, ultima, hasta) or 0
+            _guardar_punto_control(conexion, nombre, hasta, filas)
+            duracion_ms = (reloj() - inicio_lote) * 1000
+            ultima = hasta
+            lotes += 1
+
+            if objetivo_ms:
+                if duracion_ms > objetivo_ms * 1.5:
+                    lote = max(lote_minimo, lote // 2)
+                elif duracion_ms < objetivo_ms / 2:
+                    lote = min(lote_maximo, lote * 2)
+
+            ahora = reloj()
+            if ahora - ultimo_aviso >= intervalo_progreso or ultima >= maxima:
+                ultimo_aviso = ahora
+                avance = (ultima - inicio_clave) / max(maxima - inicio_clave, 1)
+                transcurrido = ahora - inicio
+                restante = transcurrido * (1 - avance) / avance if avance else 0
+                logger.info('%s: %.1f%% (%s=%s de %s), %d filas, %d lotes, %.0f s transcurridos, ~%.0f s restantes',
+                            nombre, avance * 100, clave, ultima, maxima, filas, lotes, transcurrido, restante)
+
+            if pausa and ultima < maxima:
+                time.sleep(pausa)
+
+        # La aplicación sigue insertando mientras corre el relleno: continuar con las filas nuevas
+        nueva_maxima = conexion.execute(sa.select(sa.func.max(columna))).scalar()
+        if nueva_maxima is None or nueva_maxima <= maxima:
+            break
+        logger.info('%s: la tabla creció hasta %s=%s mientras corría, continuando', nombre, clave, nueva_maxima)
+        maxima = nueva_maxima
+
+    _borrar_punto_control(conexion, nombre)
+    return filas
+
+
+def rellenar_con_conexion(conexion, tabla, valores, donde=None, clave='id', **opciones):
+    """UPDATE tabla SET valores [WHERE donde] por lotes sobre una conexión en autocommit"""
+    columna = tabla.c[clave]
+
+    def actualizar(conexion, desde, hasta):
+        condicion = sa.and_(columna > desde, columna <= hasta)
+        if donde is not None:
+            condicion = sa.and_(condicion, donde)
+        return conexion.execute(sa.update(tabla).where(condicion).values(valores)).rowcount
+
+    return por_lotes(conexion, tabla, actualizar, clave=clave, **opciones)
+
+
+def rellenar(tabla, valores, donde=None, nombre=None, **opciones):
+    """Relleno por lotes desde una migración de Alembic.
+
+    Confirma lo anterior de la migración y corre en un bloque autocommit para que cada
+    lote sea su propia transacción. Con --sql (modo offline) no hay base que recorrer:
+    se emite un único UPDATE.
+    """
+    contexto = op.get_context()
+    if contexto.as_sql:
+        condicion = donde if donde is not None else sa.true()
+        op.execute(sa.update(tabla).where(condicion).values(valores))
+        return None
+
+    with contexto.autocommit_block():
+        return rellenar_con_conexion(op.get_bind(), tabla, valores, donde=donde,
+                                     nombre=nombre or f'{tabla.name}_relleno', **opciones)
+
+
+def columna_no_nula(tabla, columna, tipo, **argumentos):
+    """Marcar NOT NULL una columna ya rellenada; en SQLite recrea la tabla en modo batch"""
+    with op.batch_alter_table(tabla) as batch_op:
+        batch_op.alter_column(columna, existing_type=tipo, nullable=False, **argumentos)
@@ -0,0 +1,26 @@
+"""Índice en mesa.docente_id para el panel del docente
+
+Revision ID: 3b9d2f61c0a4
+Revises: 7e20bd9c538c
+Create Date: 2026-10-19 12:22:09.514387
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9d2f61c0a4'
+down_revision = '7e20bd9c538c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('mesa', schema=None) as batch_op:
+        batch_op.create_index('ix_mesa_docente_id', ['docente_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('mesa', schema=None) as batch_op:
+        batch_op.drop_index('ix_mesa_docente_id')
@@ -0,0 +1,32 @@
+"""Ampliar usuario.password para guardar hashes
+
+Revision ID: 5d8a3e7c1b94
+Revises: c41f07a9d8e2
+Create Date: 2026-10-19 15:42:18.530214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d8a3e7c1b94'
+down_revision = 'c41f07a9d8e2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('usuario', schema=None) as batch_op:
+        batch_op.alter_column('password',
+               existing_type=sa.String(length=100),
+               type_=sa.String(length=255),
+               existing_nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('usuario', schema=None) as batch_op:
+        batch_op.alter_column('password',
+               existing_type=sa.String(length=255),
+               type_=sa.String(length=100),
+               existing_nullable=False)
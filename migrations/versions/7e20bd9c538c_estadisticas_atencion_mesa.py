@@ -0,0 +1,32 @@
+"""Agregar estadísticas de tiempo de atención a mesa
+
+Revision ID: 7e20bd9c538c
+Revises: e0e481a97ff6
+Create Date: 2026-10-19 11:40:37.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e20bd9c538c'
+down_revision = 'e0e481a97ff6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('mesa', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('servicio_media', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('servicio_var', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('servicio_muestras', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('ultimo_avance', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('mesa', schema=None) as batch_op:
+        batch_op.drop_column('ultimo_avance')
+        batch_op.drop_column('servicio_muestras')
+        batch_op.drop_column('servicio_var')
+        batch_op.drop_column('servicio_media')
@@ -0,0 +1,46 @@
+"""Tabla trabajo para operaciones en segundo plano
+
+Revision ID: 8f2c6a1d9e57
+Revises: 5d8a3e7c1b94
+Create Date: 2026-10-19 16:20:07.314582
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f2c6a1d9e57'
+down_revision = '5d8a3e7c1b94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('trabajo',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sede', sa.String(length=50), server_default='principal', nullable=False),
+    sa.Column('tipo', sa.String(length=50), nullable=False),
+    sa.Column('estado', sa.String(length=20), nullable=False),
+    sa.Column('progreso', sa.Float(), nullable=False),
+    sa.Column('mensaje', sa.String(length=255), nullable=True),
+    sa.Column('parametros', sa.Text(), nullable=True),
+    sa.Column('resultado', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('proceso', sa.String(length=100), nullable=True),
+    sa.Column('usuario_id', sa.Integer(), nullable=True),
+    sa.Column('creado', sa.DateTime(), nullable=True),
+    sa.Column('iniciado', sa.DateTime(), nullable=True),
+    sa.Column('terminado', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['usuario_id'], ['usuario.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('trabajo', schema=None) as batch_op:
+        batch_op.create_index('ix_trabajo_estado', ['estado'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('trabajo', schema=None) as batch_op:
+        batch_op.drop_index('ix_trabajo_estado')
+
+    op.drop_table('trabajo')
@@ -0,0 +1,52 @@
+"""Tabla cita para turnos reservados por franja horaria
+
+Revision ID: a6d3f9b2c478
+Revises: 8f2c6a1d9e57
+Create Date: 2026-10-19 18:42:31.905117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d3f9b2c478'
+down_revision = '8f2c6a1d9e57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cita',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sede', sa.String(length=50), server_default='principal', nullable=False),
+    sa.Column('mesa_id', sa.Integer(), nullable=False),
+    sa.Column('docente_id', sa.Integer(), nullable=True),
+    sa.Column('fecha', sa.Date(), nullable=False),
+    sa.Column('hora', sa.Time(), nullable=False),
+    sa.Column('nombre', sa.String(length=100), nullable=False),
+    sa.Column('contacto', sa.String(length=100), nullable=True),
+    sa.Column('estado', sa.String(length=20), nullable=False),
+    sa.Column('turno_id', sa.Integer(), nullable=True),
+    sa.Column('creado', sa.DateTime(), nullable=True),
+    sa.Column('presentado', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['mesa_id'], ['mesa.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['docente_id'], ['usuario.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['turno_id'], ['turno_general.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('cita', schema=None) as batch_op:
+        batch_op.create_index('uq_cita_mesa_franja', ['mesa_id', 'fecha', 'hora'], unique=True,
+                              sqlite_where=sa.text("estado != 'cancelada'"),
+                              postgresql_where=sa.text("estado != 'cancelada'"))
+        batch_op.create_index('ix_cita_sede_fecha', ['sede', 'fecha'], unique=False)
+        batch_op.create_index('ix_cita_turno', ['turno_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('cita', schema=None) as batch_op:
+        batch_op.drop_index('ix_cita_turno')
+        batch_op.drop_index('ix_cita_sede_fecha')
+        batch_op.drop_index('uq_cita_mesa_franja')
+
+    op.drop_table('cita')
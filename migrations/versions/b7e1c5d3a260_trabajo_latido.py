@@ -0,0 +1,38 @@
+"""Latido de los trabajos y una sola operación activa por sede y tipo
+
+Revision ID: b7e1c5d3a260
+Revises: a6d3f9b2c478
+Create Date: 2026-10-19 21:07:12.418305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e1c5d3a260'
+down_revision = 'a6d3f9b2c478'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Duplicados anteriores al índice: se conserva el más reciente de cada sede y tipo
+    op.execute(
+        "UPDATE trabajo SET estado = 'interrumpido', "
+        "error = 'El proceso que ejecutaba el trabajo se detuvo' "
+        "WHERE estado IN ('pendiente', 'ejecutando') AND id NOT IN ("
+        "SELECT maximo FROM (SELECT MAX(id) AS maximo FROM trabajo "
+        "WHERE estado IN ('pendiente', 'ejecutando') GROUP BY sede, tipo) AS activos)"
+    )
+    with op.batch_alter_table('trabajo', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('latido', sa.DateTime(), nullable=True))
+        batch_op.create_index('uq_trabajo_activo', ['sede', 'tipo'], unique=True,
+                              sqlite_where=sa.text("estado IN ('pendiente', 'ejecutando')"),
+                              postgresql_where=sa.text("estado IN ('pendiente', 'ejecutando')"))
+
+
+def downgrade():
+    with op.batch_alter_table('trabajo', schema=None) as batch_op:
+        batch_op.drop_index('uq_trabajo_activo')
+        batch_op.drop_column('latido')
@@ -0,0 +1,26 @@
+"""Columna version en mesa para control de concurrencia optimista
+
+Revision ID: c41f07a9d8e2
+Revises: 3b9d2f61c0a4
+Create Date: 2026-10-19 13:05:44.120873
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41f07a9d8e2'
+down_revision = '3b9d2f61c0a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('mesa', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    with op.batch_alter_table('mesa', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,74 @@
+"""Agregar sede a mesa, usuario, turno_general y turno_historial
+
+Revision ID: e0e481a97ff6
+Revises: 249229bfe1f9
+Create Date: 2026-10-19 10:05:12.418230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e0e481a97ff6'
+down_revision = '249229bfe1f9'
+branch_labels = None
+depends_on = None
+
+# En SQLite las restricciones UNIQUE originales no tienen nombre; con esta convención
+# el modo batch les asigna uno al reflejar la tabla y así se pueden eliminar.
+CONVENCION = {'uq': 'uq_%(table_name)s_%(column_0_name)s'}
+
+
+def _unique_original(tabla, columna):
+    if op.get_bind().dialect.name == 'postgresql':
+        return f'{tabla}_{columna}_key'
+    return f'uq_{tabla}_{columna}'
+
+
+def _columna_sede():
+    return sa.Column('sede', sa.String(length=50), nullable=False, server_default='principal')
+
+
+def upgrade():
+    with op.batch_alter_table('usuario', schema=None) as batch_op:
+        batch_op.add_column(_columna_sede())
+        batch_op.create_index('ix_usuario_sede', ['sede'], unique=False)
+
+    with op.batch_alter_table('mesa', schema=None, naming_convention=CONVENCION) as batch_op:
+        batch_op.add_column(_columna_sede())
+        batch_op.drop_constraint(_unique_original('mesa', 'numero'), type_='unique')
+        batch_op.create_unique_constraint('uq_mesa_sede_numero', ['sede', 'numero'])
+        batch_op.create_index('ix_mesa_sede_estado', ['sede', 'eliminada', 'activa'], unique=False)
+
+    with op.batch_alter_table('turno_general', schema=None, naming_convention=CONVENCION) as batch_op:
+        batch_op.add_column(_columna_sede())
+        batch_op.drop_constraint(_unique_original('turno_general', 'numero_turno'), type_='unique')
+        batch_op.create_unique_constraint('uq_turno_general_sede_numero', ['sede', 'numero_turno'])
+        batch_op.create_index('ix_turno_general_mesa_numero', ['mesa_id', 'numero_turno'], unique=False)
+
+    with op.batch_alter_table('turno_historial', schema=None) as batch_op:
+        batch_op.add_column(_columna_sede())
+        batch_op.create_index('ix_turno_historial_sede_mesa_fecha', ['sede', 'mesa_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('turno_historial', schema=None) as batch_op:
+        batch_op.drop_index('ix_turno_historial_sede_mesa_fecha')
+        batch_op.drop_column('sede')
+
+    with op.batch_alter_table('turno_general', schema=None) as batch_op:
+        batch_op.drop_index('ix_turno_general_mesa_numero')
+        batch_op.drop_constraint('uq_turno_general_sede_numero', type_='unique')
+        batch_op.create_unique_constraint(_unique_original('turno_general', 'numero_turno'), ['numero_turno'])
+        batch_op.drop_column('sede')
+
+    with op.batch_alter_table('mesa', schema=None) as batch_op:
+        batch_op.drop_index('ix_mesa_sede_estado')
+        batch_op.drop_constraint('uq_mesa_sede_numero', type_='unique')
+        batch_op.create_unique_constraint(_unique_original('mesa', 'numero'), ['numero'])
+        batch_op.drop_column('sede')
+
+    with op.batch_alter_table('usuario', schema=None) as batch_op:
+        batch_op.drop_index('ix_usuario_sede')
+        batch_op.drop_column('sede')
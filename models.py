@@ -1,12 +1,20 @@
+import json
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 
 db = SQLAlchemy()
 
+SEDE_PREDETERMINADA = 'principal'
+
 class TurnoGeneral(db.Model):
     __tablename__ = 'turno_general'
+    __table_args__ = (
+        db.UniqueConstraint('sede', 'numero_turno', name='uq_turno_general_sede_numero'),
+        db.Index('ix_turno_general_mesa_numero', 'mesa_id', 'numero_turno'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    numero_turno = db.Column(db.Integer, nullable=False, unique=True)
+    sede = db.Column(db.String(50), nullable=False, default=SEDE_PREDETERMINADA, server_default=SEDE_PREDETERMINADA)
+    numero_turno = db.Column(db.Integer, nullable=False)
     estado = db.Column(db.String(20), default='pendiente')  
     mesa_id = db.Column(db.Integer, db.ForeignKey('mesa.id'))
     docente = db.Column(db.String(100))
@@ -16,18 +24,32 @@ class TurnoGeneral(db.Model):
 
 class Mesa(db.Model):
     __tablename__ = 'mesa'
+    __table_args__ = (
+        db.UniqueConstraint('sede', 'numero', name='uq_mesa_sede_numero'),
+        db.Index('ix_mesa_sede_estado', 'sede', 'eliminada', 'activa'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    numero = db.Column(db.Integer, unique=True, nullable=False)
+    sede = db.Column(db.String(50), nullable=False, default=SEDE_PREDETERMINADA, server_default=SEDE_PREDETERMINADA)
+    numero = db.Column(db.Integer, nullable=False)
     activa = db.Column(db.Boolean, default=True)
     turno_actual = db.Column(db.Integer, default=0) 
     eliminada = db.Column(db.Boolean, default=False)  
     
-    docente_id = db.Column(db.Integer, db.ForeignKey('usuario.id'))
+    servicio_media = db.Column(db.Float)
+    servicio_var = db.Column(db.Float)
+    servicio_muestras = db.Column(db.Integer, default=0)
+    ultimo_avance = db.Column(db.DateTime)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    
+    docente_id = db.Column(db.Integer, db.ForeignKey('usuario.id'), index=True)
     docente = db.relationship('Usuario', backref=db.backref('mesa_asignada', uselist=False), foreign_keys=[docente_id])
     
+    __mapper_args__ = {'version_id_col': version}
+    
     def to_dict(self):
         return {
             'id': self.id,
+            'sede': self.sede,
             'numero': self.numero,
             'turno_actual': self.turno_actual,
             'activa': self.activa,
@@ -39,15 +61,17 @@ class Mesa(db.Model):
 class Usuario(db.Model):
     __tablename__ = 'usuario'
     id = db.Column(db.Integer, primary_key=True)
+    sede = db.Column(db.String(50), nullable=False, default=SEDE_PREDETERMINADA, server_default=SEDE_PREDETERMINADA, index=True)
     nombre = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(100), unique=True, nullable=False)
-    password = db.Column(db.String(100), nullable=False)
+    password = db.Column(db.String(255), nullable=False)
     rol = db.Column(db.String(20), nullable=False)  
     activo = db.Column(db.Boolean, default=True)
     
     def to_dict(self):
         return {
             'id': self.id,
+            'sede': self.sede,
             'nombre': self.nombre,
             'email': self.email,
             'rol': self.rol,
@@ -58,11 +82,97 @@ class Usuario(db.Model):
 
 class TurnoHistorial(db.Model):
     __tablename__ = 'turno_historial'
+    __table_args__ = (
+        db.Index('ix_turno_historial_sede_mesa_fecha', 'sede', 'mesa_id', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
+    sede = db.Column(db.String(50), nullable=False, default=SEDE_PREDETERMINADA, server_default=SEDE_PREDETERMINADA)
     mesa_id = db.Column(db.Integer, db.ForeignKey('mesa.id'))
     turno = db.Column(db.Integer, nullable=False)
     docente = db.Column(db.String(100))
     accion = db.Column(db.String(50))  
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
-    mesa = db.relationship('Mesa', backref=db.backref('historial', lazy=True))
\ No newline at end of file
+    mesa = db.relationship('Mesa', backref=db.backref('historial', lazy=True))
+
+class Trabajo(db.Model):
+    """Operación pesada de administración ejecutada en segundo plano"""
+    __tablename__ = 'trabajo'
+    __table_args__ = (
+        db.Index('ix_trabajo_estado', 'estado'),
+        # Una sola operación activa de cada tipo por sede, aunque la lancen dos workers a la vez
+        db.Index('uq_trabajo_activo', 'sede', 'tipo', unique=True,
+                 sqlite_where=db.text("estado IN ('pendiente', 'ejecutando')"),
+                 postgresql_where=db.text("estado IN ('pendiente', 'ejecutando')")),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    sede = db.Column(db.String(50), nullable=False, default=SEDE_PREDETERMINADA, server_default=SEDE_PREDETERMINADA)
+    tipo = db.Column(db.String(50), nullable=False)
+    estado = db.Column(db.String(20), nullable=False, default='pendiente')
+    progreso = db.Column(db.Float, nullable=False, default=0.0)
+    mensaje = db.Column(db.String(255))
+    parametros = db.Column(db.Text)
+    resultado = db.Column(db.Text)
+    error = db.Column(db.Text)
+    proceso = db.Column(db.String(100))
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id', ondelete='SET NULL'))
+    creado = db.Column(db.DateTime, default=datetime.utcnow)
+    iniciado = db.Column(db.DateTime)
+    terminado = db.Column(db.DateTime)
+    latido = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sede': self.sede,
+            'tipo': self.tipo,
+            'estado': self.estado,
+            'progreso': round(self.progreso or 0.0, 3),
+            'mensaje': self.mensaje,
+            'resultado': json.loads(self.resultado) if self.resultado else None,
+            'error': self.error,
+            'creado': self.creado.strftime("%Y-%m-%d %H:%M:%S") if self.creado else None,
+            'iniciado': self.iniciado.strftime("%Y-%m-%d %H:%M:%S") if self.iniciado else None,
+            'terminado': self.terminado.strftime("%Y-%m-%d %H:%M:%S") if self.terminado else None
+        }
+
+class Cita(db.Model):
+    """Turno reservado en una franja horaria de una mesa"""
+    __tablename__ = 'cita'
+    __table_args__ = (
+        # Una franja de una mesa solo puede tener una cita vigente; las canceladas la liberan
+        db.Index('uq_cita_mesa_franja', 'mesa_id', 'fecha', 'hora', unique=True,
+                 sqlite_where=db.text("estado != 'cancelada'"),
+                 postgresql_where=db.text("estado != 'cancelada'")),
+        db.Index('ix_cita_sede_fecha', 'sede', 'fecha'),
+        db.Index('ix_cita_turno', 'turno_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    sede = db.Column(db.String(50), nullable=False, default=SEDE_PREDETERMINADA, server_default=SEDE_PREDETERMINADA)
+    mesa_id = db.Column(db.Integer, db.ForeignKey('mesa.id', ondelete='CASCADE'), nullable=False)
+    docente_id = db.Column(db.Integer, db.ForeignKey('usuario.id', ondelete='SET NULL'))
+    fecha = db.Column(db.Date, nullable=False)
+    hora = db.Column(db.Time, nullable=False)
+    nombre = db.Column(db.String(100), nullable=False)
+    contacto = db.Column(db.String(100))
+    estado = db.Column(db.String(20), nullable=False, default='reservada')
+    turno_id = db.Column(db.Integer, db.ForeignKey('turno_general.id', ondelete='SET NULL'))
+    creado = db.Column(db.DateTime, default=datetime.utcnow)
+    presentado = db.Column(db.DateTime)
+    
+    mesa = db.relationship('Mesa', backref=db.backref('citas', lazy=True))
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sede': self.sede,
+            'mesa_id': self.mesa_id,
+            'mesa': self.mesa.numero if self.mesa else None,
+            'docente_id': self.docente_id,
+            'fecha': self.fecha.isoformat(),
+            'hora': self.hora.strftime("%H:%M"),
+            'nombre': self.nombre,
+            'contacto': self.contacto,
+            'estado': self.estado,
+            'presentado': self.presentado.strftime("%Y-%m-%d %H:%M:%S") if self.presentado else None
+        }
@@ -0,0 +1,155 @@
+import cProfile
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import g, request, session
+
+from metricas import metricas
+
+
+class MuestreadorPilas:
+    """Toma muestras periódicas de la pila de un hilo y las acumula en formato colapsado"""
+
+    def __init__(self, hilo_id, intervalo):
+        self.hilo_id = hilo_id
+        self.intervalo = intervalo
+        self.pilas = Counter()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, name='muestreador-perfil', daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        self._hilo.join()
+
+    def _muestrear(self):
+        while not self._detener.wait(self.intervalo):
+            frame = sys._current_frames().get(self.hilo_id)
+            if frame is None:
+                continue
+            pila = []
+            while frame is not None:
+                codigo = frame.f_code
+                pila.append(f'{os.path.basename(codigo.co_filename)}:{codigo.co_name}:{frame.f_lineno}')
+                frame = frame.f_back
+            self.pilas[';'.join(reversed(pila))] += 1
+
+    def colapsado(self):
+        return ''.join(f'{pila} {cuenta}\n' for pila, cuenta in self.pilas.most_common())
+
+
+class Perfilador:
+    """Perfilado bajo demanda de peticiones reales.
+
+    Perfila una fracción muestreada de las peticiones a los endpoints configurados,
+    o cualquier petición de un administrador que envíe la cabecera X-Turnero-Perfil.
+    Por cada petición se guarda un .prof (pstats) y un .collapsed (pilas muestreadas,
+    compatible con flamegraph.pl/speedscope) en instance/profiles/, conservando solo
+    los más recientes. Si PERFIL_HABILITADO es falso no se registra ningún hook.
+    """
+
+    CABECERA = 'X-Turnero-Perfil'
+
+    def __init__(self, app=None):
+        self.directorio = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directorio = os.path.join(app.instance_path, 'profiles')
+        self.endpoints = set(app.config.get('PERFIL_ENDPOINTS', ()))
+        self.muestreo = app.config.get('PERFIL_MUESTREO', 0.0)
+        self.intervalo = app.config.get('PERFIL_INTERVALO', 0.005)
+        self.maximo = app.config.get('PERFIL_MAXIMO', 50)
+        app.extensions['perfilador'] = self
+
+        if not app.config.get('PERFIL_HABILITADO', False):
+            return
+
+        os.makedirs(self.directorio, exist_ok=True)
+        app.before_request(self._antes)
+        app.teardown_request(self._despues)
+
+    def _debe_perfilar(self):
+        if request.endpoint not in self.endpoints:
+            return False
+        if request.headers.get(self.CABECERA):
+            return session.get('usuario', {}).get('rol') == 'admin'
+        return self.muestreo > 0 and random.random() < self.muestreo
+
+    def _antes(self):
+        if not self._debe_perfilar():
+            return
+
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:
+            # Otro perfilador ya está activo en este hilo
+            return
+
+        muestreador = MuestreadorPilas(threading.get_ident(), self.intervalo)
+        muestreador.iniciar()
+        g.perfil = (perfil, muestreador, time.perf_counter())
+
+    def _despues(self, error=None):
+        datos = g.pop('perfil', None)
+        if datos is None:
+            return
+
+        perfil, muestreador, inicio = datos
+        perfil.disable()
+        muestreador.detener()
+        duracion = time.perf_counter() - inicio
+
+        base = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{request.endpoint}"
+        try:
+            perfil.dump_stats(os.path.join(self.directorio, base + '.prof'))
+            with open(os.path.join(self.directorio, base + '.collapsed'), 'w') as f:
+                f.write(muestreador.colapsado())
+            self._rotar()
+        except OSError as e:
+            print(f"Error guardando perfil: {e}")
+            return
+
+        metricas.incrementar('perfiles.capturados')
+        metricas.observar(f'perfiles.duracion_segundos.{request.endpoint}', duracion)
+
+    def _rotar(self):
+        perfiles = self.listar()
+        for perfil in perfiles[self.maximo:]:
+            for extension in ('.prof', '.collapsed'):
+                try:
+                    os.remove(os.path.join(self.directorio, perfil['nombre'] + extension))
+                except FileNotFoundError:
+                    pass
+
+    def listar(self):
+        """Perfiles guardados, del más reciente al más antiguo"""
+        if not self.directorio or not os.path.isdir(self.directorio):
+            return []
+
+        perfiles = []
+        for archivo in os.listdir(self.directorio):
+            if not archivo.endswith('.prof'):
+                continue
+            ruta = os.path.join(self.directorio, archivo)
+            nombre = archivo[:-len('.prof')]
+            perfiles.append({
+                'nombre': nombre,
+                'endpoint': nombre.split('_', 1)[-1],
+                'fecha': datetime.fromtimestamp(os.path.getmtime(ruta)).strftime('%Y-%m-%d %H:%M:%S'),
+                'tamano': os.path.getsize(ruta),
+            })
+        perfiles.sort(key=lambda p: p['nombre'], reverse=True)
+        return perfiles
+
+
+perfilador = Perfilador()
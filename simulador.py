@@ -0,0 +1,102 @@
+"""Simulación vectorizada de la cola para planificar cuántas mesas abrir.
+
+El sistema no registra la hora en que llega cada persona, solo cuándo se llama su
+turno, así que la demanda por hora se estima con los turnos atendidos en esa hora
+(promedio por día con actividad). Los tiempos de atención se toman del historial:
+intervalos entre avances consecutivos de una misma mesa, descartando pausas.
+"""
+import numpy as np
+
+
+def ajustar_llegadas(horas_locales, dias_observados, desde, hasta):
+    """Tasa de llegadas (personas por hora) para cada hora de la ventana [desde, hasta)"""
+    horas = np.asarray(horas_locales, dtype=np.int64)
+    cuentas = np.bincount(horas[(horas >= desde) & (horas < hasta)] - desde, minlength=hasta - desde)
+    return cuentas / max(dias_observados, 1)
+
+
+def tiempos_servicio(mesa_ids, tiempos, pausa_maxima):
+    """Intervalos (segundos) entre avances consecutivos de la misma mesa"""
+    mesa_ids = np.asarray(mesa_ids, dtype=np.int64)
+    tiempos = np.asarray(tiempos, dtype=np.float64)
+    if len(tiempos) < 2:
+        return np.empty(0)
+    orden = np.lexsort((tiempos, mesa_ids))
+    mesa_ids, tiempos = mesa_ids[orden], tiempos[orden]
+    intervalos = np.diff(tiempos)
+    validos = (mesa_ids[1:] == mesa_ids[:-1]) & (intervalos > 0) & (intervalos <= pausa_maxima)
+    return intervalos[validos]
+
+
+def simular(tasas_por_hora, servicio, mesas, dias, rng):
+    """Simular `dias` jornadas independientes con `mesas` mesas atendiendo en paralelo (FIFO).
+
+    Todas las jornadas avanzan a la vez: se itera sobre el índice de llegada y cada paso
+    opera sobre vectores de tamaño `dias`. Devuelve las esperas (segundos) de todas las
+    personas y la utilización media de las mesas.
+    """
+    tasas = np.asarray(tasas_por_hora, dtype=np.float64)
+    horas = len(tasas)
+    cuentas = rng.poisson(tasas, size=(dias, horas))
+    por_dia = cuentas.sum(axis=1)
+    maximo = int(por_dia.max()) if dias else 0
+    if maximo == 0:
+        return np.empty(0), 0.0
+
+    # Llegadas uniformes dentro de cada hora; los huecos se rellenan con infinito
+    llegadas = np.full((dias, maximo), np.inf)
+    hora_de = np.repeat(np.tile(np.arange(horas), dias), cuentas.ravel())
+    dia_de = np.repeat(np.arange(dias), por_dia)
+    posicion = np.arange(len(dia_de)) - np.repeat(np.cumsum(por_dia) - por_dia, por_dia)
+    llegadas[dia_de, posicion] = (hora_de + rng.random(len(hora_de))) * 3600.0
+    llegadas.sort(axis=1)
+
+    duraciones = rng.choice(servicio, size=(dias, maximo))
+    libres = np.zeros((dias, mesas))
+    esperas = np.full((dias, maximo), np.nan)
+    ocupado = np.zeros(dias)
+    filas = np.arange(dias)
+
+    for j in range(maximo):
+        llegada = llegadas[:, j]
+        presentes = np.isfinite(llegada)
+        mesa = libres.argmin(axis=1)
+        inicio = np.maximum(llegada, libres[filas, mesa])
+        fin = inicio + duraciones[:, j]
+        libres[filas[presentes], mesa[presentes]] = fin[presentes]
+        esperas[presentes, j] = inicio[presentes] - llegada[presentes]
+        ocupado += np.where(presentes, duraciones[:, j], 0.0)
+
+    utilizacion = float(np.mean(np.minimum(ocupado / (mesas * horas * 3600.0), 1.0)))
+    return esperas[np.isfinite(esperas)], utilizacion
+
+
+def planificar(tasas_por_hora, servicio, mesas_max, dias, objetivo_minutos, semilla=None):
+    """Escenarios de 1 a mesas_max mesas y la menor cantidad que cumple el objetivo en el p90"""
+    rng = np.random.default_rng(semilla)
+    escenarios = []
+    recomendacion = None
+
+    for mesas in range(1, mesas_max + 1):
+        esperas, utilizacion = simular(tasas_por_hora, servicio, mesas, dias, rng)
+        if len(esperas) == 0:
+            p50 = p90 = p95 = media = 0.0
+            sobre_objetivo = 0.0
+        else:
+            p50, p90, p95 = np.percentile(esperas, [50, 90, 95]) / 60.0
+            media = float(esperas.mean()) / 60.0
+            sobre_objetivo = float(np.mean(esperas > objetivo_minutos * 60.0))
+
+        escenarios.append({
+            'mesas': mesas,
+            'espera_media_min': round(float(media), 1),
+            'espera_p50_min': round(float(p50), 1),
+            'espera_p90_min': round(float(p90), 1),
+            'espera_p95_min': round(float(p95), 1),
+            'sobre_objetivo': round(sobre_objetivo, 3),
+            'utilizacion': round(utilizacion, 3)
+        })
+        if recomendacion is None and p90 <= objetivo_minutos:
+            recomendacion = mesas
+
+    return recomendacion, escenarios
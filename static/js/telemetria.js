@@ -0,0 +1,85 @@
+// Latidos de telemetría de las pantallas (tablero público y panel docente).
+// Cada consulta del feed mide su ida y vuelta; cuando la pantalla dibuja un turno nuevo
+// se calcula cuánto pasó desde que el servidor lo confirmó, corrigiendo la diferencia
+// de reloj con la hora del servidor que viene en cada respuesta (o en la del propio
+// latido, cuando el feed es un archivo estático sin hora del servidor).
+function crearTelemetria(tipo, sede) {
+    const INTERVALO = 15000;
+    const clave = 'turnero-pantalla-' + tipo;
+    let pantalla = null;
+    try {
+        pantalla = localStorage.getItem(clave);
+        if (!pantalla) {
+            pantalla = Date.now().toString(36) + Math.random().toString(36).slice(2, 8);
+            localStorage.setItem(clave, pantalla);
+        }
+    } catch (e) {
+        pantalla = Date.now().toString(36) + Math.random().toString(36).slice(2, 8);
+    }
+
+    let version = null;
+    let idasYVueltas = [];
+    let latencias = [];
+    let errores = 0;
+    let desfase = null;
+    let mejorIdaYVuelta = Infinity;
+
+    function ajustarReloj(idaYVuelta, servidor) {
+        // La muestra con menor ida y vuelta da la mejor estimación del desfase de reloj
+        if (servidor && idaYVuelta <= mejorIdaYVuelta) {
+            mejorIdaYVuelta = idaYVuelta;
+            desfase = servidor - (Date.now() - idaYVuelta / 2);
+        }
+    }
+
+    function enviar() {
+        const ordenadas = idasYVueltas.slice().sort((a, b) => a - b);
+        const cuerpo = JSON.stringify({
+            pantalla: pantalla,
+            tipo: tipo,
+            sede: sede,
+            version: version,
+            rtt_ms: ordenadas.length ? ordenadas[Math.floor(ordenadas.length / 2)] : null,
+            latencias_ms: latencias,
+            errores: errores
+        });
+        idasYVueltas = [];
+        latencias = [];
+        errores = 0;
+        const inicio = performance.now();
+        fetch('/api/telemetria', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: cuerpo,
+            keepalive: true
+        })
+        .then(response => response.json())
+        .then(data => ajustarReloj(performance.now() - inicio, data.servidor))
+        .catch(() => {});
+    }
+
+    setInterval(enviar, INTERVALO);
+    setTimeout(enviar, 0);
+
+    return {
+        // Llamar con performance.now() tomado antes del fetch y la respuesta ya decodificada
+        respuesta(inicio, data) {
+            const idaYVuelta = performance.now() - inicio;
+            idasYVueltas.push(idaYVuelta);
+            ajustarReloj(idaYVuelta, data.servidor);
+        },
+        renderizado(nuevaVersion, confirmado) {
+            const anterior = version;
+            version = nuevaVersion;
+            // La primera versión dibujada al cargar la página no es un anuncio en vivo
+            if (anterior === null || nuevaVersion === anterior || !confirmado || desfase === null) {
+                return;
+            }
+            latencias.push(Math.max(0, Date.now() + desfase - confirmado));
+            enviar();
+        },
+        error() {
+            errores += 1;
+        }
+    };
+}
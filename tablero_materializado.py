@@ -0,0 +1,125 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin flock; vale el lock del proceso (servidor de desarrollo)
+    fcntl = None
+
+from sqlalchemy import event
+
+from metricas import metricas
+
+
+class MaterializadorTablero:
+    """Archivos con el estado del tablero público de cada sede, escritos al confirmar cambios.
+
+    Un listener de after_flush anota en session.info las sedes cuyas mesas o turnos
+    cambiaron; en after_commit se vuelve a generar el estado de esas sedes con una
+    conexión propia y se escribe en instance/tablero/<sede>.json y <sede>.html
+    (escritura a un temporal y os.replace, así que nunca se lee un archivo a medias).
+    Si la transacción se deshace no se escribe nada. La lectura y el reemplazo se hacen
+    bajo un flock sobre <sede>.lock, así que con varios workers una lectura vieja
+    tampoco puede pisar el archivo escrito por otro proceso con una más nueva.
+
+    Las pantallas leen esos archivos como estáticos: con send_file y ETag desde Flask
+    (o X-Sendfile si USE_X_SENDFILE está activo), o directamente desde el proxy
+    apuntando una ruta a este directorio. Los cambios hechos con delete()/update()
+    masivos no pasan por el flush: quien los haga debe llamar a marcar(sede) antes
+    del commit.
+    """
+
+    def __init__(self, app=None):
+        self.directorio = None
+        self.generar = None
+        self.modelos = ()
+        self._locks = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, sesion=None, modelos=()):
+        self.directorio = app.config.get('TABLERO_DIR') or os.path.join(app.instance_path, 'tablero')
+        self.modelos = tuple(modelos)
+        os.makedirs(self.directorio, exist_ok=True)
+        app.extensions['materializador_tablero'] = self
+
+        if sesion is not None:
+            event.listen(sesion, 'after_flush', self._al_flush)
+            event.listen(sesion, 'after_commit', self._al_confirmar)
+            event.listen(sesion, 'after_transaction_end', self._al_terminar)
+
+    def generador(self, funcion):
+        """Registrar la función (sede) -> (datos, html) que arma el contenido de una sede"""
+        self.generar = funcion
+        return funcion
+
+    def marcar(self, session, sede):
+        session.info.setdefault('tablero_sedes', set()).add(sede)
+
+    def _al_flush(self, session, contexto):
+        for objeto in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(objeto, self.modelos) and getattr(objeto, 'sede', None):
+                self.marcar(session, objeto.sede)
+
+    def _al_confirmar(self, session):
+        sedes = session.info.pop('tablero_sedes', None)
+        for sede in sedes or ():
+            try:
+                self.escribir(sede)
+            except Exception:
+                # El cambio ya está confirmado: un fallo al escribir no debe convertirse en error de la petición
+                metricas.incrementar('tablero.errores')
+
+    def _al_terminar(self, session, transaccion):
+        # Tras un rollback (o un close sin commit) las sedes anotadas ya no aplican
+        if transaccion.parent is None:
+            session.info.pop('tablero_sedes', None)
+
+    def ruta(self, sede, formato):
+        return os.path.join(self.directorio, f'{sede}.{formato}')
+
+    def escribir(self, sede):
+        """Generar y reemplazar atómicamente los archivos de la sede"""
+        inicio = time.perf_counter()
+        with self._lock:
+            lock = self._locks.setdefault(sede, threading.Lock())
+
+        # Leer y escribir bajo el mismo lock: una lectura vieja nunca reemplaza a una más nueva
+        with lock, self._bloqueo_archivo(sede):
+            datos, html = self.generar(sede)
+            self._reemplazar(self.ruta(sede, 'json'), json.dumps(datos, ensure_ascii=False))
+            self._reemplazar(self.ruta(sede, 'html'), html)
+
+        metricas.incrementar('tablero.escrituras')
+        metricas.observar('tablero.escritura_ms', (time.perf_counter() - inicio) * 1000)
+
+    @contextmanager
+    def _bloqueo_archivo(self, sede):
+        """Lock exclusivo entre procesos (workers de gunicorn) para la sede"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.ruta(sede, 'lock'), 'a') as archivo:
+            fcntl.flock(archivo, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(archivo, fcntl.LOCK_UN)
+
+    def _reemplazar(self, ruta, contenido):
+        descriptor, temporal = tempfile.mkstemp(dir=self.directorio, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as archivo:
+                archivo.write(contenido)
+            os.replace(temporal, ruta)
+        except BaseException:
+            os.remove(temporal)
+            raise
+
+
+materializador_tablero = MaterializadorTablero()
@@ -0,0 +1,163 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+from metricas import metricas, _percentil
+
+TIPOS_PANTALLA = ('publica', 'docente')
+
+
+def _numero(valor, minimo=0.0, maximo=3600000.0):
+    """Número acotado o None: los datos vienen del navegador y no se confía en ellos"""
+    try:
+        valor = float(valor)
+    except (TypeError, ValueError):
+        return None
+    if valor != valor:
+        return None
+    return min(max(valor, minimo), maximo)
+
+
+class TelemetriaPantallas:
+    """Latidos de las pantallas (tablero público y panel docente), agregados en memoria.
+
+    Cada pantalla informa la última versión que dibujó (el número del último turno de
+    su sede), el tiempo de ida y vuelta de sus consultas y, cuando dibuja un turno
+    nuevo, cuánto pasó desde que siguiente_turno lo confirmó. Esa latencia de punta a
+    punta se compara con PANTALLAS_SLO_MS y se publica también en metricas.
+
+    El latido no requiere sesión, así que solo se aceptan sedes conocidas (la lista se
+    refresca cada PANTALLAS_SEDES_TTL segundos): sedes inventadas no deben llenar el
+    registro ni generar consultas en el panel de administración.
+    """
+
+    MUESTRAS = 50
+
+    def __init__(self, app=None):
+        self.maximo = 500
+        self.slo_ms = 5000
+        self.sin_reporte = 45
+        self.ttl_sedes = 60
+        self._cargar_sedes = None
+        self._sedes_conocidas = (0.0, frozenset())
+        self._lock = threading.Lock()
+        self._pantallas = OrderedDict()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, sedes=None):
+        self.maximo = app.config.get('PANTALLAS_MAXIMO', 500)
+        self.slo_ms = app.config.get('PANTALLAS_SLO_MS', 5000)
+        self.sin_reporte = app.config.get('PANTALLAS_SIN_REPORTE', 45)
+        self.ttl_sedes = app.config.get('PANTALLAS_SEDES_TTL', 60)
+        self._cargar_sedes = sedes
+        app.extensions['telemetria_pantallas'] = self
+
+    def _sede_conocida(self, sede):
+        if self._cargar_sedes is None:
+            return True
+        vence, conocidas = self._sedes_conocidas
+        if time.monotonic() >= vence:
+            conocidas = frozenset(self._cargar_sedes())
+            self._sedes_conocidas = (time.monotonic() + self.ttl_sedes, conocidas)
+        return sede in conocidas
+
+    def registrar(self, datos, ip=None, agente=None):
+        pantalla_id = str(datos.get('pantalla') or '')[:64]
+        tipo = datos.get('tipo')
+        sede = str(datos.get('sede') or '')[:50]
+        if not pantalla_id or tipo not in TIPOS_PANTALLA or not self._sede_conocida(sede):
+            return False
+
+        rtt = _numero(datos.get('rtt_ms'), maximo=60000)
+        version = _numero(datos.get('version'), maximo=1e12)
+        latencias = [l for l in (_numero(v) for v in (datos.get('latencias_ms') or [])[:20]) if l is not None]
+        errores = int(_numero(datos.get('errores'), maximo=1e6) or 0)
+        ahora = time.time()
+
+        with self._lock:
+            pantalla = self._pantallas.pop(pantalla_id, None)
+            if pantalla is None:
+                pantalla = {
+                    'id': pantalla_id,
+                    'primer_reporte': ahora,
+                    'latencias': deque(maxlen=self.MUESTRAS),
+                    'errores': 0,
+                    'reportes': 0
+                }
+            pantalla.update({
+                'tipo': tipo,
+                'sede': sede,
+                'ip': ip,
+                'agente': (agente or '')[:200],
+                'ultimo_reporte': ahora
+            })
+            if version is not None:
+                pantalla['version'] = int(version)
+            if rtt is not None:
+                pantalla['rtt_ms'] = rtt
+            pantalla['latencias'].extend(latencias)
+            pantalla['errores'] += errores
+            pantalla['reportes'] += 1
+            self._pantallas[pantalla_id] = pantalla
+            while len(self._pantallas) > self.maximo:
+                self._pantallas.popitem(last=False)
+            activas = sum(1 for p in self._pantallas.values() if ahora - p['ultimo_reporte'] <= self.sin_reporte)
+
+        if rtt is not None:
+            metricas.observar(f'pantallas.{tipo}.rtt_ms', rtt)
+        for latencia in latencias:
+            metricas.observar(f'pantallas.{tipo}.latencia_anuncio_ms', latencia)
+            metricas.incrementar('pantallas.anuncios_dentro_slo' if latencia <= self.slo_ms else 'pantallas.anuncios_fuera_slo')
+        if errores:
+            metricas.incrementar('pantallas.errores', errores)
+        metricas.fijar('pantallas.activas', activas)
+        return True
+
+    def sedes(self):
+        with self._lock:
+            return {p['sede'] for p in self._pantallas.values() if p['sede']}
+
+    def resumen(self, versiones_actuales):
+        """Estado de cada pantalla; versiones_actuales es {sede: último turno} para medir el atraso"""
+        ahora = time.time()
+        with self._lock:
+            pantallas = [dict(p, latencias=sorted(p['latencias'])) for p in reversed(self._pantallas.values())]
+
+        todas = []
+        muestras = []
+        for pantalla in pantallas:
+            latencias = pantalla.pop('latencias')
+            silencio = ahora - pantalla['ultimo_reporte']
+            actual = versiones_actuales.get(pantalla['sede'])
+            atraso = actual - pantalla['version'] if actual is not None and 'version' in pantalla else None
+            if silencio > self.sin_reporte:
+                estado = 'sin_reporte'
+            elif atraso:
+                estado = 'atrasada'
+            else:
+                estado = 'ok'
+            todas.append(dict(
+                pantalla,
+                estado=estado,
+                segundos_sin_reporte=round(silencio),
+                version_actual=actual,
+                atraso=atraso,
+                latencia_p50_ms=round(_percentil(latencias, 0.50)) if latencias else None,
+                latencia_p95_ms=round(_percentil(latencias, 0.95)) if latencias else None,
+                latencia_max_ms=round(latencias[-1]) if latencias else None
+            ))
+            muestras.extend(latencias)
+
+        muestras.sort()
+        return {
+            'pantallas': todas,
+            'slo_ms': self.slo_ms,
+            'anuncios_medidos': len(muestras),
+            'dentro_slo': round(sum(1 for l in muestras if l <= self.slo_ms) / len(muestras), 3) if muestras else None,
+            'latencia_p50_ms': round(_percentil(muestras, 0.50)) if muestras else None,
+            'latencia_p95_ms': round(_percentil(muestras, 0.95)) if muestras else None
+        }
+
+
+telemetria_pantallas = TelemetriaPantallas()
@@ -0,0 +1,233 @@
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from metricas import metricas
+from models import db, Trabajo
+
+ESTADOS_ACTIVOS = ('pendiente', 'ejecutando')
+ERROR_INTERRUMPIDO = 'El proceso que ejecutaba el trabajo se detuvo'
+
+
+def identificador_proceso():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def proceso_vivo(proceso):
+    """Si el proceso dueño de un trabajo sigue vivo, o None si es de otra máquina y no se puede comprobar"""
+    host, _, pid = (proceso or '').rpartition(':')
+    if host != socket.gethostname():
+        return None if host else False
+    if not pid.isdigit() or os.name == 'nt':
+        # En Windows os.kill(pid, 0) terminaría el proceso: otro pid de esta máquina se da por muerto
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class EjecutorTrabajos:
+    """Ejecutor en proceso de operaciones pesadas de administración.
+
+    La petición crea un registro Trabajo y responde de inmediato con su id; un
+    ThreadPoolExecutor ejecuta la tarea con su propio contexto de aplicación. El
+    estado, el progreso y el resultado se guardan en la tabla trabajo con conexiones
+    cortas e independientes, así que se pueden consultar desde cualquier worker y
+    sobreviven a un reinicio: los trabajos de un proceso que ya no existe quedan
+    marcados como 'interrumpido' al iniciar. Cada proceso escribe un latido en sus
+    trabajos cada TRABAJOS_LATIDO segundos; un trabajo de otra máquina sin latido
+    durante TRABAJOS_LATIDO_MAXIMO segundos se da por interrumpido.
+
+    Un índice único parcial sobre (sede, tipo) de los trabajos activos impide que dos
+    clics simultáneos, aunque lleguen a workers distintos, lancen dos veces la misma
+    operación.
+
+    Las tareas reciben (trabajo_id, progreso, sede, **parametros) y deben confirmar su
+    trabajo por partes, sin mantener una transacción abierta durante toda la tarea.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.tareas = {}
+        self._ejecutor = None
+        self._lock = threading.Lock()
+        self._lock_lanzar = threading.Lock()
+        self._en_proceso = set()
+        self._latidos = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.hilos = app.config.get('TRABAJOS_HILOS', 2)
+        self.intervalo_progreso = app.config.get('TRABAJOS_INTERVALO_PROGRESO', 0.5)
+        self.intervalo_latido = app.config.get('TRABAJOS_LATIDO', 30)
+        self.latido_maximo = app.config.get('TRABAJOS_LATIDO_MAXIMO', 120)
+        app.extensions['trabajos'] = self
+
+    def tarea(self, tipo):
+        def registrar(funcion):
+            self.tareas[tipo] = funcion
+            return funcion
+        return registrar
+
+    def _pool(self):
+        with self._lock:
+            if self._ejecutor is None:
+                self._ejecutor = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix='trabajo')
+            if self._latidos is None:
+                self._latidos = threading.Event()
+                threading.Thread(target=self._latir, args=(self._latidos,), name='trabajos-latido', daemon=True).start()
+            return self._ejecutor
+
+    def _latir(self, detenido):
+        """Marcar como vivos los trabajos de este proceso, para que otras máquinas lo sepan"""
+        while not detenido.wait(self.intervalo_latido):
+            ids = list(self._en_proceso)
+            if not ids:
+                continue
+            try:
+                with self.app.app_context(), db.engine.begin() as conexion:
+                    conexion.execute(update(Trabajo).where(Trabajo.id.in_(ids)).values(latido=datetime.utcnow()))
+            except Exception:
+                self.app.logger.exception('No se pudo registrar el latido de los trabajos')
+
+    def lanzar(self, tipo, sede, usuario_id=None, **parametros):
+        """Registrar el trabajo, confirmarlo y encolarlo; devuelve el Trabajo creado"""
+        if tipo not in self.tareas:
+            raise ValueError(f'Tipo de trabajo desconocido: {tipo}')
+
+        # Comprobar e insertar sin que otro hilo se cuele; entre workers decide el índice único
+        with self._lock_lanzar:
+            # Un segundo clic mientras la misma operación sigue en curso recibe el trabajo existente
+            existente = self._activo(tipo, sede)
+            if existente:
+                if self._vigente(existente.id, existente.proceso, existente.latido):
+                    return existente
+                # Huérfano: liberarlo para que el índice único admita el nuevo
+                existente.estado = 'interrumpido'
+                existente.error = ERROR_INTERRUMPIDO
+                existente.terminado = datetime.utcnow()
+
+            ahora = datetime.utcnow()
+            trabajo = Trabajo(
+                sede=sede,
+                tipo=tipo,
+                estado='pendiente',
+                progreso=0.0,
+                parametros=json.dumps(parametros),
+                proceso=identificador_proceso(),
+                usuario_id=usuario_id,
+                creado=ahora,
+                latido=ahora
+            )
+            db.session.add(trabajo)
+            try:
+                db.session.flush()
+            except IntegrityError:
+                # Otro worker lanzó la misma operación al mismo tiempo
+                db.session.rollback()
+                existente = self._activo(tipo, sede)
+                if existente is None:
+                    raise
+                return existente
+            self._en_proceso.add(trabajo.id)
+            db.session.commit()
+
+        metricas.incrementar(f'trabajos.{tipo}.lanzados')
+        self._pool().submit(self._ejecutar, trabajo.id, tipo, dict(parametros, sede=sede))
+        return trabajo
+
+    def _actualizar(self, trabajo_id, **valores):
+        with db.engine.begin() as conexion:
+            conexion.execute(update(Trabajo).where(Trabajo.id == trabajo_id).values(**valores))
+
+    def _ejecutar(self, trabajo_id, tipo, parametros):
+        with self.app.app_context():
+            inicio = time.perf_counter()
+            self._actualizar(trabajo_id, estado='ejecutando', iniciado=datetime.utcnow())
+            ultimo = [0.0]
+
+            def progreso(fraccion, mensaje=None):
+                # Limitar las escrituras: una tarea puede avisar miles de veces por segundo
+                ahora = time.monotonic()
+                if ahora - ultimo[0] < self.intervalo_progreso and fraccion < 1:
+                    return
+                ultimo[0] = ahora
+                self._actualizar(trabajo_id, progreso=min(max(fraccion, 0.0), 1.0), mensaje=mensaje)
+
+            try:
+                resultado = self.tareas[tipo](trabajo_id, progreso, **parametros)
+                db.session.commit()
+                self._actualizar(
+                    trabajo_id,
+                    estado='completado',
+                    progreso=1.0,
+                    resultado=json.dumps(resultado, default=str) if resultado is not None else None,
+                    terminado=datetime.utcnow()
+                )
+                metricas.incrementar(f'trabajos.{tipo}.completados')
+            except Exception as e:
+                db.session.rollback()
+                self._actualizar(trabajo_id, estado='fallido', error=str(e), terminado=datetime.utcnow())
+                metricas.incrementar(f'trabajos.{tipo}.fallidos')
+                self.app.logger.exception('Trabajo %s (%s) falló', trabajo_id, tipo)
+            finally:
+                self._en_proceso.discard(trabajo_id)
+                db.session.remove()
+                metricas.observar(f'trabajos.{tipo}.duracion_segundos', time.perf_counter() - inicio)
+
+    @staticmethod
+    def _activo(tipo, sede):
+        return Trabajo.query.filter(
+            Trabajo.tipo == tipo, Trabajo.sede == sede, Trabajo.estado.in_(ESTADOS_ACTIVOS)
+        ).first()
+
+    def _vigente(self, trabajo_id, proceso, latido):
+        if proceso == identificador_proceso():
+            return trabajo_id in self._en_proceso
+        vivo = proceso_vivo(proceso)
+        if vivo is None:
+            # Otra máquina: solo se sabe por el latido que escribe su ejecutor
+            return latido is not None and datetime.utcnow() - latido <= timedelta(seconds=self.latido_maximo)
+        return vivo
+
+    def marcar_interrumpidos(self):
+        """Marcar como interrumpidos los trabajos activos cuyo proceso ya no existe"""
+        activos = db.session.execute(
+            db.select(Trabajo.id, Trabajo.proceso, Trabajo.latido).where(Trabajo.estado.in_(ESTADOS_ACTIVOS))
+        ).all()
+        huerfanos = [t.id for t in activos if not self._vigente(t.id, t.proceso, t.latido)]
+        if huerfanos:
+            db.session.execute(
+                update(Trabajo).where(Trabajo.id.in_(huerfanos)).values(
+                    estado='interrumpido',
+                    error=ERROR_INTERRUMPIDO,
+                    terminado=datetime.utcnow()
+                )
+            )
+            db.session.commit()
+        return len(huerfanos)
+
+    def detener(self, esperar=True):
+        with self._lock:
+            if self._ejecutor is not None:
+                self._ejecutor.shutdown(wait=esperar)
+                self._ejecutor = None
+            if self._latidos is not None:
+                self._latidos.set()
+                self._latidos = None
+
+
+ejecutor_trabajos = EjecutorTrabajos()